@@ -3,17 +3,148 @@ import bcrypt
 from datetime import datetime, timedelta
 from functools import wraps
 from flask import request, jsonify
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+import threading
+import time
 import os
+from database import session
 
 SECRET_KEY = os.getenv('JWT_SECRET', 'your-secret-key-change-in-production')
 
+# bcrypt work factor; existing hashes with a different cost are upgraded on login
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+# Worker processes for bcrypt (0 runs it inline on the request thread)
+HASH_WORKERS = int(os.getenv('HASH_WORKERS', os.cpu_count() or 1))
+# Requests allowed to wait for a worker before new ones are rejected
+HASH_QUEUE_DEPTH = int(os.getenv('HASH_QUEUE_DEPTH', 32))
+HASH_TIMEOUT = float(os.getenv('HASH_TIMEOUT', 10))
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class HashServiceBusy(Exception):
+    """Raised when the password hashing queue is full"""
+
+def _bcrypt_hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+def _bcrypt_check(password, hashed):
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+class HashService:
+    """Runs bcrypt in a bounded process pool so logins cannot tie up request workers"""
+
+    def __init__(self, workers=HASH_WORKERS, queue_depth=HASH_QUEUE_DEPTH, timeout=HASH_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(max(workers, 1) + queue_depth)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._metrics = {
+            op: {'count': 0, 'rejected': 0, 'sum_seconds': 0.0, 'max_seconds': 0.0,
+                 'buckets': [0] * len(LATENCY_BUCKETS)}
+            for op in ('hash', 'verify')
+        }
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _reset_executor(self, executor):
+        """Drop a pool whose worker died so the next call starts a fresh one"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, op, fn, *args):
+        """Run fn(*args) on the pool, raising HashServiceBusy if the queue is full"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._metrics[op]['rejected'] += 1
+            raise HashServiceBusy('Password hashing is saturated, try again shortly')
+
+        started = time.monotonic()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            if self.workers <= 0:
+                try:
+                    return fn(*args)
+                finally:
+                    self._slots.release()
+
+            executor = self._get_executor()
+            try:
+                future = executor.submit(fn, *args)
+            except BrokenProcessPool:
+                self._slots.release()
+                self._reset_executor(executor)
+                raise HashServiceBusy('Password hashing restarted, try again shortly')
+            except RuntimeError:
+                # Another thread shut this pool down after a crash; retry once on its replacement
+                try:
+                    executor = self._get_executor()
+                    future = executor.submit(fn, *args)
+                except (BrokenProcessPool, RuntimeError):
+                    self._slots.release()
+                    raise HashServiceBusy('Password hashing restarted, try again shortly')
+            # The slot stays taken until the job finishes or is cancelled, so
+            # timed-out work still counts against the queue bound
+            future.add_done_callback(lambda _: self._slots.release())
+            try:
+                return future.result(timeout=self.timeout)
+            except FuturesTimeout:
+                future.cancel()
+                raise HashServiceBusy('Password hashing timed out, try again shortly')
+            except BrokenProcessPool:
+                self._reset_executor(executor)
+                raise HashServiceBusy('Password hashing restarted, try again shortly')
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._in_flight -= 1
+                self._record(op, elapsed)
+
+    def _record(self, op, elapsed):
+        metrics = self._metrics[op]
+        metrics['count'] += 1
+        metrics['sum_seconds'] += elapsed
+        metrics['max_seconds'] = max(metrics['max_seconds'], elapsed)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed <= bound:
+                metrics['buckets'][i] += 1
+
+    def stats(self):
+        """Return hashing latency and saturation counters"""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'in_flight': self._in_flight,
+                'rounds': BCRYPT_ROUNDS,
+                'bucket_bounds': list(LATENCY_BUCKETS),
+                **{op: dict(metrics, buckets=list(metrics['buckets'])) for op, metrics in self._metrics.items()}
+            }
+
+hash_service = HashService()
+
 def hash_password(password):
     """Hash a password using bcrypt"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return hash_service.run('hash', _bcrypt_hash, password, BCRYPT_ROUNDS)
 
 def verify_password(password, hashed):
     """Verify a password against its hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    return hash_service.run('verify', _bcrypt_check, password, hashed)
+
+def needs_rehash(hashed):
+    """Check whether a bcrypt hash was made with a different work factor than BCRYPT_ROUNDS"""
+    try:
+        return int(hashed.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
 
 def generate_token(user_id, email, is_admin=False):
     """Generate a JWT token"""
@@ -51,7 +182,9 @@ def require_auth(f):
             return jsonify({'error': 'Invalid or expired token'}), 401
         
         request.user = payload
-        return f(*args, **kwargs)
+        # Pins this user's reads to the primary for a moment after they write
+        with session(f"user:{payload['user_id']}"):
+            return f(*args, **kwargs)
     
     return decorated_function
 
@@ -72,6 +205,7 @@ def require_admin(f):
             return jsonify({'error': 'Admin access required'}), 403
         
         request.user = payload
-        return f(*args, **kwargs)
+        with session(f"admin:{payload['user_id']}"):
+            return f(*args, **kwargs)
     
     return decorated_function
@@ -0,0 +1,216 @@
+"""Check the query plans of the hot model queries against a seeded database.
+
+Usage (from backend/, after bench/seed.py):
+    DB_NAME=ecommerce_bench python bench/explain.py [--verbose]
+
+Calls each hot model function with real ids from the database and records
+every statement it sends. It then runs EXPLAIN on each one. Writes happen
+inside a transaction that is rolled back. Exits non-zero if a plan scans a
+whole table or needs a filesort, unless that case explicitly allows it.
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import database
+import inventory
+import models
+from database import ConnectionPool, get_db_connection, transaction
+
+class Rollback(Exception):
+    """Raised to discard the writes made while capturing a case"""
+
+class RecordingCursor:
+    """Cursor proxy that records every statement before running it"""
+
+    def __init__(self, cursor, statements):
+        self._cursor = cursor
+        self._statements = statements
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        self._statements.append((str(operation), tuple(params or ())))
+        return self._cursor.execute(operation, params, *args, **kwargs)
+
+    def executemany(self, operation, rows):
+        # Plan the statement once, with the first row
+        if rows:
+            self._statements.append((str(operation), tuple(rows[0])))
+        return self._cursor.executemany(operation, rows)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class RecordingConnection:
+    """Connection proxy whose cursors record statements"""
+
+    def __init__(self, connection, statements):
+        self._connection = connection
+        self._statements = statements
+
+    def cursor(self, *args, **kwargs):
+        return RecordingCursor(self._connection.cursor(*args, **kwargs), self._statements)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+def load_fixtures(connection):
+    """Pick ids for the cases from the seeded data"""
+    cursor = connection.cursor()
+    queries = {
+        'product_id': "SELECT id FROM products ORDER BY id LIMIT 1",
+        'category_id': "SELECT category_id FROM products GROUP BY category_id ORDER BY COUNT(*) DESC LIMIT 1",
+        'brand': "SELECT brand FROM products GROUP BY brand ORDER BY COUNT(*) DESC LIMIT 1",
+        'cart_user_id': "SELECT user_id FROM cart LIMIT 1",
+        'order_user_id': "SELECT user_id FROM orders LIMIT 1",
+        'order_id': "SELECT id FROM orders ORDER BY id LIMIT 1",
+        'email': "SELECT email FROM users LIMIT 1",
+        'product_key': "SELECT created_at, id FROM products ORDER BY created_at DESC, id DESC LIMIT 1 OFFSET 50",
+        'order_key': "SELECT created_at, id FROM orders ORDER BY created_at DESC, id DESC LIMIT 1 OFFSET 50",
+    }
+    fixtures = {}
+    for name, query in queries.items():
+        cursor.execute(query)
+        row = cursor.fetchone()
+        if row is None:
+            raise SystemExit('Benchmark database is empty; run bench/seed.py first')
+        fixtures[name] = row[0] if len(row) == 1 else tuple(row)
+    cursor.close()
+    return fixtures
+
+def hot_cases(f):
+    """(label, call, allowed problems) for every hot model query"""
+    month_ago = datetime.now() - timedelta(days=30)
+    return [
+        ('products page', lambda: models.get_all_products(13, 24), ()),
+        ('products by category', lambda: models.get_all_products(13, 0, category_id=f['category_id']), ()),
+        ('products by brand', lambda: models.get_all_products(13, 0, brand=f['brand']), ()),
+        ('products by category and brand',
+         lambda: models.get_all_products(13, 0, category_id=f['category_id'], brand=f['brand']), ()),
+        ('products after cursor', lambda: models.get_all_products(13, after=f['product_key']), ()),
+        ('products by category after cursor',
+         lambda: models.get_all_products(13, category_id=f['category_id'], after=f['product_key']), ()),
+        ('products by price and stock',
+         lambda: models.get_all_products(13, 0, min_price=10000, max_price=50000, in_stock=True), ()),
+        ('products by spec', lambda: models.get_all_products(13, 0, spec_filters=(('ram_gb', '>=', 8.0),)), ()),
+        # Matches are ranked by recency, so the (small) match set is sorted
+        ('products search', lambda: models.get_all_products(13, 0, search='galaxy pro'), ('filesort',)),
+        ('product by id', lambda: models.get_product_by_id(f['product_id']), ()),
+        ('products by ids', lambda: models.get_products_by_ids([f['product_id'], f['product_id'] + 1]), ()),
+        ('featured products', lambda: models.get_featured_products(6), ()),
+        ('related products', lambda: models.get_related_products(f['product_id']), ()),
+        ('record co-purchases', lambda: models.record_co_purchases([f['product_id'], f['product_id'] + 1]), ()),
+        # A handful of rows
+        ('categories', lambda: models.get_all_categories(), ('full scan', 'filesort')),
+        ('user by email', lambda: models.get_user_by_email(f['email']), ()),
+        ('cart', lambda: models.get_user_cart(f['cart_user_id']), ()),
+        ('cart summary', lambda: models.get_cart_summary(f['cart_user_id']), ()),
+        ('cart batch update',
+         lambda: models.apply_cart_operations(f['cart_user_id'], [('add', f['product_id'], 1), ('remove', f['product_id'] + 1, 0)],
+                                               inventory.RESERVATION_TTL), ()),
+        ('user orders', lambda: models.get_user_orders(f['order_user_id']), ()),
+        ('user orders with items', lambda: models.get_user_orders(f['order_user_id'], include_items=True), ()),
+        ('order by id', lambda: models.get_order_by_id(f['order_id'], f['order_user_id']), ()),
+        ('order items', lambda: models.get_order_items(f['order_id']), ()),
+        ('admin orders page', lambda: models.get_all_orders(21, 40), ()),
+        ('admin orders after cursor', lambda: models.get_all_orders(21, after=f['order_key']), ()),
+        ('checkout', lambda: models.place_order(f['cart_user_id'], '1 Plan Street'), ()),
+        ('expire reservations', lambda: models.expire_reservations(), ()),
+        ('queued order ids', lambda: models.get_queued_order_ids(50), ()),
+        # One row per bucketed product
+        ('refresh bucketed stock', lambda: models.refresh_bucketed_stock(), ('full scan',)),
+        ('order status update', lambda: models.update_order_status(f['order_id'], 'processing', 'completed'), ()),
+        ('sales daily', lambda: models.get_daily_sales(30), ()),
+        ('sales top products', lambda: models.get_top_products_by_revenue(10), ()),
+        # One row per category
+        ('sales by category', lambda: models.get_category_sales(), ('filesort',)),
+        ('order export (one month)', lambda: list(models.iter_orders(start=month_ago)), ()),
+    ]
+
+def capture(call, statements):
+    """Run one case in a rolled back transaction; returns (statements sent, unexpected error or None)"""
+    statements.clear()
+    error = None
+    try:
+        with transaction():
+            call()
+            raise Rollback()
+    except Rollback:
+        pass
+    except (models.InsufficientStockError, models.CartError) as e:
+        # Depends on the seeded stock; the statements sent so far are still planned
+        print(f"     (case raised {type(e).__name__}: {e})")
+    except Exception as e:
+        error = e
+    return list(statements), error
+
+def problems(plan_rows):
+    """Return the plan problems found in traditional EXPLAIN output"""
+    found = []
+    for row in plan_rows:
+        table = row.get('table') or ''
+        # Derived tables hold one page from an index-ordered subquery; scanning
+        # and re-sorting that page is expected
+        if table.startswith('<'):
+            continue
+        if row.get('type') == 'ALL':
+            found.append(('full scan', table))
+        if 'Using filesort' in (row.get('Extra') or ''):
+            found.append(('filesort', table))
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--verbose', action='store_true', help='print every plan')
+    args = parser.parse_args()
+
+    explain_connection = get_db_connection()
+    if explain_connection is None:
+        sys.exit('Could not connect to the database (check DB_HOST / DB_NAME)')
+    fixtures = load_fixtures(explain_connection)
+
+    statements = []
+    # Model calls go through recording primary connections (a second one for stream_query)
+    database.pool = ConnectionPool(connect=lambda: RecordingConnection(get_db_connection(), statements),
+                                   size=2, max_overflow=0)
+    database.replica_pools = []
+
+    explain = explain_connection.cursor(dictionary=True)
+    failures = 0
+    for label, call, allowed in hot_cases(fixtures):
+        seen = set()
+        case_problems = []
+        case_statements, error = capture(call, statements)
+        if error is not None:
+            case_problems.append(('error', type(error).__name__, str(error)[:120]))
+        for sql, params in case_statements:
+            verb = sql.lstrip().split(None, 1)[0].upper()
+            if verb not in ('SELECT', 'UPDATE', 'DELETE', 'INSERT') or (sql, params) in seen:
+                continue
+            seen.add((sql, params))
+            if verb == 'INSERT' and 'SELECT' not in sql.upper():
+                continue
+            explain.execute(f"EXPLAIN {sql}", params)
+            plan = explain.fetchall()
+            if args.verbose:
+                print(f"-- {label}\n{' '.join(sql.split())}")
+                for row in plan:
+                    print(f"   {row['table']}: type={row['type']} key={row['key']} rows={row['rows']} {row['Extra'] or ''}")
+            case_problems.extend((kind, table, ' '.join(sql.split())[:120])
+                                 for kind, table in problems(plan) if kind not in allowed)
+
+        status = 'FAIL' if case_problems else 'ok'
+        print(f"{status:4} {label}")
+        for kind, table, sql in case_problems:
+            print(f"     {kind} on {table}: {sql}")
+        failures += bool(case_problems)
+
+    explain.close()
+    explain_connection.close()
+    if failures:
+        sys.exit(f"{failures} case(s) have plan regressions")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""Hammer one product's stock from many threads and check that nothing is oversold.
+
+Usage (from backend/, against a scratch database with the current schema):
+    DB_NAME=ecommerce_bench python bench/inventory_stress.py --stock 500 --concurrency 64 --buckets 8
+
+Creates a product with --stock units and one user per worker. Every worker
+loops adding 1-3 units to its cart, sometimes dropping units again, and
+checking out, until the stock runs out. Then the script checks that
+    initial stock = unreserved + reserved + sold
+with no negative counter, expires every remaining reservation, sweeps,
+and checks the reserved units came back. Exits non-zero on any violation.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import database
+import inventory
+import models
+from database import ConnectionPool, PoolTimeout, execute_one, execute_query, execute_update
+from mysql.connector import Error
+
+def create_fixtures(stock, workers):
+    """Insert the contended product and one user per worker; returns (product_id, user_ids)"""
+    run = uuid.uuid4().hex[:8]
+    category = execute_one("SELECT id FROM categories ORDER BY id LIMIT 1")
+    if category is None:
+        sys.exit('No categories; run bench/seed.py first')
+    product_id = models.create_product(f'Stress Test {run}', 'Bench', category['id'], 999, None,
+                                       'Inventory stress test product', {}, None, stock)
+    if not product_id:
+        sys.exit('Could not create the stress test product')
+    user_ids = [models.create_user(f'stress-{run}-{i}@bench.local', 'x', f'Stress {i}') for i in range(workers)]
+    return product_id, user_ids
+
+def counters(product_id):
+    """Return (unreserved, reserved, sold, lowest counter) for the product"""
+    product = execute_one("SELECT stock_quantity, stock_buckets FROM products WHERE id = %s", (product_id,))
+    buckets = execute_query("SELECT available FROM inventory_buckets WHERE product_id = %s", (product_id,), fetch=True)
+    if product['stock_buckets']:
+        unreserved = sum(row['available'] for row in buckets)
+        lowest = min(row['available'] for row in buckets)
+    else:
+        unreserved = lowest = product['stock_quantity']
+    reserved = execute_one("SELECT COALESCE(SUM(quantity), 0) AS units FROM inventory_reservations WHERE product_id = %s",
+                           (product_id,))['units']
+    sold = execute_one("SELECT COALESCE(SUM(quantity), 0) AS units FROM order_items WHERE product_id = %s",
+                       (product_id,))['units']
+    return int(unreserved), int(reserved), int(sold), int(lowest)
+
+def check(label, stock, product_id, expect_reserved=None):
+    unreserved, reserved, sold, lowest = counters(product_id)
+    print(f"{label}: unreserved={unreserved} reserved={reserved} sold={sold}")
+    failures = []
+    if unreserved + reserved + sold != stock:
+        failures.append(f"{unreserved} + {reserved} + {sold} != {stock} initial units")
+    if lowest < 0 or reserved < 0:
+        failures.append("a stock counter went negative")
+    if sold > stock:
+        failures.append(f"oversold: {sold} sold from {stock}")
+    if expect_reserved is not None and reserved != expect_reserved:
+        failures.append(f"expected {expect_reserved} reserved units, found {reserved}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return not failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--stock', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--buckets', type=int, default=0, help='split the stock over this many rows (0 = one row)')
+    parser.add_argument('--checkout-rate', type=float, default=0.5, help='chance a worker checks out after adding')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    # One connection per worker, so the pool never becomes the bottleneck being measured
+    database.pool = ConnectionPool(size=args.concurrency + 1, max_overflow=0)
+    database.replica_pools = []
+
+    product_id, user_ids = create_fixtures(args.stock, args.concurrency)
+    if args.buckets:
+        models.set_stock_buckets(product_id, args.buckets)
+
+    totals = {'reserved': 0, 'rejected': 0, 'orders': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random(args.seed + index)
+        user_id = user_ids[index]
+        counts = dict.fromkeys(totals, 0)
+        misses = 0
+        # A few misses in a row means the stock is gone (reservations elsewhere may still be released)
+        while misses < 20:
+            quantity = rng.randint(1, 3)
+            try:
+                models.apply_cart_operations(user_id, [('add', product_id, quantity)], inventory.RESERVATION_TTL)
+                counts['reserved'] += quantity
+                misses = 0
+            except models.CartError:
+                counts['rejected'] += 1
+                misses += 1
+            except (Error, PoolTimeout) as e:
+                counts['errors'] += 1
+                print(f"worker {index}: {e}")
+                continue
+
+            try:
+                if rng.random() < 0.2:
+                    # Drop back to one unit, releasing the rest
+                    models.apply_cart_operations(user_id, [('set', product_id, 1)], inventory.RESERVATION_TTL)
+                if rng.random() < args.checkout_rate and models.place_order(user_id, 'Stress Street'):
+                    counts['orders'] += 1
+            except models.InsufficientStockError:
+                counts['rejected'] += 1
+            except (Error, PoolTimeout) as e:
+                counts['errors'] += 1
+                print(f"worker {index}: {e}")
+        with lock:
+            for key, value in counts.items():
+                totals[key] += value
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    print(f"{args.concurrency} workers, {args.buckets or 1} stock row(s), {elapsed:.2f}s: "
+          f"{totals['reserved']} units reserved, {totals['orders']} orders, "
+          f"{totals['rejected']} rejections, {totals['errors']} errors")
+
+    ok = check('after run', args.stock, product_id)
+
+    # Expire everything still held and let the sweeper return it
+    execute_update("UPDATE inventory_reservations SET expires_at = NOW() - INTERVAL 1 SECOND WHERE product_id = %s",
+                   (product_id,))
+    print(f"Sweeper expired {inventory.sweep()} reservation(s)")
+    ok = check('after sweep', args.stock, product_id, expect_reserved=0) and ok
+
+    if not ok or totals['errors']:
+        sys.exit('Inventory invariants violated' if not ok else 'Workers hit database errors')
+    print("OK: no oversell")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+"""Drive a realistic request mix against the API and report latency per endpoint.
+
+Usage (from backend/, after bench/seed.py):
+    DB_NAME=ecommerce_bench python bench/run.py --duration 60 --concurrency 16 \\
+        --output bench_results.json --baseline bench_baseline.json
+
+Starts server.py on a local port (or targets --url), runs the weighted
+scenario mix, and writes throughput, p50/p95/p99 latency and DB queries
+per request for every endpoint as JSON. With --baseline, exits non-zero
+if any endpoint regressed by more than --tolerance.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from auth import generate_token
+from database import get_db_connection
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DEFAULT_MIX = 'browse=50,search=20,cart=15,checkout=5,admin=10'
+SEARCH_TERMS = ['galaxy', 'pixel', 'pro', 'camera', 'samsung', 'amoled', 'fast charging', 'ultra', 'neo', 'gaming']
+CARD_FIELDS = 'id,name,brand,price,discount_price,image_url'
+SERVER_TIMING_RE = re.compile(r'desc="(\d+) queries"')
+
+class Client:
+    """Keep-alive HTTP client for one worker thread that records every call"""
+
+    def __init__(self, base_url, results):
+        parsed = urlparse(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.results = results
+        self.connection = None
+
+    def request(self, label, method, path, body=None, token=None):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        payload = json.dumps(body) if body is not None else None
+
+        started = time.perf_counter()
+        status, queries = 0, None
+        for attempt in range(2):
+            try:
+                if self.connection is None:
+                    self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+                self.connection.request(method, path, payload, headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                status = response.status
+                match = SERVER_TIMING_RE.search(response.getheader('Server-Timing') or '')
+                queries = int(match.group(1)) if match else None
+                if response.getheader('Connection', '').lower() == 'close' or response.version == 10:
+                    self.connection.close()
+                    self.connection = None
+                break
+            except (http.client.HTTPException, OSError):
+                # The server closed an idle keep-alive connection; retry once on a fresh one
+                if self.connection is not None:
+                    self.connection.close()
+                self.connection = None
+                data = b''
+        elapsed = time.perf_counter() - started
+
+        self.results.append((label, elapsed, status, queries))
+        try:
+            return status, json.loads(data) if data else None
+        except ValueError:
+            return status, None
+
+class Scenarios:
+    """The request mixes driven by each worker"""
+
+    def __init__(self, rng, product_ids, users, admin_token):
+        self.rng = rng
+        self.product_ids = product_ids
+        self.users = users
+        self.admin_token = admin_token
+
+    def _user_token(self):
+        user_id, email = self.rng.choice(self.users)
+        return generate_token(user_id, email)
+
+    def browse(self, client):
+        page = self.rng.randint(1, 20)
+        path = f'/api/products?page={page}&limit=12&fields={CARD_FIELDS}'
+        if self.rng.random() < 0.3:
+            path += f'&category_id={self.rng.randint(1, 3)}'
+        client.request('GET /api/products', 'GET', path)
+        client.request('GET /api/products/<id>', 'GET', f'/api/products/{self.rng.choice(self.product_ids)}')
+        if self.rng.random() < 0.2:
+            client.request('GET /api/products/featured', 'GET', f'/api/products/featured?limit=6&fields={CARD_FIELDS}')
+        if self.rng.random() < 0.1:
+            client.request('GET /api/categories', 'GET', '/api/categories')
+
+    def search(self, client):
+        term = self.rng.choice(SEARCH_TERMS).replace(' ', '+')
+        client.request('GET /api/products?search', 'GET', f'/api/products?search={term}&limit=12&fields={CARD_FIELDS}')
+
+    def cart(self, client):
+        token = self._user_token()
+        client.request('POST /api/cart', 'POST', '/api/cart',
+                       {'product_id': self.rng.choice(self.product_ids), 'quantity': 1}, token)
+        client.request('GET /api/cart', 'GET', '/api/cart', token=token)
+
+    def checkout(self, client):
+        token = self._user_token()
+        client.request('POST /api/cart', 'POST', '/api/cart',
+                       {'product_id': self.rng.choice(self.product_ids), 'quantity': 1}, token)
+        client.request('POST /api/orders', 'POST', '/api/orders',
+                       {'shipping_address': '1 Bench Street', 'payment_method': 'cod'}, token)
+
+    def admin(self, client):
+        page = self.rng.randint(1, 50)
+        client.request('GET /api/admin/orders', 'GET', f'/api/admin/orders?page={page}&limit=20',
+                       token=self.admin_token)
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, weight = part.split('=')
+        if not hasattr(Scenarios, name.strip()):
+            raise SystemExit(f'Unknown scenario: {name}')
+        mix[name.strip()] = float(weight)
+    return mix
+
+def load_fixtures():
+    """Read product and user ids from the seeded database"""
+    connection = get_db_connection()
+    if connection is None:
+        raise SystemExit('Could not connect to the database (check DB_HOST / DB_NAME)')
+    cursor = connection.cursor()
+    cursor.execute("SELECT id FROM products ORDER BY id")
+    product_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT id, email FROM users ORDER BY id LIMIT 1000")
+    users = cursor.fetchall()
+    cursor.execute("SELECT id, email FROM admin_users LIMIT 1")
+    admin = cursor.fetchone()
+    cursor.close()
+    connection.close()
+    if not product_ids or not users or not admin:
+        raise SystemExit('Benchmark database is empty; run bench/seed.py first')
+    return product_ids, users, admin
+
+def start_server(port):
+    env = dict(os.environ, SERVER_TIMING='true')
+    code = f"from server import app; app.run(host='127.0.0.1', port={port}, threaded=True, debug=False)"
+    process = subprocess.Popen([sys.executable, '-c', code], cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/api/health')
+            if connection.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise SystemExit('Server did not start')
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    # Nearest-rank percentile
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize(results, elapsed):
+    by_endpoint = {}
+    for label, latency, status, queries in results:
+        by_endpoint.setdefault(label, []).append((latency, status, queries))
+
+    endpoints = {}
+    for label, samples in sorted(by_endpoint.items()):
+        latencies = sorted(sample[0] * 1000 for sample in samples)
+        queries = [sample[2] for sample in samples if sample[2] is not None]
+        endpoints[label] = {
+            'requests': len(samples),
+            'errors': sum(1 for sample in samples if not 200 <= sample[1] < 400),
+            'throughput_rps': round(len(samples) / elapsed, 2),
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'mean_db_queries': round(sum(queries) / len(queries), 2) if queries else None,
+        }
+
+    total = len(results)
+    return {
+        'duration_seconds': round(elapsed, 2),
+        'requests': total,
+        'throughput_rps': round(total / elapsed, 2) if elapsed else 0,
+        'endpoints': endpoints,
+    }
+
+def compare(current, baseline, tolerance):
+    """Return a list of human readable regressions against a baseline report"""
+    regressions = []
+    for label, stats in current['endpoints'].items():
+        before = baseline.get('endpoints', {}).get(label)
+        if not before:
+            continue
+        for key in ('p95_ms', 'p99_ms'):
+            if before[key] and stats[key] > before[key] * (1 + tolerance):
+                regressions.append(f"{label}: {key} {before[key]} -> {stats[key]}")
+        if before['throughput_rps'] and stats['throughput_rps'] < before['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{label}: throughput {before['throughput_rps']} -> {stats['throughput_rps']}")
+        if before.get('mean_db_queries') is not None and stats['mean_db_queries'] is not None \
+                and stats['mean_db_queries'] > before['mean_db_queries']:
+            regressions.append(f"{label}: db queries {before['mean_db_queries']} -> {stats['mean_db_queries']}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='benchmark an already running server instead of starting one')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--warmup', type=float, default=5)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'scenario weights (default {DEFAULT_MIX})')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', help='previous report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='allowed regression ratio (default 0.10)')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    product_ids, users, admin = load_fixtures()
+    admin_token = generate_token(admin[0], admin[1], is_admin=True)
+
+    process = None
+    base_url = args.url
+    if not base_url:
+        process = start_server(args.port)
+        base_url = f'http://127.0.0.1:{args.port}'
+
+    results = []
+    measuring = threading.Event()
+    stop = threading.Event()
+
+    def worker(index):
+        rng = random.Random(args.seed + index)
+        scenarios = Scenarios(rng, product_ids, users, admin_token)
+        local = []
+        client = Client(base_url, local)
+        names, weights = list(mix), list(mix.values())
+        while not stop.is_set():
+            was_measuring = measuring.is_set()
+            getattr(scenarios, rng.choices(names, weights)[0])(client)
+            if not was_measuring:
+                local.clear()
+        results.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)]
+    try:
+        for thread in threads:
+            thread.start()
+        time.sleep(args.warmup)
+        measuring.set()
+        started = time.perf_counter()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        stop.set()
+        if process:
+            process.terminate()
+            process.wait()
+
+    report = summarize(results, elapsed)
+    report['config'] = {'concurrency': args.concurrency, 'mix': mix, 'seed': args.seed, 'duration': args.duration}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'endpoint':32} {'req':>7} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'dbq':>5}")
+    for label, stats in report['endpoints'].items():
+        print(f"{label:32} {stats['requests']:>7} {stats['throughput_rps']:>8} {stats['p50_ms']:>8} "
+              f"{stats['p95_ms']:>8} {stats['p99_ms']:>8} {stats['mean_db_queries'] if stats['mean_db_queries'] is not None else '-':>5}")
+    print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
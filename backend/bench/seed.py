@@ -0,0 +1,174 @@
+"""Seed a benchmark database with a synthetic catalog, users, carts and orders.
+
+Usage (from backend/):
+    DB_NAME=ecommerce_bench python bench/seed.py --reset --products 100000
+
+The generator is seeded, so the same arguments always produce the same data.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from database import get_db_connection
+from auth import _bcrypt_hash, BCRYPT_ROUNDS
+from migrate import split_statements
+import models
+from recommendations import RELATED_WINDOW_DAYS, RELATED_KEEP
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Starting point taken from seed_data.sql, widened for variety
+CATEGORIES = [('Smartphones', 'smartphones'), ('Laptops', 'laptops'), ('Accessories', 'accessories')]
+BRANDS = ['Samsung', 'Honor', 'Google', 'OnePlus', 'Vivo', 'iQOO', 'Apple', 'Xiaomi', 'Oppo', 'Motorola', 'Nothing', 'Realme']
+MODELS = ['Galaxy', 'Pixel', 'Neo', 'Pro', 'Ultra', 'Lite', 'Max', 'Edge', 'Nova', 'Zen', 'Air', 'Note']
+ADJECTIVES = ['Premium', 'Flagship', 'Compact', 'Gaming', 'Budget', 'Slim', 'Rugged', 'Creator', 'Everyday']
+FEATURES = ['200MP camera', 'AMOLED display', 'fast charging', 'telephoto lens', 'water resistance',
+            '120Hz refresh rate', 'stereo speakers', 'wireless charging', 'long battery life', '5G connectivity']
+IMAGES = [
+    'src/phone images/WhatsApp Image 2026-01-24 at 11.18.22 PM.jpeg',
+    'src/phone images/WhatsApp Image 2026-01-24 at 11.18.58 PM.jpeg',
+    'src/phone images/WhatsApp Image 2026-01-24 at 11.19.26 PM.jpeg',
+    'src/pc imge/A phone.png',
+    'src/pc imge/G phones.png',
+    'src/pc imge/J Earbud.png',
+]
+
+BENCH_PASSWORD = 'benchpass'
+BATCH_SIZE = 5000
+
+def apply_schema(connection):
+    """Recreate every table from schema.sql inside the configured database"""
+    with open(os.path.join(BACKEND_DIR, 'schema.sql')) as f:
+        statements = split_statements(f.read())
+
+    cursor = connection.cursor()
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+    for statement in statements:
+        # Stay in DB_NAME rather than switching to the database named in the file
+        if re.match(r'(CREATE DATABASE|USE)\b', statement, re.IGNORECASE):
+            continue
+        cursor.execute(statement)
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+    cursor.close()
+
+def insert_batches(connection, query, rows):
+    cursor = connection.cursor()
+    for start in range(0, len(rows), BATCH_SIZE):
+        cursor.executemany(query, rows[start:start + BATCH_SIZE])
+        connection.commit()
+    cursor.close()
+
+def make_product(rng, created_at):
+    brand = rng.choice(BRANDS)
+    category_id = rng.choices([1, 2, 3], weights=[70, 15, 15])[0]
+    name = f"{rng.choice(MODELS)} {rng.randint(1, 99)} {rng.choice(['', 'Pro', 'Plus', 'Max', 'Mini'])}".strip()
+    price = rng.randrange(999, 149999, 100)
+    discount_price = price - rng.randrange(0, price // 5, 100) if rng.random() < 0.6 else None
+    features = rng.sample(FEATURES, 3)
+    description = f"{rng.choice(ADJECTIVES)} {brand} device with {', '.join(features)}"
+    specifications = {
+        'ram': f"{rng.choice([4, 6, 8, 12, 16])}GB RAM",
+        'storage': f"{rng.choice([64, 128, 256, 512, 1024])}GB Storage",
+        'battery': f"{rng.randrange(3000, 7000, 100)}mAh",
+        'display': f"{rng.choice([6.1, 6.4, 6.7, 6.8, 7.0])} inch",
+    }
+    return (f"{brand} {name}", brand, category_id, price, discount_price, description,
+            json.dumps(specifications), rng.choice(IMAGES), rng.randint(1000, 100000),
+            rng.random() < 0.01, created_at)
+
+def seed(connection, products, users, orders, carts, seed_value=42):
+    rng = random.Random(seed_value)
+    now = datetime.now().replace(microsecond=0)
+    # Every seeded account shares one password so the login scenario can use any of them
+    password_hash = _bcrypt_hash(BENCH_PASSWORD, BCRYPT_ROUNDS)
+
+    insert_batches(connection, "INSERT INTO categories (name, slug) VALUES (%s, %s)", CATEGORIES)
+    insert_batches(connection, "INSERT INTO admin_users (username, password_hash, email) VALUES (%s, %s, %s)",
+                   [('admin', password_hash, 'admin@bench.local')])
+
+    print(f"Seeding {products} products...")
+    product_rows = [make_product(rng, now - timedelta(seconds=rng.randint(0, 2 * 365 * 86400)))
+                    for _ in range(products)]
+    insert_batches(connection, """
+        INSERT INTO products (name, brand, category_id, price, discount_price, description,
+                              specifications, image_url, stock_quantity, is_featured, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, product_rows)
+
+    print("Extracting spec attributes...")
+    models.rebuild_product_attributes()
+
+    print(f"Seeding {users} users...")
+    insert_batches(connection, """
+        INSERT INTO users (email, password_hash, full_name, phone, address)
+        VALUES (%s, %s, %s, %s, %s)
+    """, [(f"user{i}@bench.local", password_hash, f"Bench User {i}", f"90000{i:05d}", f"{i} Bench Street")
+          for i in range(1, users + 1)])
+
+    print(f"Seeding {carts} carts...")
+    cart_rows = set()
+    for user_id in range(1, min(carts, users) + 1):
+        for product_id in rng.sample(range(1, products + 1), rng.randint(1, 5)):
+            cart_rows.add((user_id, product_id, rng.randint(1, 3)))
+    insert_batches(connection, "INSERT INTO cart (user_id, product_id, quantity) VALUES (%s, %s, %s)",
+                   sorted(cart_rows))
+    models.refresh_cart_summaries(user_id for user_id, _, _ in cart_rows)
+
+    print(f"Seeding {orders} orders...")
+    statuses = ['pending', 'processing', 'shipped', 'delivered', 'cancelled']
+    order_rows = []
+    item_rows = []
+    for order_id in range(1, orders + 1):
+        items = [(rng.randint(1, products), rng.randint(1, 3)) for _ in range(rng.randint(1, 4))]
+        total = 0
+        for product_id, quantity in items:
+            price = product_rows[product_id - 1][4] or product_rows[product_id - 1][3]
+            total += price * quantity
+            item_rows.append((order_id, product_id, quantity, price))
+        order_rows.append((rng.randint(1, users), total, rng.choice(statuses), 'cod',
+                           'Bench Street', now - timedelta(seconds=rng.randint(0, 365 * 86400))))
+    insert_batches(connection, """
+        INSERT INTO orders (user_id, total_amount, status, payment_method, shipping_address, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, order_rows)
+    insert_batches(connection, "INSERT INTO order_items (order_id, product_id, quantity, price) VALUES (%s, %s, %s, %s)",
+                   item_rows)
+
+    print("Writing order summaries...")
+    models.rebuild_order_summaries()
+
+    print("Rebuilding sales rollups...")
+    models.rebuild_sales_rollups()
+
+    print("Rebuilding co-purchase counts...")
+    models.rebuild_cooccurrence(RELATED_WINDOW_DAYS, RELATED_KEEP)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reset', action='store_true', help='drop and recreate all tables first')
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--orders', type=int, default=20000)
+    parser.add_argument('--carts', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    connection = get_db_connection()
+    if connection is None:
+        sys.exit('Could not connect to the database (check DB_HOST / DB_NAME)')
+    connection.autocommit = False
+
+    if args.reset:
+        apply_schema(connection)
+    seed(connection, args.products, args.users, args.orders, args.carts, args.seed)
+    connection.close()
+    print("Done.")
+
+if __name__ == '__main__':
+    main()
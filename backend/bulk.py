@@ -0,0 +1,234 @@
+import csv
+import io
+import json
+import os
+from decimal import Decimal, InvalidOperation
+from mysql.connector import Error
+import models
+from database import PoolTimeout
+
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 500))
+# Stop listing row errors after this many (they are still counted)
+MAX_REPORTED_ERRORS = 1000
+
+EXPORT_COLUMNS = models.PRODUCT_IMPORT_COLUMNS + ('id', 'category_name', 'created_at')
+ORDER_EXPORT_COLUMNS = ('id', 'created_at', 'user_id', 'email', 'full_name', 'status', 'payment_status',
+                        'payment_method', 'total_amount', 'shipping_address')
+ORDER_ITEM_EXPORT_COLUMNS = ('product_id', 'product_name', 'quantity', 'price')
+
+def iter_records(stream, fmt):
+    """Yield (line_number, record_dict) from a CSV or NDJSON byte stream without reading it all"""
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    for line_number, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_number, ValueError('Invalid JSON')
+            continue
+        if not isinstance(record, dict):
+            yield line_number, ValueError('Each line must be a JSON object')
+            continue
+        yield line_number, record
+
+def _decimal(value, field, required=True):
+    if value in (None, ''):
+        if required:
+            raise ValueError(f'{field} is required')
+        return None
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f'{field} must be a number')
+    if number < 0:
+        raise ValueError(f'{field} must not be negative')
+    return number
+
+def _int(value, field, default=None):
+    if value in (None, ''):
+        if default is None:
+            raise ValueError(f'{field} is required')
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{field} must be an integer')
+
+def _bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes')
+
+def normalize(record):
+    """Validate an import record and return it as a PRODUCT_IMPORT_COLUMNS tuple"""
+    if isinstance(record, Exception):
+        raise record
+
+    for field in ('sku', 'name', 'brand'):
+        if not str(record.get(field) or '').strip():
+            raise ValueError(f'{field} is required')
+
+    specifications = record.get('specifications') or {}
+    if isinstance(specifications, str):
+        try:
+            specifications = json.loads(specifications) if specifications.strip() else {}
+        except ValueError:
+            raise ValueError('specifications must be a JSON object')
+    if not isinstance(specifications, dict):
+        raise ValueError('specifications must be a JSON object')
+
+    price = _decimal(record.get('price'), 'price')
+    discount_price = _decimal(record.get('discount_price'), 'discount_price', required=False)
+    if discount_price is not None and discount_price > price:
+        raise ValueError('discount_price must not exceed price')
+
+    return (
+        str(record['sku']).strip(),
+        str(record['name']).strip(),
+        str(record['brand']).strip(),
+        _int(record.get('category_id'), 'category_id'),
+        price,
+        discount_price,
+        record.get('description') or None,
+        json.dumps(specifications),
+        record.get('image_url') or None,
+        _int(record.get('stock_quantity'), 'stock_quantity', default=0),
+        _bool(record.get('is_featured', False)),
+    )
+
+class ImportReport:
+    """Running totals and per-row errors for one import"""
+
+    def __init__(self):
+        self.processed = 0
+        self.upserted = 0
+        self.failed = 0
+        self.batches = 0
+        self.errors = []
+
+    def error(self, line_number, sku, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_number, 'sku': sku, 'error': message})
+
+    def as_dict(self):
+        return {
+            'processed': self.processed,
+            'upserted': self.upserted,
+            'failed': self.failed,
+            'batches': self.batches,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors)
+        }
+
+def _flush(batch, report):
+    """Upsert one batch; if the batch fails, retry its rows one by one to isolate the bad ones"""
+    if not batch:
+        return
+    report.batches += 1
+    try:
+        models.upsert_products([row for _, row in batch])
+        report.upserted += len(batch)
+        return
+    except (Error, PoolTimeout):
+        pass
+
+    for line_number, row in batch:
+        try:
+            models.upsert_products([row])
+            report.upserted += 1
+        except (Error, PoolTimeout) as e:
+            report.error(line_number, row[0], getattr(e, 'msg', None) or str(e))
+
+def import_products(stream, fmt, batch_size=IMPORT_BATCH_SIZE):
+    """Stream-parse a CSV/NDJSON upload and upsert it in batched transactions"""
+    report = ImportReport()
+    batch = []
+    seen = {}
+
+    for line_number, record in iter_records(stream, fmt):
+        report.processed += 1
+        try:
+            row = normalize(record)
+        except ValueError as e:
+            sku = record.get('sku') if isinstance(record, dict) else None
+            report.error(line_number, sku, str(e))
+            continue
+
+        # A sku repeated within one batch would be upserted twice in one statement; keep the last
+        if row[0] in seen:
+            batch[seen[row[0]]] = (line_number, row)
+        else:
+            seen[row[0]] = len(batch)
+            batch.append((line_number, row))
+
+        if len(batch) >= batch_size:
+            _flush(batch, report)
+            batch = []
+            seen = {}
+
+    _flush(batch, report)
+    return report.as_dict()
+
+def _export_value(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+def export_ndjson(products):
+    """Yield products as NDJSON lines"""
+    for product in products:
+        record = {column: _export_value(product.get(column)) for column in EXPORT_COLUMNS}
+        if isinstance(record['specifications'], str):
+            try:
+                record['specifications'] = json.loads(record['specifications'])
+            except ValueError:
+                pass
+        yield json.dumps(record) + '\n'
+
+def export_csv(products, columns=EXPORT_COLUMNS):
+    """Yield rows as CSV text, one line per chunk"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for product in products:
+        writer.writerow([_export_value(product.get(column)) for column in columns])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def export_orders_ndjson(orders):
+    """Yield orders (with nested items, if loaded) as NDJSON lines"""
+    for order in orders:
+        record = {column: _export_value(order.get(column)) for column in ORDER_EXPORT_COLUMNS}
+        if 'items' in order:
+            record['items'] = [{column: _export_value(item[column]) for column in ORDER_ITEM_EXPORT_COLUMNS}
+                               for item in order['items']]
+        yield json.dumps(record) + '\n'
+
+def _order_item_rows(orders):
+    """Flatten orders to one dict per item, repeating the order columns"""
+    for order in orders:
+        for item in order['items'] or [dict.fromkeys(ORDER_ITEM_EXPORT_COLUMNS)]:
+            row = dict(order)
+            row.update({f'item_{column}': value for column, value in item.items()})
+            yield row
+
+def export_orders_csv(orders, include_items=False):
+    """Yield orders as CSV text; with items there is one line per order item"""
+    if not include_items:
+        return export_csv(orders, ORDER_EXPORT_COLUMNS)
+    columns = ORDER_EXPORT_COLUMNS + tuple(f'item_{column}' for column in ORDER_ITEM_EXPORT_COLUMNS)
+    return export_csv(_order_item_rows(orders), columns)
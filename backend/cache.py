@@ -0,0 +1,191 @@
+from collections import OrderedDict
+import threading
+import time
+
+class LRUCache:
+    """Thread-safe LRU cache with per-entry TTLs, tag invalidation and hit/miss counters"""
+
+    def __init__(self, max_entries=1000, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return default
+
+            value, expires_at, _ = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._delete(key)
+                self._expirations += 1
+                self._misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key, value, ttl=None, tags=()):
+        """Store a value, evicting the least recently used entries when full"""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+
+        with self._lock:
+            if key in self._entries:
+                self._delete(key)
+            self._entries[key] = (value, expires_at, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._delete(oldest)
+                self._evictions += 1
+
+    def delete(self, key):
+        """Remove a single entry"""
+        with self._lock:
+            if key in self._entries:
+                self._delete(key)
+                self._invalidations += 1
+
+    def invalidate_tag(self, tag):
+        """Remove every entry stored with the given tag"""
+        with self._lock:
+            for key in list(self._tags.get(tag, ())):
+                self._delete(key)
+                self._invalidations += 1
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._invalidations += len(self._entries)
+            self._entries.clear()
+            self._tags.clear()
+
+    def _delete(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self):
+        """Return a snapshot of cache counters"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': round(self._hits / lookups, 4) if lookups else 0.0,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'invalidations': self._invalidations
+            }
+
+class Refresher:
+    """Keeps an in-process index loaded without making requests wait for rebuilds.
+
+    The first load runs on the request that needs it (once per process).
+    After the TTL expires or invalidate() is called, requests keep using the
+    current index while a single background thread rebuilds it.
+
+    The index calls changed() for every incremental add/remove, and its
+    load(rows, unchanged) must keep the current index when unchanged() is
+    false: rows read before such a write would otherwise drop it.
+    """
+
+    def __init__(self, name, ttl):
+        self.name = name
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._first_load = threading.Lock()
+        self._loaded_at = None
+        self._generation = 0
+        self._loaded_generation = 0
+        self._writes = 0
+        self._rebuilding = False
+        self._stats = {'reloads': 0, 'reload_errors': 0, 'reload_discards': 0, 'last_reload_seconds': 0.0}
+
+    def ensure(self, loader, load):
+        """Call load(loader()) now if nothing is loaded, or in the background if it is stale"""
+        if self._loaded_at is None:
+            with self._first_load:
+                if self._loaded_at is None:
+                    self._reload(loader, load)
+            return
+        with self._lock:
+            fresh = self._loaded_generation == self._generation and time.monotonic() - self._loaded_at < self.ttl
+            if fresh or self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild, args=(loader, load), name=f'{self.name}-reload', daemon=True).start()
+
+    def invalidate(self):
+        """Rebuild on the next request; the current index is served until then"""
+        with self._lock:
+            self._generation += 1
+            self._writes += 1
+
+    def changed(self):
+        """Record an incremental write so a rebuild that started earlier is discarded"""
+        with self._lock:
+            self._writes += 1
+
+    def _unchanged_since(self, writes):
+        with self._lock:
+            return self._writes == writes
+
+    def _rebuild(self, loader, load):
+        try:
+            self._reload(loader, load)
+        finally:
+            with self._lock:
+                self._rebuilding = False
+
+    def _reload(self, loader, load):
+        started = time.monotonic()
+        with self._lock:
+            generation = self._generation
+            writes = self._writes
+        loaded = False
+        try:
+            rows = loader()
+            if rows is not None:
+                loaded = load(rows, lambda: self._unchanged_since(writes))
+        except Exception as e:
+            print(f"Reloading {self.name} failed: {e}")
+            rows = None
+        with self._lock:
+            if rows is None:
+                self._stats['reload_errors'] += 1
+                return
+            if not loaded:
+                # Superseded by a write; still stale, so the next request rebuilds again
+                self._stats['reload_discards'] += 1
+                return
+            self._loaded_at = started
+            self._loaded_generation = generation
+            self._stats['reloads'] += 1
+            self._stats['last_reload_seconds'] = time.monotonic() - started
+
+    def stats(self):
+        """Return reload counters"""
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+from datetime import datetime, timezone
+import models
+from cache import LRUCache
+
+# Read-through cache for catalog reads. Cached values are shared between
+# requests and must be treated as read-only by callers.
+CACHE_SIZE = int(os.getenv('CATALOG_CACHE_SIZE', 1000))
+CACHE_TTL = float(os.getenv('CATALOG_CACHE_TTL', 60))
+
+cache = LRUCache(max_entries=CACHE_SIZE, ttl=CACHE_TTL)
+
+_MISSING = object()
+_generation = 0
+_generation_lock = threading.Lock()
+# When this process last saw the catalog change (the HTTP Last-Modified of cached responses)
+_changed_at = datetime.now(timezone.utc).replace(microsecond=0)
+
+def parse_specifications(product):
+    """Decode a product's JSON specifications and image_srcset in place"""
+    if product.get('specifications') and isinstance(product['specifications'], (str, bytes)):
+        try:
+            product['specifications'] = json.loads(product['specifications'])
+        except (TypeError, ValueError):
+            product['specifications'] = {}
+    if product.get('image_srcset') and isinstance(product['image_srcset'], (str, bytes)):
+        try:
+            product['image_srcset'] = json.loads(product['image_srcset'])
+        except (TypeError, ValueError):
+            product['image_srcset'] = None
+    return product
+
+def product_tag(product_id):
+    """Cache tag shared by every entry that shows a single product"""
+    return f'product:{product_id}'
+
+def parse_fields(value):
+    """Parse a comma separated `fields=` parameter into a sorted tuple (None means all fields).
+
+    Raises ValueError for unknown field names.
+    """
+    if not value:
+        return None
+    fields = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = fields - set(models.PRODUCT_FIELDS) - {'category_name'}
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(sorted(fields | {'id'}))
+
+def project(product, fields):
+    """Return a copy of a cached product limited to `fields`"""
+    if not fields:
+        return product
+    return {field: product[field] for field in fields if field in product}
+
+def _parse_all(products):
+    if products is None:
+        return None
+    for product in products:
+        parse_specifications(product)
+    return products
+
+def read_through(key, loader, tags):
+    """Return the cached value for key, loading and storing it on a miss"""
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    # Skip storing if an invalidation raced with the load
+    generation = _generation
+    value = loader()
+    if value is not None and generation == _generation:
+        cache.set(key, value, tags=tags)
+    return value
+
+def get_products(**filters):
+    """Cached models.get_all_products with parsed specifications"""
+    key = ('products',) + tuple(sorted(filters.items()))
+    return read_through(key, lambda: _parse_all(models.get_all_products(**filters)), ('product_lists',))
+
+def get_product(product_id):
+    """Cached models.get_product_by_id with parsed specifications"""
+    def load():
+        product = models.get_product_by_id(product_id)
+        return parse_specifications(product) if product else None
+    return read_through(('product', product_id), load, (product_tag(product_id),))
+
+def get_products_by_ids(product_ids, fields=None):
+    """Get several products, loading only the ones not already cached.
+
+    Full rows are cached per product and projected to `fields` on the way out.
+    """
+    found = {}
+    missing = []
+    for product_id in product_ids:
+        product = cache.get(('product', product_id), _MISSING)
+        if product is _MISSING:
+            missing.append(product_id)
+        else:
+            found[product_id] = product
+
+    if missing:
+        generation = _generation
+        loaded = _parse_all(models.get_products_by_ids(missing)) or []
+        for product in loaded:
+            found[product['id']] = product
+            if generation == _generation:
+                cache.set(('product', product['id']), product, tags=(product_tag(product['id']),))
+
+    return [project(found[product_id], fields) for product_id in product_ids if product_id in found]
+
+def get_featured(limit=6, fields=None):
+    """Cached models.get_featured_products with parsed specifications"""
+    return read_through(('featured', limit, fields), lambda: _parse_all(models.get_featured_products(limit, fields)), ('product_lists',))
+
+def get_related(product_id, limit=6, fields=None):
+    """Cached models.get_related_products"""
+    return read_through(('related', product_id, limit, fields),
+                        lambda: _parse_all(models.get_related_products(product_id, limit, fields)),
+                        (product_tag(product_id), 'product_lists'))
+
+def get_categories():
+    """Cached models.get_all_categories"""
+    return read_through(('categories',), models.get_all_categories, ('categories',))
+
+def _bump_generation():
+    global _generation, _changed_at
+    with _generation_lock:
+        _generation += 1
+        _changed_at = datetime.now(timezone.utc).replace(microsecond=0)
+
+def last_changed():
+    """When the catalog last changed in this process (or when the process started)"""
+    return _changed_at
+
+def invalidate_product(product_id):
+    """Drop a product and every cached listing after it is created, updated or deleted"""
+    _bump_generation()
+    cache.invalidate_tag(product_tag(product_id))
+    cache.invalidate_tag('product_lists')
+
+def invalidate_all():
+    """Drop every cached catalog entry (after bulk imports)"""
+    _bump_generation()
+    cache.clear()
+
+def invalidate_stock(product_ids):
+    """Drop product detail entries whose stock changed (listings expire by TTL)"""
+    _bump_generation()
+    for product_id in product_ids:
+        cache.invalidate_tag(product_tag(product_id))
+
+def get_cache_stats():
+    """Get catalog cache statistics"""
+    return cache.stats()
@@ -1,12 +1,36 @@
 import mysql.connector
 from mysql.connector import Error
+from contextlib import contextmanager
+from collections import deque, OrderedDict
+from functools import wraps
+import itertools
+import threading
+import time
 import os
+import metrics
 
-def get_db_connection():
-    """Create and return a database connection"""
+# Pool configuration
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', 10))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+POOL_RECYCLE = float(os.getenv('DB_POOL_RECYCLE', 3600))
+POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+
+# Prepared statements kept open per pooled connection, and distinct statement shapes registered overall
+PREPARED_PER_CONNECTION = int(os.getenv('DB_PREPARED_PER_CONNECTION', 64))
+PREPARED_MAX_STATEMENTS = int(os.getenv('DB_PREPARED_MAX_STATEMENTS', 512))
+
+# Read replicas as "host[:port],host[:port]"; reads stay on the primary when unset
+REPLICA_HOSTS = [host.strip() for host in os.getenv('DB_REPLICA_HOSTS', '').split(',') if host.strip()]
+# Seconds a session keeps reading from the primary after it writes
+READ_YOUR_WRITES_WINDOW = float(os.getenv('DB_READ_YOUR_WRITES_WINDOW', 5))
+
+def get_db_connection(host=None, port=None):
+    """Create and return a database connection (to the primary unless host is given)"""
     try:
         connection = mysql.connector.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
+            host=host or os.getenv('DB_HOST', 'localhost'),
+            port=port or int(os.getenv('DB_PORT', 3306)),
             user=os.getenv('DB_USER', 'root'),
             password=os.getenv('DB_PASSWORD', ''),
             database=os.getenv('DB_NAME', 'ecommerce_db'),
@@ -18,47 +42,549 @@ def get_db_connection():
         print(f"Error connecting to MySQL: {e}")
         return None
 
-def execute_query(query, params=None, fetch=False):
-    """Execute a query and optionally fetch results"""
-    connection = get_db_connection()
-    if not connection:
-        return None
-    
-    try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute(query, params or ())
-        
-        if fetch:
-            result = cursor.fetchall()
-            cursor.close()
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available in time"""
+
+class ConnectionPool:
+    """Thread-safe pool of reusable MySQL connections.
+
+    Keeps up to `size` idle connections and allows `max_overflow` extra
+    connections under load. Connections are health checked on checkout
+    and recycled once they are older than `recycle` seconds.
+    """
+
+    def __init__(self, connect=get_db_connection, size=POOL_SIZE, max_overflow=POOL_MAX_OVERFLOW,
+                 timeout=POOL_TIMEOUT, recycle=POOL_RECYCLE, pre_ping=POOL_PRE_PING):
+        self._connect = connect
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+
+        self._idle = deque()
+        self._created_at = {}
+        self._open = 0
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+        self._recycled = 0
+        self._failed_checks = 0
+        self._connect_errors = 0
+
+    def acquire(self):
+        """Check out a connection, waiting up to `timeout` seconds if the pool is exhausted"""
+        deadline = None
+        waited_from = None
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    connection = self._idle.pop()
+                    break
+                if self._open < self.size + self.max_overflow:
+                    connection = None
+                    self._open += 1
+                    break
+
+                if waited_from is None:
+                    waited_from = time.monotonic()
+                    deadline = waited_from + self.timeout
+                    self._waits += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    self._wait_time += time.monotonic() - waited_from
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                self._cond.wait(remaining)
+
+            if waited_from is not None:
+                self._wait_time += time.monotonic() - waited_from
+            self._in_use += 1
+            self._checkouts += 1
+
+        if connection is not None:
+            connection = self._validate(connection)
+        if connection is None:
+            connection = self._new_connection()
+        if connection is None:
+            with self._cond:
+                self._in_use -= 1
+                self._open -= 1
+                self._cond.notify()
+        return connection
+
+    def release(self, connection, discard=False):
+        """Return a connection to the pool (or close it if it is surplus or broken)"""
+        with self._cond:
+            self._in_use -= 1
+            keep = not discard and len(self._idle) < self.size
+            if keep:
+                self._idle.append(connection)
+            else:
+                self._open -= 1
+            self._cond.notify()
+
+        if not keep:
+            self._close(connection)
+
+    def _new_connection(self):
+        connection = self._connect()
+        if connection is None:
+            with self._cond:
+                self._connect_errors += 1
+            return None
+        self._created_at[id(connection)] = time.monotonic()
+        return connection
+
+    def _validate(self, connection):
+        """Return the connection if it is still usable, otherwise close it and return None"""
+        age = time.monotonic() - self._created_at.get(id(connection), 0)
+        if self.recycle and age > self.recycle:
+            with self._cond:
+                self._recycled += 1
+            self._close(connection)
+            return None
+
+        if self.pre_ping:
+            try:
+                connection.ping(reconnect=False)
+            except Error:
+                with self._cond:
+                    self._failed_checks += 1
+                self._close(connection)
+                return None
+        return connection
+
+    def _close(self, connection):
+        self._created_at.pop(id(connection), None)
+        try:
             connection.close()
-            return result
+        except Error:
+            pass
+
+    def dispose(self):
+        """Close every idle connection"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+        for connection in idle:
+            self._close(connection)
+
+    def stats(self):
+        """Return a snapshot of pool counters"""
+        with self._cond:
+            return {
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'overflow': max(0, self._open - self.size),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_time_seconds': round(self._wait_time, 6),
+                'timeouts': self._timeouts,
+                'recycled': self._recycled,
+                'failed_health_checks': self._failed_checks,
+                'connect_errors': self._connect_errors
+            }
+
+def _replica_connect(address):
+    host, _, port = address.partition(':')
+    return lambda: get_db_connection(host, int(port) if port else None)
+
+pool = ConnectionPool()
+replica_pools = [ConnectionPool(connect=_replica_connect(address)) for address in REPLICA_HOSTS]
+_local = threading.local()
+
+_replica_turn = itertools.count()
+_pins = {}
+_routing_lock = threading.Lock()
+_routing = {'replica_reads': 0, 'pinned_reads': 0, 'replica_fallbacks': 0}
+
+def get_pool_stats():
+    """Get connection pool statistics"""
+    return pool.stats()
+
+def get_replica_pool_stats():
+    """Get connection pool statistics for every read replica"""
+    return [replica.stats() for replica in replica_pools]
+
+def get_routing_stats():
+    """Get read routing counters"""
+    with _routing_lock:
+        return dict(_routing, replicas=len(replica_pools), pinned_sessions=len(_pins))
+
+def _count(key):
+    with _routing_lock:
+        _routing[key] += 1
+
+def read_only(func):
+    """Route the function's queries to a read replica.
+
+    Only for functions that never write. Queries inside a transaction,
+    or from a session pinned by a recent write, still use the primary.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        previous = getattr(_local, 'read_only', False)
+        _local.read_only = True
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.read_only = previous
+    return wrapper
+
+@contextmanager
+def session(key):
+    """Attribute the block's writes to `key` (e.g. a user id) for read-your-writes routing"""
+    previous = getattr(_local, 'session', None)
+    _local.session = key
+    try:
+        yield
+    finally:
+        _local.session = previous
+
+def pin_session():
+    """Send the current session's reads to the primary until replicas have caught up.
+
+    Called after every write; call it directly when the session's write
+    was made elsewhere (e.g. by a background writer in another process).
+    """
+    key = getattr(_local, 'session', None)
+    if key is None or not replica_pools or READ_YOUR_WRITES_WINDOW <= 0:
+        return
+    now = time.monotonic()
+    with _routing_lock:
+        _pins[key] = now + READ_YOUR_WRITES_WINDOW
+        if len(_pins) > 10000:
+            for expired in [k for k, until in _pins.items() if until <= now]:
+                del _pins[expired]
+
+def _is_pinned():
+    key = getattr(_local, 'session', None)
+    if key is None:
+        return False
+    with _routing_lock:
+        until = _pins.get(key)
+    return until is not None and until > time.monotonic()
+
+def _acquire(read=False):
+    """Check out a connection, returning (owning pool, connection).
+
+    Reads rotate across the replicas, skipping any that cannot hand out a
+    connection, and fall back to the primary if none can.
+    """
+    if read and replica_pools:
+        if _is_pinned():
+            _count('pinned_reads')
+        else:
+            start = next(_replica_turn)
+            for i in range(len(replica_pools)):
+                replica = replica_pools[(start + i) % len(replica_pools)]
+                try:
+                    connection = replica.acquire()
+                except PoolTimeout:
+                    connection = None
+                if connection is not None:
+                    _count('replica_reads')
+                    return replica, connection
+            _count('replica_fallbacks')
+    return pool, pool.acquire()
+
+@contextmanager
+def get_connection():
+    """Check out a pooled connection for the duration of the block.
+
+    Queries run through execute_query / execute_one inside the block
+    reuse this connection instead of checking out their own. Inside a
+    read_only function the connection comes from a replica.
+    """
+    bound = getattr(_local, 'connection', None)
+    if bound is not None:
+        yield bound
+        return
+
+    started = time.perf_counter()
+    owner, connection = _acquire(read=getattr(_local, 'read_only', False))
+    metrics.observe_acquire(time.perf_counter() - started)
+    if connection is None:
+        raise Error(msg="Could not connect to the database")
+
+    _local.connection = connection
+    broken = False
+    try:
+        yield connection
+    except Error:
+        broken = not connection.is_connected()
+        raise
+    finally:
+        _local.connection = None
+        owner.release(connection, discard=broken)
+
+@contextmanager
+def transaction(isolation_level=None):
+    """Run the block in a single transaction on one pooled connection.
+
+    Commits on success and rolls back on any exception. Database errors
+    inside the block are raised instead of being swallowed. A nested block
+    joins the outer transaction (and its isolation level). Callbacks
+    registered with after_commit() run once the outermost block commits.
+    """
+    with get_connection() as connection:
+        if getattr(_local, 'in_transaction', False):
+            yield connection
+            return
+
+        connection.start_transaction(isolation_level=isolation_level)
+        _local.in_transaction = True
+        _local.after_commit = []
+        try:
+            yield connection
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            _local.in_transaction = False
+            callbacks, _local.after_commit = _local.after_commit, []
+
+    for callback in callbacks:
+        callback()
+
+def after_commit(callback):
+    """Run callback() after the current transaction commits (right away outside one).
+
+    For follow-up writes that would otherwise hold hot row locks until the
+    commit. Callbacks are dropped if the transaction, or the savepoint they
+    were registered in, rolls back.
+    """
+    if not getattr(_local, 'in_transaction', False):
+        callback()
+        return
+    _local.after_commit.append(callback)
+
+_savepoint_ids = itertools.count()
+
+@contextmanager
+def savepoint():
+    """Inside a transaction, undo only the block's writes if it raises.
+
+    Errors that abort the whole transaction (deadlocks, lock wait
+    timeouts) still have to be handled by the caller of transaction().
+    """
+    name = f"sp_{next(_savepoint_ids)}"
+    with get_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(f"SAVEPOINT {name}")
+        callbacks = getattr(_local, 'after_commit', [])
+        registered = len(callbacks)
+        try:
+            yield
+        except Exception:
+            cursor.execute(f"ROLLBACK TO SAVEPOINT {name}")
+            del callbacks[registered:]
+            raise
         else:
-            last_id = cursor.lastrowid
+            cursor.execute(f"RELEASE SAVEPOINT {name}")
+        finally:
             cursor.close()
-            connection.close()
-            return last_id
-    except Error as e:
+
+class Statement:
+    """A named SQL statement that is prepared server-side once per pooled connection"""
+
+    def __init__(self, name, sql):
+        self.name = name
+        self.sql = sql
+
+    def __str__(self):
+        return self.sql
+
+_statements = {}
+_statement_stats = {}
+_statement_lock = threading.Lock()
+
+def prepared(name, sql):
+    """Return the registered Statement for sql, registering it under name on first use.
+
+    Queries built from a variable set of clauses register one statement per
+    shape under a shared name. Once PREPARED_MAX_STATEMENTS shapes exist the
+    plain SQL string is returned, so unusual shapes run unprepared.
+    """
+    statement = _statements.get(sql)
+    if statement is not None:
+        return statement
+    with _statement_lock:
+        statement = _statements.get(sql)
+        if statement is None:
+            if len(_statements) >= PREPARED_MAX_STATEMENTS:
+                return sql
+            statement = _statements[sql] = Statement(name, sql)
+            stats = _statement_stats.setdefault(name, {'statements': 0, 'prepares': 0, 'executes': 0})
+            stats['statements'] += 1
+    return statement
+
+def _count_statement(statement, key):
+    with _statement_lock:
+        _statement_stats[statement.name][key] += 1
+
+def get_statement_stats():
+    """Per-name counts of registered shapes, server-side prepares and executions"""
+    with _statement_lock:
+        return {name: dict(stats) for name, stats in _statement_stats.items()}
+
+def _prepared_cursor(connection, statement):
+    """Return this connection's cursor for statement, preparing it on first use"""
+    cursors = getattr(connection, '_prepared_cursors', None)
+    if cursors is None:
+        cursors = connection._prepared_cursors = OrderedDict()
+
+    cursor = cursors.get(statement)
+    if cursor is not None:
+        cursors.move_to_end(statement)
+        return cursor
+
+    cursor = connection.cursor(prepared=True, dictionary=True)
+    cursors[statement] = cursor
+    _count_statement(statement, 'prepares')
+    if len(cursors) > PREPARED_PER_CONNECTION:
+        _, evicted = cursors.popitem(last=False)
+        evicted.close()
+    return cursor
+
+def _discard_prepared_cursor(connection, statement):
+    cursor = getattr(connection, '_prepared_cursors', {}).pop(statement, None)
+    if cursor is not None:
+        try:
+            cursor.close()
+        except Error:
+            pass
+
+def _in_transaction():
+    return getattr(_local, 'in_transaction', False)
+
+def _run(query, work, dictionary=False):
+    """Run work(cursor) on a pooled connection, timing it as one round-trip.
+
+    A Statement runs on the connection's cached prepared cursor (which
+    always returns dicts). Errors are logged and turned into None, except
+    inside a transaction where they are re-raised so the transaction rolls back.
+    """
+    statement = query if isinstance(query, Statement) else None
+    query = str(query)
+    try:
+        with get_connection() as connection:
+            if statement is not None:
+                cursor = _prepared_cursor(connection, statement)
+                _count_statement(statement, 'executes')
+            else:
+                cursor = connection.cursor(dictionary=dictionary)
+            started = time.perf_counter()
+            try:
+                result = work(cursor)
+            except Error:
+                if statement is not None:
+                    _discard_prepared_cursor(connection, statement)
+                raise
+            finally:
+                metrics.observe_query(query, time.perf_counter() - started)
+                if statement is None:
+                    cursor.close()
+            if not query.lstrip().upper().startswith('SELECT'):
+                pin_session()
+            return result
+    except (Error, PoolTimeout) as e:
+        metrics.observe_error(e)
+        if _in_transaction():
+            raise
         print(f"Database error: {e}")
-        if connection:
-            connection.close()
         return None
 
+def execute_query(query, params=None, fetch=False):
+    """Execute a query (SQL text or a prepared Statement) and optionally fetch results"""
+    def work(cursor):
+        cursor.execute(str(query), params or ())
+        if fetch:
+            return cursor.fetchall()
+        return cursor.lastrowid
+    return _run(query, work, dictionary=True)
+
+def execute_update(query, params=None):
+    """Execute a write and return the number of affected rows"""
+    def work(cursor):
+        cursor.execute(str(query), params or ())
+        return cursor.rowcount
+    return _run(query, work)
+
+def execute_many(query, rows):
+    """Execute a query for every parameter row (batched into one statement for INSERTs)"""
+    def work(cursor):
+        cursor.executemany(query, rows)
+        return cursor.rowcount
+    return _run(query, work)
+
 def execute_one(query, params=None):
     """Execute a query and fetch one result"""
-    connection = get_db_connection()
-    if not connection:
-        return None
-    
-    try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute(query, params or ())
+    def work(cursor):
+        cursor.execute(str(query), params or ())
         result = cursor.fetchone()
-        cursor.close()
-        connection.close()
+        # Drain any remaining rows so the connection can be reused
+        cursor.fetchall()
         return result
+    return _run(query, work, dictionary=True)
+
+STREAM_BATCH_SIZE = int(os.getenv('DB_STREAM_BATCH_SIZE', 1000))
+
+def stream_query(query, params=None, batch_size=STREAM_BATCH_SIZE):
+    """Yield rows one at a time from an unbuffered server-side cursor.
+
+    Reads from a replica when one is configured. Uses its own connection
+    (not the thread-bound one) because the generator may be resumed after
+    the request body starts streaming. The connection is discarded if the
+    caller stops early, since unread rows would leave it unusable. Errors
+    are raised rather than returned as None. Only time spent in the
+    database is recorded, not the time the caller takes between rows.
+    """
+    try:
+        owner, connection = _acquire(read=True)
+    except PoolTimeout as e:
+        metrics.observe_error(e)
+        raise
+    if connection is None:
+        raise Error(msg="Could not connect to the database")
+
+    elapsed = 0.0
+    started = time.perf_counter()
+    finished = False
+    cursor = None
+    try:
+        cursor = connection.cursor(dictionary=True, buffered=False)
+        cursor.execute(query, params or ())
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            elapsed += time.perf_counter() - started
+            started = None
+            if not rows:
+                break
+            for row in rows:
+                yield row
+            started = time.perf_counter()
+        finished = True
     except Error as e:
+        metrics.observe_error(e)
         print(f"Database error: {e}")
-        if connection:
-            connection.close()
-        return None
+        raise
+    finally:
+        if started is not None:
+            # A statement or fetch that raised
+            elapsed += time.perf_counter() - started
+        metrics.observe_query(query, elapsed)
+        if finished:
+            cursor.close()
+        owner.release(connection, discard=not finished)
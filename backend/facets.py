@@ -0,0 +1,159 @@
+import os
+import threading
+from collections import Counter
+from cache import Refresher
+
+# Upper bounds of the effective-price buckets; the last bucket is open ended
+PRICE_BUCKETS = tuple(int(edge) for edge in os.getenv('FACET_PRICE_BUCKETS', '10000,20000,30000,50000,75000,100000').split(','))
+# Rebuild from the database after this many seconds to pick up stock changes and other workers' writes
+INDEX_TTL = float(os.getenv('FACET_INDEX_TTL', 300))
+
+def price_bucket(price):
+    """Return the bucket label for an effective price"""
+    lower = 0
+    for upper in PRICE_BUCKETS:
+        if price < upper:
+            return f'{lower}-{upper}'
+        lower = upper
+    return f'{lower}+'
+
+def bucket_labels():
+    """All bucket labels in ascending order"""
+    labels = []
+    lower = 0
+    for upper in PRICE_BUCKETS:
+        labels.append(f'{lower}-{upper}')
+        lower = upper
+    labels.append(f'{lower}+')
+    return labels
+
+def bucket_range(label):
+    """Return (min_price, max_price) for a bucket label; max_price is None for the open bucket"""
+    if label not in bucket_labels():
+        raise ValueError(f'Unknown price bucket: {label}')
+    if label.endswith('+'):
+        return int(label[:-1]), None
+    lower, upper = label.split('-')
+    return int(lower), int(upper)
+
+def _cell(product):
+    price = product['discount_price'] if product.get('discount_price') else product['price']
+    return (product['category_id'], product['brand'], price_bucket(float(price)), (product.get('stock_quantity') or 0) > 0)
+
+class FacetIndex:
+    """Precomputed product counts per (category, brand, price bucket, in stock) cell.
+
+    Facet counts for any filter combination are summed over the cells, so
+    the cost depends on the number of distinct facet values, not products.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cells = Counter()
+        self._product_cells = {}
+        self._refresher = Refresher('facet-index', INDEX_TTL)
+
+    def add(self, product):
+        """Count a product, replacing its previous cell if it was already indexed"""
+        cell = _cell(product)
+        with self._lock:
+            self._refresher.changed()
+            self._remove(product['id'])
+            self._cells[cell] += 1
+            self._product_cells[product['id']] = cell
+
+    def remove(self, product_id):
+        """Stop counting a product"""
+        with self._lock:
+            self._refresher.changed()
+            self._remove(product_id)
+
+    def _remove(self, product_id):
+        cell = self._product_cells.pop(product_id, None)
+        if cell is None:
+            return
+        self._cells[cell] -= 1
+        if self._cells[cell] <= 0:
+            del self._cells[cell]
+
+    def load(self, products, unchanged=None):
+        """Rebuild the index from product rows.
+
+        Returns False, keeping the current counts, when `unchanged()` says the
+        index was written to after the rows were read.
+        """
+        cells = Counter()
+        product_cells = {}
+        for product in products:
+            cell = _cell(product)
+            cells[cell] += 1
+            product_cells[product['id']] = cell
+        with self._lock:
+            if unchanged is not None and not unchanged():
+                return False
+            self._cells = cells
+            self._product_cells = product_cells
+        return True
+
+    def ensure_loaded(self, loader):
+        """Load the index with loader() if it is empty; rebuild it in the background once older than INDEX_TTL"""
+        self._refresher.ensure(loader, self.load)
+
+    def invalidate(self):
+        """Rebuild on the next request (the current index is served until then)"""
+        self._refresher.invalidate()
+
+    def counts(self, category_id=None, brand=None, bucket=None, in_stock=None, product_ids=None):
+        """Return facet counts for a filter set.
+
+        Each facet is counted with every filter except its own applied, so the
+        counts show what selecting another value of that facet would return.
+        `product_ids` restricts counting to a result set (e.g. search matches).
+        """
+        filters = (
+            int(category_id) if category_id else None,
+            brand or None,
+            bucket or None,
+            in_stock,
+        )
+
+        with self._lock:
+            if product_ids is not None:
+                cells = Counter(self._product_cells[product_id] for product_id in product_ids
+                                if product_id in self._product_cells)
+            else:
+                cells = self._cells.copy()
+
+        facets = [Counter(), Counter(), Counter(), Counter()]
+        total = 0
+        for cell, count in cells.items():
+            mismatched = [i for i, wanted in enumerate(filters) if wanted is not None and cell[i] != wanted]
+            if not mismatched:
+                total += count
+                for i in range(4):
+                    facets[i][cell[i]] += count
+            elif len(mismatched) == 1:
+                # Matches every filter but one, so it still counts toward that facet
+                facets[mismatched[0]][cell[mismatched[0]]] += count
+
+        return {
+            'total': total,
+            'categories': dict(facets[0]),
+            'brands': dict(facets[1]),
+            'price_buckets': {label: facets[2].get(label, 0) for label in bucket_labels()},
+            'in_stock': {'in_stock': facets[3].get(True, 0), 'out_of_stock': facets[3].get(False, 0)},
+        }
+
+    def filter(self, product_ids, bucket=None, in_stock=None):
+        """Keep the ids (in order) whose indexed price bucket and stock match, as counts() sees them"""
+        with self._lock:
+            cells = [(product_id, self._product_cells.get(product_id)) for product_id in product_ids]
+        return [product_id for product_id, cell in cells
+                if cell is not None and (bucket is None or cell[2] == bucket) and (in_stock is None or cell[3] == in_stock)]
+
+    def stats(self):
+        """Return index size and reload counters"""
+        with self._lock:
+            return {'products': len(self._product_cells), 'cells': len(self._cells), **self._refresher.stats()}
+
+index = FacetIndex()
@@ -0,0 +1,44 @@
+import hashlib
+import os
+from flask import current_app, request
+import catalog
+
+# Cache-Control max-age (seconds) for catalog responses
+CATALOG_MAX_AGE = int(os.getenv('CATALOG_HTTP_MAX_AGE', 60))
+CATEGORIES_MAX_AGE = int(os.getenv('CATEGORIES_HTTP_MAX_AGE', 300))
+
+def _render(payload):
+    """Serialize a payload once and compute its validators.
+
+    Last-Modified is the catalog's last change, not the render time, so it
+    stays the same when an expired entry is rebuilt from unchanged data.
+    """
+    body = current_app.json.dumps(payload).encode('utf-8') + b'\n'
+    return {
+        'body': body,
+        'etag': hashlib.sha256(body).hexdigest()[:32],
+        'last_modified': catalog.last_changed()
+    }
+
+def conditional_json(build, tags, max_age=CATALOG_MAX_AGE):
+    """Serve a cacheable JSON payload with ETag / Last-Modified validators.
+
+    The rendered body and its validators are cached per URL under `tags`,
+    so a matching If-None-Match / If-Modified-Since is answered with a 304
+    without calling build() or serializing anything. Returns None when
+    build() returns None so the caller can send its own error.
+    """
+    def load():
+        payload = build()
+        return _render(payload) if payload is not None else None
+
+    rendered = catalog.read_through(('response', request.full_path), load, tags)
+    if rendered is None:
+        return None
+
+    response = current_app.response_class(rendered['body'], mimetype='application/json')
+    response.set_etag(rendered['etag'])
+    response.last_modified = rendered['last_modified']
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response.make_conditional(request)
@@ -0,0 +1,177 @@
+import argparse
+import hashlib
+import io
+import os
+import time
+import catalog
+import models
+
+# Pillow is optional: without it products keep serving their original image_url
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Relative image_urls (e.g. "src/phone images/x.jpeg") are read from here
+SOURCE_ROOT = os.getenv('IMAGE_SOURCE_ROOT', ROOT)
+# Derivatives are written here and served from /media/<name>
+DERIVATIVE_DIR = os.getenv('IMAGE_DERIVATIVE_DIR', os.path.join(ROOT, 'media'))
+# Public URL of DERIVATIVE_DIR as written into each product's srcset (rerun with --all after changing it)
+MEDIA_URL = os.getenv('MEDIA_URL', 'http://localhost:5000/media').rstrip('/')
+WIDTHS = tuple(sorted(int(width) for width in os.getenv('IMAGE_WIDTHS', '160,320,480,800').split(',')))
+# Width of the plain <img src> for browsers that ignore srcset
+FALLBACK_WIDTH = 320
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+# Part of every derivative's name; bump when the encoding changes so cached copies are never reused
+PIPELINE_VERSION = 1
+
+# Derivative names are content hashes, so a URL always serves the same bytes
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# prune() leaves newer files alone; they may belong to a product still being processed
+PRUNE_MIN_AGE = 3600
+
+def available():
+    """Whether derivatives can be generated (Pillow is installed)"""
+    return Image is not None
+
+def source_path(image_url):
+    """Local file behind a relative image_url; None for remote, missing or out-of-tree paths"""
+    if not image_url or '://' in image_url or image_url.startswith('//'):
+        return None
+    root = os.path.realpath(SOURCE_ROOT)
+    path = os.path.realpath(os.path.join(root, image_url.lstrip('/')))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        return None
+    return path
+
+def _widths(source_width):
+    """Configured widths below the source's, plus the source width capped at the largest one"""
+    return sorted({width for width in WIDTHS if width < source_width} | {min(source_width, WIDTHS[-1])})
+
+def _save(image, fmt, path):
+    # Write aside and rename so a concurrent request never serves a partial file
+    temp = f"{path}.{os.getpid()}.tmp"
+    if fmt == 'webp':
+        image.save(temp, 'WEBP', quality=WEBP_QUALITY, method=6)
+    else:
+        image.save(temp, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    os.replace(temp, path)
+
+def build_derivatives(image_url):
+    """Write WebP and JPEG derivatives of an image at each width; returns its srcset dict or None.
+
+    Files are named after a hash of the source bytes and encoding settings,
+    so unchanged images are never re-encoded and names can be cached forever.
+    """
+    if Image is None:
+        return None
+    path = source_path(image_url)
+    if path is None:
+        return None
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    settings = f"v{PIPELINE_VERSION}:{WEBP_QUALITY}:{JPEG_QUALITY}".encode()
+    digest = hashlib.sha256(settings + data).hexdigest()[:20]
+
+    try:
+        image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        print(f"Image error: {image_url}: {e}")
+        return None
+
+    width, height = image.size
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    webp_base = image.convert('RGBA' if has_alpha else 'RGB')
+    if has_alpha:
+        # JPEG has no alpha channel; flatten onto the page background
+        jpeg_base = Image.new('RGB', image.size, (255, 255, 255))
+        jpeg_base.paste(webp_base, mask=webp_base.getchannel('A'))
+    else:
+        jpeg_base = webp_base
+
+    os.makedirs(DERIVATIVE_DIR, exist_ok=True)
+    widths = _widths(width)
+    srcsets = {'webp': [], 'jpeg': []}
+    for target_width in widths:
+        target_size = (target_width, max(1, round(height * target_width / width)))
+        for fmt, base, ext in (('webp', webp_base, 'webp'), ('jpeg', jpeg_base, 'jpg')):
+            name = f"{digest}-{target_width}.{ext}"
+            target = os.path.join(DERIVATIVE_DIR, name)
+            if not os.path.exists(target):
+                resized = base if target_width == width else base.resize(target_size, Image.LANCZOS, reducing_gap=3.0)
+                _save(resized, fmt, target)
+            srcsets[fmt].append(f"{MEDIA_URL}/{name} {target_width}w")
+
+    fallback = min(widths, key=lambda w: abs(w - FALLBACK_WIDTH))
+    return {
+        'webp': ', '.join(srcsets['webp']),
+        'jpeg': ', '.join(srcsets['jpeg']),
+        'src': f"{MEDIA_URL}/{digest}-{fallback}.jpg",
+        'width': width,
+        'height': height
+    }
+
+def process_product(product_id, image_url):
+    """Generate and store a product's derivatives; returns True when stored"""
+    try:
+        srcset = build_derivatives(image_url)
+    except OSError as e:
+        print(f"Image error: {image_url}: {e}")
+        return False
+    if srcset is None:
+        return False
+    # 0 rows is fine: unchanged derivatives, or the image was replaced meanwhile
+    if models.set_product_image_srcset(product_id, image_url, srcset) is None:
+        return False
+    catalog.invalidate_product(product_id)
+    return True
+
+def process_all(missing_only=True, batch_size=100):
+    """Generate derivatives for every product (only those without any by default); returns (stored, skipped)"""
+    stored = skipped = 0
+    last_id = 0
+    while True:
+        rows = models.get_product_images(last_id, batch_size, missing_only)
+        if not rows:
+            return stored, skipped
+        for row in rows:
+            if process_product(row['id'], row['image_url']):
+                stored += 1
+            else:
+                skipped += 1
+        last_id = rows[-1]['id']
+
+def prune():
+    """Delete derivative files no product references any more; returns the number removed"""
+    srcsets = models.get_image_srcsets()
+    if srcsets is None or not os.path.isdir(DERIVATIVE_DIR):
+        return 0
+    referenced = set()
+    for srcset in srcsets:
+        for candidate in (srcset.get('webp', '') + ', ' + srcset.get('jpeg', '')).split(','):
+            if candidate.strip():
+                referenced.add(candidate.split()[0].rsplit('/', 1)[-1])
+    removed = 0
+    now = time.time()
+    for name in os.listdir(DERIVATIVE_DIR):
+        path = os.path.join(DERIVATIVE_DIR, name)
+        if name not in referenced and now - os.path.getmtime(path) > PRUNE_MIN_AGE:
+            os.remove(path)
+            removed += 1
+    return removed
+
+# Backfill after deploying, bulk imports or a settings change
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate responsive WebP/JPEG derivatives of product images')
+    parser.add_argument('--all', action='store_true', help='reprocess products that already have derivatives')
+    parser.add_argument('--prune', action='store_true', help='then delete derivative files no product references')
+    args = parser.parse_args()
+    if not available():
+        raise SystemExit('Pillow is not installed: pip install Pillow')
+    stored, skipped = process_all(missing_only=not args.all)
+    print(f"Stored derivatives for {stored} product(s), skipped {skipped} (remote, missing or unreadable images)")
+    if args.prune:
+        print(f"Removed {prune()} unreferenced file(s)")
@@ -0,0 +1,90 @@
+import argparse
+import os
+import threading
+import time
+import catalog
+import models
+
+# Seconds a cart reservation holds stock before the sweeper returns it
+RESERVATION_TTL = int(os.getenv('INVENTORY_RESERVATION_TTL', 900))
+# Seconds between sweeps; 0 disables the in-process sweeper (run `python inventory.py` instead)
+SWEEP_INTERVAL = float(os.getenv('INVENTORY_SWEEP_INTERVAL', 30))
+SWEEP_BATCH_SIZE = int(os.getenv('INVENTORY_SWEEP_BATCH_SIZE', 500))
+MAX_STOCK_BUCKETS = 64
+
+def sweep(batch_size=SWEEP_BATCH_SIZE):
+    """Return the stock of every expired reservation and refresh bucketed totals; returns the number expired"""
+    expired = 0
+    product_ids = set()
+    while True:
+        rows = models.expire_reservations(batch_size)
+        if not rows:
+            break
+        expired += len(rows)
+        product_ids.update(row['product_id'] for row in rows)
+        if len(rows) < batch_size:
+            break
+    models.refresh_bucketed_stock()
+    if product_ids:
+        catalog.invalidate_stock(sorted(product_ids))
+    return expired
+
+class Sweeper:
+    """Background thread that runs sweep() every SWEEP_INTERVAL seconds.
+
+    Safe to run in every worker process: expired rows are claimed with
+    SKIP LOCKED, so concurrent sweeps never return the same reservation twice.
+    """
+
+    def __init__(self, interval=SWEEP_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._stats = {'runs': 0, 'expired': 0, 'errors': 0, 'last_run_seconds': 0.0}
+
+    def ensure_started(self):
+        """Start the thread once per process (no-op when disabled)"""
+        if self._thread is not None or self.interval <= 0:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='inventory-sweeper', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            started = time.monotonic()
+            try:
+                expired = sweep()
+            except Exception as e:
+                print(f"Inventory sweep failed: {e}")
+                with self._lock:
+                    self._stats['errors'] += 1
+                continue
+            with self._lock:
+                self._stats['runs'] += 1
+                self._stats['expired'] += expired
+                self._stats['last_run_seconds'] = time.monotonic() - started
+
+    def stats(self):
+        """Return sweep counters"""
+        with self._lock:
+            return dict(self._stats)
+
+sweeper = Sweeper()
+
+# Run from cron (or with --loop as a service) when the in-process sweeper is disabled
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Return the stock of expired inventory reservations')
+    parser.add_argument('--loop', action='store_true', help=f'keep sweeping every {SWEEP_INTERVAL or 30:g} seconds')
+    args = parser.parse_args()
+    while True:
+        print(f"Expired {sweep()} reservation(s)")
+        if not args.loop:
+            break
+        time.sleep(SWEEP_INTERVAL or 30)
@@ -0,0 +1,198 @@
+from collections import Counter, deque
+from functools import lru_cache
+import os
+import re
+import threading
+import time
+
+# Queries slower than this (milliseconds) are logged and counted as slow
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 100))
+# The same normalized query this many times in one request is flagged as a likely N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', 5))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+class Histogram:
+    """Cumulative histogram in the Prometheus bucket layout"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+_lock = threading.Lock()
+_local = threading.local()
+
+_request_latency = {}
+_request_queries = {}
+_request_db_time = {}
+_query_latency = Histogram(LATENCY_BUCKETS)
+_acquire_latency = Histogram(LATENCY_BUCKETS)
+_db_errors = Counter()
+_slow_queries = Counter()
+_n_plus_one = Counter()
+_recent_slow = deque(maxlen=100)
+
+@lru_cache(maxsize=1024)
+def normalize_sql(query):
+    """Collapse whitespace, literals and IN lists so equivalent queries group together"""
+    sql = re.sub(r'\s+', ' ', query).strip()
+    sql = re.sub(r"'(?:[^'\\]|\\.)*'", '?', sql)
+    sql = re.sub(r'\b\d+\b', '?', sql)
+    sql = sql.replace('%s', '?')
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)+\s*\)', '(?, ...)', sql)
+    sql = re.sub(r'(?:WHEN \? THEN \? )+', 'WHEN ? THEN ? ... ', sql)
+    return sql
+
+def start_request():
+    """Begin collecting DB statistics for the current request"""
+    _local.request = {'queries': 0, 'db_time': 0.0, 'by_query': Counter()}
+
+def current_request():
+    """Return the DB statistics collected so far for the current request, if any"""
+    return getattr(_local, 'request', None)
+
+def end_request(method, route, status, elapsed):
+    """Record a finished request and return its DB statistics"""
+    stats = current_request()
+    _local.request = None
+    queries = stats['queries'] if stats else 0
+    db_time = stats['db_time'] if stats else 0.0
+
+    with _lock:
+        _observe(_request_latency, (method, route, str(status)), elapsed, LATENCY_BUCKETS)
+        _observe(_request_queries, (method, route), queries, QUERY_COUNT_BUCKETS)
+        _observe(_request_db_time, (method, route), db_time, LATENCY_BUCKETS)
+        if stats:
+            for sql, count in stats['by_query'].items():
+                if count >= N_PLUS_ONE_THRESHOLD:
+                    _n_plus_one[(route, sql)] += 1
+
+    return {'queries': queries, 'db_time': db_time}
+
+def _observe(histograms, labels, value, buckets):
+    histogram = histograms.get(labels)
+    if histogram is None:
+        histogram = histograms[labels] = Histogram(buckets)
+    histogram.observe(value)
+
+def observe_query(query, elapsed):
+    """Record one database round-trip"""
+    sql = normalize_sql(query)
+    stats = current_request()
+    if stats is not None:
+        stats['queries'] += 1
+        stats['db_time'] += elapsed
+        stats['by_query'][sql] += 1
+
+    slow = elapsed * 1000 >= SLOW_QUERY_MS
+    with _lock:
+        _query_latency.observe(elapsed)
+        if slow:
+            _slow_queries[sql] += 1
+            _recent_slow.append({'sql': sql, 'ms': round(elapsed * 1000, 2), 'at': time.time()})
+    if slow:
+        print(f"Slow query ({elapsed * 1000:.1f} ms): {sql}")
+
+def observe_acquire(elapsed):
+    """Record how long it took to check out a pooled connection"""
+    with _lock:
+        _acquire_latency.observe(elapsed)
+
+def observe_error(error):
+    """Count a database error by its error number"""
+    with _lock:
+        _db_errors[str(getattr(error, 'errno', None) or type(error).__name__)] += 1
+
+def recent_slow_queries():
+    """Return the most recent slow queries, newest last"""
+    with _lock:
+        return list(_recent_slow)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _render_histogram(lines, name, help_text, histograms, label_names=()):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for labels, histogram in sorted(histograms.items()):
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            le = 'le="%s"' % bound
+            lines.append(f'{name}_bucket{_labels(label_names, labels, le)} {count}')
+        le = 'le="+Inf"'
+        lines.append(f'{name}_bucket{_labels(label_names, labels, le)} {histogram.count}')
+        lines.append(f'{name}_sum{_labels(label_names, labels)} {histogram.sum}')
+        lines.append(f'{name}_count{_labels(label_names, labels)} {histogram.count}')
+
+def _render_counter(lines, name, help_text, counter, label_names):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} counter')
+    for labels, value in sorted(counter.items()):
+        labels = labels if isinstance(labels, tuple) else (labels,)
+        lines.append(f'{name}{_labels(label_names, labels)} {value}')
+
+# Stat keys that only ever increase; exported as <prefix>_<key>_total counters so rate() works
+COUNTER_STATS = frozenset({
+    # connection pools, replica routing, prepared statements
+    'checkouts', 'waits', 'wait_time_seconds', 'timeouts', 'recycled', 'failed_health_checks', 'connect_errors',
+    'replica_reads', 'pinned_reads', 'replica_fallbacks', 'statements', 'prepares', 'executes',
+    # caches
+    'hits', 'misses', 'evictions', 'expirations', 'invalidations', 'reloads', 'reload_errors', 'reload_discards',
+    # background workers and password hashing
+    'runs', 'expired', 'errors', 'queued', 'placed', 'failed', 'batches', 'batch_errors',
+    'count', 'rejected', 'sum_seconds',
+})
+
+def _render_gauges(lines, prefix, values):
+    for key, value in sorted(values.items()):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        if key in COUNTER_STATS:
+            lines.append(f'# TYPE {prefix}_{key}_total counter')
+            lines.append(f'{prefix}_{key}_total {value}')
+        else:
+            lines.append(f'# TYPE {prefix}_{key} gauge')
+            lines.append(f'{prefix}_{key} {value}')
+
+def render(gauges=None):
+    """Render every metric in the Prometheus text exposition format.
+
+    `gauges` maps a metric prefix to a dict of numeric values (pool stats, cache stats, ...);
+    keys in COUNTER_STATS are exported as counters, the rest as gauges.
+    """
+    lines = []
+    with _lock:
+        _render_histogram(lines, 'http_request_duration_seconds', 'Request latency by route',
+                          _request_latency, ('method', 'route', 'status'))
+        _render_histogram(lines, 'http_request_db_queries', 'Database round-trips per request',
+                          _request_queries, ('method', 'route'))
+        _render_histogram(lines, 'http_request_db_seconds', 'Database time per request',
+                          _request_db_time, ('method', 'route'))
+        _render_histogram(lines, 'db_query_duration_seconds', 'Database round-trip latency',
+                          {(): _query_latency})
+        _render_histogram(lines, 'db_pool_acquire_seconds', 'Time to check out a pooled connection',
+                          {(): _acquire_latency})
+        _render_counter(lines, 'db_errors_total', 'Database errors by error number', _db_errors, ('errno',))
+        _render_counter(lines, 'db_slow_queries_total', 'Queries slower than SLOW_QUERY_MS', _slow_queries, ('query',))
+        _render_counter(lines, 'db_repeated_queries_total', 'Requests that ran one query N_PLUS_ONE_THRESHOLD+ times',
+                        _n_plus_one, ('route', 'query'))
+
+    for prefix, values in (gauges or {}).items():
+        _render_gauges(lines, prefix, values)
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,114 @@
+"""Apply versioned schema migrations from backend/migrations.
+
+Usage (from backend/):
+    python migrate.py            # apply every pending migration
+    python migrate.py --status   # list applied and pending migrations
+
+Migrations are files named NNNN_description.sql (or .py, for data backfills
+that need Python; the module defines apply(cursor)) and run in version order.
+Each applied version is recorded in schema_migrations. schema.sql already
+contains every migration and records them, so fresh installs start current.
+MySQL commits DDL implicitly, so a migration that fails halfway has to be
+repaired by hand before it is re-run.
+"""
+import argparse
+import importlib.util
+import os
+import re
+import sys
+
+from database import get_db_connection
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_RE = re.compile(r'^(\d+)_(\w+)\.(sql|py)$')
+LOCK_NAME = 'schema_migrations'
+LOCK_TIMEOUT = 60
+
+def split_statements(sql):
+    """Split a SQL script into statements, dropping -- comments"""
+    sql = re.sub(r'--[^\n]*', '', sql)
+    return [statement.strip() for statement in sql.split(';') if statement.strip()]
+
+def available_migrations():
+    """Return [(version, name, path)] for every migration file, in version order"""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = MIGRATION_RE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    migrations.sort()
+
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise SystemExit('Two migration files share a version number')
+    return migrations
+
+def run_python_migration(path, cursor):
+    """Load a .py migration and call its apply(cursor)"""
+    spec = importlib.util.spec_from_file_location(f"migration_{os.path.basename(path)[:-3]}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.apply(cursor)
+
+def applied_versions(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+def migrate(connection):
+    """Apply pending migrations in order; returns the versions applied"""
+    cursor = connection.cursor()
+    # Keep two deploys from migrating the same database at once
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, LOCK_TIMEOUT))
+    if cursor.fetchone()[0] != 1:
+        raise SystemExit('Another migration is running')
+
+    applied = []
+    try:
+        done = applied_versions(cursor)
+        for version, name, path in available_migrations():
+            if version in done:
+                continue
+            print(f"Applying {version:04d}_{name}...")
+            if path.endswith('.py'):
+                run_python_migration(path, cursor)
+            else:
+                with open(path) as f:
+                    for statement in split_statements(f.read()):
+                        cursor.execute(statement)
+            cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            applied.append(version)
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+        cursor.fetchall()
+        cursor.close()
+    return applied
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--status', action='store_true', help='list migrations without applying them')
+    args = parser.parse_args()
+
+    connection = get_db_connection()
+    if connection is None:
+        sys.exit('Could not connect to the database (check DB_HOST / DB_NAME)')
+
+    if args.status:
+        cursor = connection.cursor()
+        done = applied_versions(cursor)
+        cursor.close()
+        for version, name, _ in available_migrations():
+            print(f"{version:04d}_{name}: {'applied' if version in done else 'pending'}")
+    else:
+        applied = migrate(connection)
+        print(f"Applied {len(applied)} migration(s)" if applied else "Schema is up to date")
+    connection.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+-- Composite indexes matching the hot access paths, so each is served
+-- in index order without a filesort.
+
+-- get_user_orders: orders WHERE user_id ORDER BY created_at
+-- (also serves the user_id foreign key, replacing idx_orders_user)
+CREATE INDEX idx_orders_user_created ON orders(user_id, created_at, id);
+DROP INDEX idx_orders_user ON orders;
+
+-- get_featured_products: products WHERE is_featured ORDER BY created_at
+CREATE INDEX idx_products_featured_created ON products(is_featured, created_at, id);
+DROP INDEX idx_products_featured ON products;
+
+-- get_all_products: products WHERE category_id AND brand ORDER BY created_at
+-- (idx_products_category and idx_products_brand stay: on a baseline database they
+-- serve the category-only and brand-only listings until 0008 replaces them)
+CREATE INDEX idx_products_category_brand_created ON products(category_id, brand, created_at, id);
+
+-- order_items WHERE order_id, covering the columns read by order pages and sales rollups
+CREATE INDEX idx_order_items_order ON order_items(order_id, product_id, quantity, price);
@@ -0,0 +1,10 @@
+-- "Frequently bought together": how many orders contained both products.
+-- Stored in both directions; the index serves top-K per product in one range read.
+-- No foreign keys, so compaction can rebuild it aside and swap it in with RENAME TABLE.
+CREATE TABLE product_cooccurrence (
+    product_id INT NOT NULL,
+    related_id INT NOT NULL,
+    score INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_id, related_id),
+    INDEX idx_cooccurrence_top (product_id, score, related_id)
+);
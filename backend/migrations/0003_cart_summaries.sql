@@ -0,0 +1,17 @@
+-- Per-user cart counts and total, refreshed in the same transaction as every
+-- cart write (and when a carted product's price changes), so the header badge
+-- and cart total are a primary key read instead of a cart/product join.
+CREATE TABLE cart_summaries (
+    user_id INT PRIMARY KEY,
+    line_count INT NOT NULL DEFAULT 0,
+    item_count INT NOT NULL DEFAULT 0,
+    total DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+INSERT INTO cart_summaries (user_id, line_count, item_count, total)
+SELECT c.user_id, COUNT(*), SUM(c.quantity), SUM(c.quantity * COALESCE(p.discount_price, p.price))
+FROM cart c
+JOIN products p ON p.id = c.product_id
+GROUP BY c.user_id;
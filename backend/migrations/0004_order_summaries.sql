@@ -0,0 +1,21 @@
+-- Denormalized order summaries for the order history list: line and unit
+-- counts plus the first item's name and image, written at checkout, so the
+-- list needs no order_items or products join.
+ALTER TABLE orders
+    ADD COLUMN item_count INT NOT NULL DEFAULT 0,
+    ADD COLUMN units INT NOT NULL DEFAULT 0,
+    ADD COLUMN first_item_name VARCHAR(255),
+    ADD COLUMN first_item_image VARCHAR(500);
+
+UPDATE orders o
+JOIN (
+    SELECT order_id, COUNT(*) AS item_count, SUM(quantity) AS units, MIN(id) AS first_item_id
+    FROM order_items
+    GROUP BY order_id
+) s ON s.order_id = o.id
+JOIN order_items oi ON oi.id = s.first_item_id
+JOIN products p ON p.id = oi.product_id
+SET o.item_count = s.item_count,
+    o.units = s.units,
+    o.first_item_name = p.name,
+    o.first_item_image = p.image_url;
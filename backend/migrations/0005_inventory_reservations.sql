@@ -0,0 +1,28 @@
+-- Inventory reservations: units held for a user's cart until checkout or
+-- expiry, plus optional per-product stock buckets that spread the
+-- decrements for hot products over several rows.
+ALTER TABLE products
+    ADD COLUMN stock_buckets SMALLINT NOT NULL DEFAULT 0;
+
+CREATE TABLE inventory_buckets (
+    product_id INT NOT NULL,
+    bucket SMALLINT NOT NULL,
+    available INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_id, bucket),
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+);
+
+-- bucket is NULL for units taken from products.stock_quantity
+CREATE TABLE inventory_reservations (
+    id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    user_id INT NOT NULL,
+    product_id INT NOT NULL,
+    bucket SMALLINT,
+    quantity INT NOT NULL,
+    expires_at DATETIME NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_reservations_user_product (user_id, product_id),
+    INDEX idx_reservations_expires (expires_at),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+);
@@ -0,0 +1,16 @@
+-- Order intake queue: checkouts acknowledged immediately and placed by a
+-- writer in batches of several orders per transaction (see order_intake.py).
+CREATE TABLE order_intake (
+    id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    user_id INT NOT NULL,
+    shipping_address TEXT NOT NULL,
+    payment_method VARCHAR(50),
+    status ENUM('queued', 'placed', 'failed') NOT NULL DEFAULT 'queued',
+    order_id INT,
+    error VARCHAR(255),
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    processed_at DATETIME,
+    INDEX idx_order_intake_status (status, id),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE SET NULL
+);
@@ -0,0 +1,5 @@
+-- Responsive image derivatives of products.image_url (see images.py):
+-- {"webp": srcset, "jpeg": srcset, "src": fallback URL, "width": px, "height": px}.
+-- NULL until generated, and reset whenever image_url changes.
+ALTER TABLE products
+    ADD COLUMN image_srcset JSON AFTER image_url;
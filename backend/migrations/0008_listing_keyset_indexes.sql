@@ -0,0 +1,10 @@
+-- (created_at, id) indexes for keyset pagination of product and admin order
+-- listings. The category and brand variants also serve the category-only and
+-- brand-only listings (and the category_id foreign key), replacing the
+-- single-column indexes from the original schema.
+CREATE INDEX idx_products_created ON products(created_at, id);
+CREATE INDEX idx_products_category_created ON products(category_id, created_at, id);
+CREATE INDEX idx_products_brand_created ON products(brand, created_at, id);
+CREATE INDEX idx_orders_created ON orders(created_at, id);
+DROP INDEX idx_products_category ON products;
+DROP INDEX idx_products_brand ON products;
@@ -0,0 +1,3 @@
+-- Full-text index for product search (MATCH ... AGAINST in BOOLEAN MODE)
+ALTER TABLE products
+    ADD FULLTEXT INDEX ft_products_search (name, brand, description);
@@ -0,0 +1,13 @@
+-- Typed attributes extracted from products.specifications for indexed
+-- spec.<attribute> filtering. Filled by 0011_backfill_product_attributes.
+CREATE TABLE product_attributes (
+    product_id INT NOT NULL,
+    name VARCHAR(50) NOT NULL,
+    num_value DECIMAL(12, 2),
+    str_value VARCHAR(100),
+    PRIMARY KEY (product_id, name),
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+);
+
+CREATE INDEX idx_attributes_num ON product_attributes(name, num_value, product_id);
+CREATE INDEX idx_attributes_str ON product_attributes(name, str_value, product_id);
@@ -0,0 +1,5 @@
+"""Extract product_attributes from every product's specifications"""
+from specs import backfill_attributes
+
+def apply(cursor):
+    backfill_attributes(cursor)
@@ -0,0 +1,3 @@
+-- Stable external key for bulk product import/export (upserts match on it)
+ALTER TABLE products
+    ADD COLUMN sku VARCHAR(64) UNIQUE AFTER id;
@@ -0,0 +1,63 @@
+-- Sales rollups, maintained incrementally by place_order / update_order_status,
+-- backfilled here from the order history (the same queries as
+-- models.rebuild_sales_rollups). Cancelled orders are excluded; sales_daily
+-- still counts them in cancelled_count.
+CREATE TABLE sales_daily (
+    day DATE PRIMARY KEY,
+    order_count INT NOT NULL DEFAULT 0,
+    cancelled_count INT NOT NULL DEFAULT 0,
+    units_sold INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    paid_revenue DECIMAL(14, 2) NOT NULL DEFAULT 0
+);
+
+CREATE TABLE sales_by_product (
+    product_id INT PRIMARY KEY,
+    order_count INT NOT NULL DEFAULT 0,
+    units_sold INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    paid_revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+);
+
+CREATE TABLE sales_by_category (
+    category_id INT PRIMARY KEY,
+    order_count INT NOT NULL DEFAULT 0,
+    units_sold INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    paid_revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE CASCADE
+);
+
+CREATE INDEX idx_sales_product_revenue ON sales_by_product(revenue);
+
+INSERT INTO sales_daily (day, order_count, cancelled_count, units_sold, revenue, paid_revenue)
+SELECT DATE(o.created_at),
+       SUM(o.status != 'cancelled'),
+       SUM(o.status = 'cancelled'),
+       COALESCE(SUM(CASE WHEN o.status != 'cancelled' THEN units.units END), 0),
+       COALESCE(SUM(CASE WHEN o.status != 'cancelled' THEN o.total_amount END), 0),
+       COALESCE(SUM(CASE WHEN o.status != 'cancelled' AND o.payment_status = 'completed'
+                         THEN o.total_amount END), 0)
+FROM orders o
+LEFT JOIN (
+    SELECT order_id, SUM(quantity) AS units FROM order_items GROUP BY order_id
+) units ON units.order_id = o.id
+GROUP BY DATE(o.created_at);
+
+INSERT INTO sales_by_product (product_id, order_count, units_sold, revenue, paid_revenue)
+SELECT oi.product_id, COUNT(DISTINCT o.id), SUM(oi.quantity), SUM(oi.quantity * oi.price),
+       COALESCE(SUM(CASE WHEN o.payment_status = 'completed' THEN oi.quantity * oi.price END), 0)
+FROM order_items oi
+JOIN orders o ON o.id = oi.order_id
+WHERE o.status != 'cancelled'
+GROUP BY oi.product_id;
+
+INSERT INTO sales_by_category (category_id, order_count, units_sold, revenue, paid_revenue)
+SELECT p.category_id, COUNT(DISTINCT o.id), SUM(oi.quantity), SUM(oi.quantity * oi.price),
+       COALESCE(SUM(CASE WHEN o.payment_status = 'completed' THEN oi.quantity * oi.price END), 0)
+FROM order_items oi
+JOIN orders o ON o.id = oi.order_id
+JOIN products p ON p.id = oi.product_id
+WHERE o.status != 'cancelled'
+GROUP BY p.category_id;
@@ -0,0 +1,5 @@
+"""Re-extract product_attributes after storage_gb stopped matching across spec values"""
+from specs import backfill_attributes
+
+def apply(cursor):
+    backfill_attributes(cursor)
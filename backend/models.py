@@ -1,5 +1,19 @@
-from database import execute_query, execute_one
+from database import execute_query, execute_one, execute_update, execute_many, stream_query, get_connection, transaction, savepoint, after_commit, session, read_only, prepared, PoolTimeout
+from mysql.connector import Error
+from search import boolean_query
+from specs import extract_attributes, filter_condition
+from decimal import Decimal
 import json
+import random
+
+class InsufficientStockError(Exception):
+    """Raised when a product does not have enough stock to fill an order"""
+
+    def __init__(self, product_id, requested, available):
+        super().__init__(f"Insufficient stock for product {product_id}")
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
 
 # User Models
 def create_user(email, password_hash, full_name, phone=None, address=None):
@@ -20,139 +34,816 @@ def get_user_by_id(user_id):
     query = "SELECT id, email, full_name, phone, address, created_at FROM users WHERE id = %s"
     return execute_one(query, (user_id,))
 
+def update_user_password_hash(user_id, password_hash):
+    """Replace a user's password hash"""
+    query = "UPDATE users SET password_hash = %s WHERE id = %s"
+    execute_query(query, (password_hash, user_id))
+    return True
+
 # Admin Models
 def get_admin_by_username(username):
     """Get admin by username"""
     query = "SELECT * FROM admin_users WHERE username = %s"
     return execute_one(query, (username,))
 
+def update_admin_password_hash(admin_id, password_hash):
+    """Replace an admin's password hash"""
+    query = "UPDATE admin_users SET password_hash = %s WHERE id = %s"
+    execute_query(query, (password_hash, admin_id))
+    return True
+
 # Product Models
-def get_all_products(limit=50, offset=0, category_id=None, search=None, brand=None):
-    """Get all products with optional filters"""
+PRODUCT_FIELDS = ('id', 'sku', 'name', 'brand', 'category_id', 'price', 'discount_price', 'description',
+                  'specifications', 'image_url', 'image_srcset', 'stock_quantity', 'is_featured', 'created_at')
+# Column order of rows passed to upsert_products
+PRODUCT_IMPORT_COLUMNS = ('sku', 'name', 'brand', 'category_id', 'price', 'discount_price', 'description',
+                          'specifications', 'image_url', 'stock_quantity', 'is_featured')
+
+def _product_columns(fields=None):
+    """Build the SELECT list for products, narrowed to `fields` when given.
+
+    id and created_at are always selected since pagination keys on them.
+    """
+    if not fields:
+        return "p.*, c.name as category_name"
+    columns = [f"p.{field}" for field in PRODUCT_FIELDS if field in fields or field in ('id', 'created_at')]
+    if 'category_name' in fields:
+        columns.append("c.name as category_name")
+    return ", ".join(columns)
+
+def _keyset_condition(alias, after=None, before=None):
+    """Build the WHERE fragment and ORDER BY for (created_at, id) keyset pagination"""
+    if after:
+        condition = f"({alias}.created_at < %s OR ({alias}.created_at = %s AND {alias}.id < %s))"
+        return condition, [after[0], after[0], after[1]], "DESC"
+    if before:
+        condition = f"({alias}.created_at > %s OR ({alias}.created_at = %s AND {alias}.id > %s))"
+        return condition, [before[0], before[0], before[1]], "ASC"
+    return None, [], "DESC"
+
+@read_only
+def get_all_products(limit=50, offset=0, category_id=None, search=None, brand=None, after=None, before=None, fields=None,
+                     min_price=None, max_price=None, in_stock=None, spec_filters=()):
+    """Get all products with optional filters.
+
+    Pass `after` / `before` as a (created_at, id) key to page by cursor;
+    otherwise `offset` is applied to an index-only scan of product ids.
+    `fields` narrows the selected columns. Rows are always returned newest first.
+    """
+    columns = _product_columns(fields)
     conditions = []
     params = []
     
     if category_id:
-        conditions.append("category_id = %s")
+        conditions.append("p.category_id = %s")
         params.append(category_id)
     
     if search:
-        conditions.append("(name LIKE %s OR description LIKE %s OR brand LIKE %s)")
-        search_term = f"%{search}%"
-        params.extend([search_term, search_term, search_term])
+        search_query = boolean_query(search)
+        if search_query:
+            conditions.append("MATCH(p.name, p.brand, p.description) AGAINST (%s IN BOOLEAN MODE)")
+            params.append(search_query)
     
     if brand:
-        conditions.append("brand = %s")
+        conditions.append("p.brand = %s")
         params.append(brand)
     
+    if min_price is not None:
+        conditions.append("COALESCE(p.discount_price, p.price) >= %s")
+        params.append(min_price)
+    
+    if max_price is not None:
+        conditions.append("COALESCE(p.discount_price, p.price) < %s")
+        params.append(max_price)
+    
+    if in_stock is not None:
+        conditions.append("p.stock_quantity > 0" if in_stock else "p.stock_quantity <= 0")
+    
+    for name, operator, value in spec_filters or ():
+        condition, condition_params = filter_condition(name, operator, value)
+        conditions.append(condition)
+        params.extend(condition_params)
+    
+    if after or before:
+        keyset, keyset_params, direction = _keyset_condition('p', after, before)
+        conditions.append(keyset)
+        params.extend(keyset_params)
+        where_clause = " AND ".join(conditions)
+        
+        query = f"""
+            SELECT {columns}
+            FROM products p
+            JOIN categories c ON p.category_id = c.id
+            WHERE {where_clause}
+            ORDER BY p.created_at {direction}, p.id {direction}
+            LIMIT %s
+        """
+        params.append(limit)
+        products = execute_query(prepared('product_list', query), tuple(params), fetch=True)
+        if products and direction == "ASC":
+            products.reverse()
+        return products
+    
     where_clause = " AND ".join(conditions) if conditions else "1=1"
     
+    # Skip rows on the narrow (created_at, id) index, then fetch full rows for one page only
     query = f"""
-        SELECT p.*, c.name as category_name 
-        FROM products p
+        SELECT {columns}
+        FROM (
+            SELECT p.id
+            FROM products p
+            WHERE {where_clause}
+            ORDER BY p.created_at DESC, p.id DESC
+            LIMIT %s OFFSET %s
+        ) page
+        JOIN products p ON p.id = page.id
         JOIN categories c ON p.category_id = c.id
-        WHERE {where_clause}
-        ORDER BY p.created_at DESC
-        LIMIT %s OFFSET %s
+        ORDER BY p.created_at DESC, p.id DESC
     """
     params.extend([limit, offset])
     
-    return execute_query(query, tuple(params), fetch=True)
+    return execute_query(prepared('product_list', query), tuple(params), fetch=True)
+
+PRODUCT_BY_ID = prepared('product_by_id', """
+    SELECT p.*, c.name as category_name 
+    FROM products p
+    JOIN categories c ON p.category_id = c.id
+    WHERE p.id = %s
+""")
 
+@read_only
 def get_product_by_id(product_id):
     """Get product by ID"""
+    return execute_one(PRODUCT_BY_ID, (product_id,))
+
+@read_only
+def get_products_by_ids(product_ids, fields=None):
+    """Get several products in one query, returned in the order of product_ids"""
+    if not product_ids:
+        return []
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    query = f"""
+        SELECT {_product_columns(fields)}
+        FROM products p
+        JOIN categories c ON p.category_id = c.id
+        WHERE p.id IN ({placeholders})
+    """
+    rows = execute_query(prepared('products_by_ids', query), tuple(product_ids), fetch=True)
+    if rows is None:
+        return None
+    by_id = {row['id']: row for row in rows}
+    return [by_id[product_id] for product_id in product_ids if product_id in by_id]
+
+@read_only
+def get_searchable_products():
+    """Get the text fields of every product for the search index"""
     query = """
-        SELECT p.*, c.name as category_name 
+        SELECT p.id, p.name, p.brand, p.description, p.category_id, c.name as category_name
         FROM products p
         JOIN categories c ON p.category_id = c.id
-        WHERE p.id = %s
     """
-    return execute_one(query, (product_id,))
+    return execute_query(query, fetch=True)
 
-def get_featured_products(limit=6):
-    """Get featured products"""
+@read_only
+def get_suggestion_rows():
+    """Get the names, brand, category and units sold of every product for the suggest index"""
     query = """
-        SELECT p.*, c.name as category_name 
+        SELECT p.id, p.name, p.brand, p.category_id, c.name as category_name,
+               COALESCE(s.units_sold, 0) as units_sold
+        FROM products p
+        JOIN categories c ON p.category_id = c.id
+        LEFT JOIN sales_by_product s ON s.product_id = p.id
+    """
+    return execute_query(query, fetch=True)
+
+@read_only
+def get_facet_rows():
+    """Get the facet attributes of every product"""
+    query = "SELECT id, category_id, brand, price, discount_price, stock_quantity FROM products"
+    return execute_query(query, fetch=True)
+
+@read_only
+def get_featured_products(limit=6, fields=None):
+    """Get featured products"""
+    query = f"""
+        SELECT {_product_columns(fields)}
         FROM products p
         JOIN categories c ON p.category_id = c.id
         WHERE p.is_featured = TRUE
         ORDER BY p.created_at DESC
         LIMIT %s
     """
-    return execute_query(query, (limit,), fetch=True)
+    return execute_query(prepared('featured_products', query), (limit,), fetch=True)
 
-def create_product(name, brand, category_id, price, discount_price, description, specifications, image_url, stock_quantity, is_featured=False):
+def create_product(name, brand, category_id, price, discount_price, description, specifications, image_url, stock_quantity, is_featured=False, sku=None):
     """Create a new product"""
     query = """
-        INSERT INTO products (name, brand, category_id, price, discount_price, description, specifications, image_url, stock_quantity, is_featured)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        INSERT INTO products (name, brand, category_id, price, discount_price, description, specifications, image_url, stock_quantity, is_featured, sku)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
     """
     specs_json = json.dumps(specifications) if isinstance(specifications, dict) else specifications
-    return execute_query(query, (name, brand, category_id, price, discount_price, description, specs_json, image_url, stock_quantity, is_featured))
+    try:
+        with transaction():
+            product_id = execute_query(query, (name, brand, category_id, price, discount_price, description, specs_json, image_url, stock_quantity, is_featured, sku))
+            replace_product_attributes(product_id, specifications)
+    except (Error, PoolTimeout) as e:
+        print(f"Database error: {e}")
+        return None
+    return product_id
 
 def update_product(product_id, **kwargs):
     """Update a product"""
-    allowed_fields = ['name', 'brand', 'category_id', 'price', 'discount_price', 'description', 'specifications', 'image_url', 'stock_quantity', 'is_featured']
+    allowed_fields = ['sku', 'name', 'brand', 'category_id', 'price', 'discount_price', 'description', 'specifications', 'image_url', 'stock_quantity', 'is_featured']
     updates = []
     params = []
     
-    for key, value in kwargs.items():
-        if key in allowed_fields and value is not None:
+    # Fixed column order keeps one prepared statement per set of updated columns
+    for key in allowed_fields:
+        value = kwargs.get(key)
+        if value is not None:
             updates.append(f"{key} = %s")
             if key == 'specifications' and isinstance(value, dict):
                 value = json.dumps(value)
             params.append(value)
     
+    # Derivatives of a replaced image are stale (images.py regenerates them). This
+    # must come first: MySQL applies the assignments left to right.
+    if kwargs.get('image_url') is not None:
+        updates.insert(0, "image_srcset = IF(image_url <=> %s, image_srcset, NULL)")
+        params.insert(0, kwargs['image_url'])
+    
     if not updates:
         return False
     
     params.append(product_id)
     query = f"UPDATE products SET {', '.join(updates)} WHERE id = %s"
-    execute_query(query, tuple(params))
+    try:
+        with transaction():
+            execute_query(prepared('update_product', query), tuple(params))
+            if kwargs.get('specifications') is not None:
+                replace_product_attributes(product_id, kwargs['specifications'])
+            if kwargs.get('price') is not None or kwargs.get('discount_price') is not None:
+                refresh_cart_summaries_for_products([product_id])
+            if kwargs.get('stock_quantity') is not None:
+                set_on_hand_stock([product_id])
+    except (Error, PoolTimeout) as e:
+        print(f"Database error: {e}")
+        return False
     return True
 
+# Product image derivatives (see images.py)
+def set_product_image_srcset(product_id, image_url, srcset):
+    """Store generated derivatives, unless the product's image changed while they were built"""
+    query = "UPDATE products SET image_srcset = %s WHERE id = %s AND image_url <=> %s"
+    return execute_update(query, (json.dumps(srcset) if srcset else None, product_id, image_url))
+
+def get_product_images(after_id=0, limit=100, missing_only=True):
+    """Next batch of (id, image_url) in id order, optionally only products without derivatives"""
+    condition = "AND image_srcset IS NULL" if missing_only else ""
+    query = f"""
+        SELECT id, image_url
+        FROM products
+        WHERE id > %s AND image_url IS NOT NULL {condition}
+        ORDER BY id
+        LIMIT %s
+    """
+    return execute_query(query, (after_id, limit), fetch=True)
+
+def get_image_srcsets():
+    """Every stored image_srcset (for pruning unreferenced derivative files)"""
+    rows = execute_query("SELECT image_srcset FROM products WHERE image_srcset IS NOT NULL", fetch=True)
+    if rows is None:
+        return None
+    return [json.loads(row['image_srcset']) if isinstance(row['image_srcset'], (str, bytes)) else row['image_srcset']
+            for row in rows]
+
+def replace_product_attributes(product_id, specifications):
+    """Re-extract a product's typed spec attributes into product_attributes"""
+    replace_product_attributes_batch([(product_id, specifications)])
+
+def replace_product_attributes_batch(products):
+    """Re-extract typed spec attributes for many (product_id, specifications) pairs at once"""
+    products = list(products)
+    if not products:
+        return
+    placeholders = ", ".join(["%s"] * len(products))
+    execute_query(f"DELETE FROM product_attributes WHERE product_id IN ({placeholders})",
+                  tuple(product_id for product_id, _ in products))
+    
+    rows = []
+    for product_id, specifications in products:
+        for name, value in extract_attributes(specifications).items():
+            if isinstance(value, str):
+                rows.append((product_id, name, None, value))
+            else:
+                rows.append((product_id, name, value, None))
+    if rows:
+        execute_many("""
+            INSERT INTO product_attributes (product_id, name, num_value, str_value)
+            VALUES (%s, %s, %s, %s)
+        """, rows)
+
+def rebuild_product_attributes(batch_size=1000):
+    """Backfill product_attributes for every product; returns the number of products processed"""
+    processed = 0
+    last_id = 0
+    while True:
+        rows = execute_query(
+            "SELECT id, specifications FROM products WHERE id > %s ORDER BY id LIMIT %s",
+            (last_id, batch_size), fetch=True
+        )
+        if not rows:
+            return processed
+        with transaction():
+            replace_product_attributes_batch((row['id'], row['specifications']) for row in rows)
+        processed += len(rows)
+        last_id = rows[-1]['id']
+
+def upsert_products(rows):
+    """Insert or update a batch of products keyed by sku in one transaction.
+
+    Rows are tuples in PRODUCT_IMPORT_COLUMNS order. Returns {sku: product_id}.
+    Raises on database errors so the caller can retry rows individually.
+    """
+    columns = ", ".join(PRODUCT_IMPORT_COLUMNS)
+    values = ", ".join(["%s"] * len(PRODUCT_IMPORT_COLUMNS))
+    # image_srcset is reset before image_url is overwritten, while both still hold the old values
+    updates = ", ".join(["image_srcset = IF(image_url <=> VALUES(image_url), image_srcset, NULL)"] +
+                        [f"{column} = VALUES({column})" for column in PRODUCT_IMPORT_COLUMNS if column != 'sku'])
+    skus = [row[0] for row in rows]
+    
+    with transaction():
+        execute_many(f"""
+            INSERT INTO products ({columns})
+            VALUES ({values})
+            ON DUPLICATE KEY UPDATE {updates}
+        """, rows)
+        
+        placeholders = ", ".join(["%s"] * len(skus))
+        id_rows = execute_query(f"SELECT id, sku FROM products WHERE sku IN ({placeholders})", tuple(skus), fetch=True)
+        product_ids = {row['sku']: row['id'] for row in id_rows}
+        
+        specifications_index = PRODUCT_IMPORT_COLUMNS.index('specifications')
+        replace_product_attributes_batch((product_ids[row[0]], row[specifications_index]) for row in rows)
+        refresh_cart_summaries_for_products(product_ids.values())
+        set_on_hand_stock(product_ids.values())
+    
+    return product_ids
+
+def iter_all_products(batch_size=1000):
+    """Yield every product in id order, reading one keyset batch at a time.
+
+    stock_quantity is the on-hand level (unreserved plus reserved), the
+    value an import sets, so exports round-trip.
+    """
+    last_id = 0
+    while True:
+        rows = execute_query("""
+            SELECT p.*, c.name as category_name,
+                   (SELECT COALESCE(SUM(r.quantity), 0) FROM inventory_reservations r
+                    WHERE r.product_id = p.id) AS reserved_quantity
+            FROM products p
+            JOIN categories c ON p.category_id = c.id
+            WHERE p.id > %s
+            ORDER BY p.id
+            LIMIT %s
+        """, (last_id, batch_size), fetch=True)
+        if rows is None:
+            raise Error(msg="Product export query failed")
+        if not rows:
+            return
+        for row in rows:
+            row['stock_quantity'] = (row['stock_quantity'] or 0) + int(row.pop('reserved_quantity'))
+            yield row
+        last_id = rows[-1]['id']
+
 def delete_product(product_id):
     """Delete a product"""
-    query = "DELETE FROM products WHERE id = %s"
-    execute_query(query, (product_id,))
+    try:
+        with transaction():
+            # The delete cascades to cart rows, so find their owners first
+            owners = execute_query("SELECT user_id FROM cart WHERE product_id = %s", (product_id,), fetch=True)
+            execute_query("DELETE FROM products WHERE id = %s", (product_id,))
+            refresh_cart_summaries(row['user_id'] for row in owners)
+    except (Error, PoolTimeout) as e:
+        print(f"Database error: {e}")
+        return False
+    return True
+
+# Inventory Models
+#
+# products.stock_quantity is stock that is neither sold nor reserved. Adding
+# to a cart moves units into inventory_reservations with a conditional
+# decrement, checkout consumes the user's reservations, and the sweeper
+# (inventory.py) returns expired ones. A hot product can be split into
+# inventory_buckets rows (products.stock_buckets > 0) so concurrent
+# reservations decrement different rows; its stock_quantity is then a
+# total refreshed by the sweeper, for display only. Admin edits and imports
+# set an on-hand level, which set_on_hand_stock() turns back into unreserved stock.
+#
+# These transactions run at READ COMMITTED: the locking reads then take no
+# gap locks (so users reserving side by side cannot deadlock on each
+# other's index gaps) and every retry sees the latest committed stock.
+INVENTORY_ISOLATION = 'READ COMMITTED'
+
+def split_stock(total, buckets):
+    """Spread total units over buckets as evenly as possible"""
+    return [total // buckets + (1 if bucket < total % buckets else 0) for bucket in range(buckets)]
+
+def _take_stock(product_id, quantity):
+    """Take unreserved stock with conditional decrements; returns [(bucket, units)].
+
+    bucket is None for stock taken from the products row. Raises
+    InsufficientStockError if the product cannot cover quantity. Must run
+    inside a transaction, so a take spread over buckets is all or nothing.
+    """
+    product = execute_one("SELECT stock_buckets FROM products WHERE id = %s", (product_id,))
+    if product is None:
+        raise InsufficientStockError(product_id, quantity, 0)
+    
+    take_product = """
+        UPDATE products SET stock_quantity = stock_quantity - %s
+        WHERE id = %s AND stock_buckets = 0 AND stock_quantity >= %s
+    """
+    # Rechecks the bucket count, so a product sharded since the read above is left alone
+    if not product['stock_buckets'] and execute_update(take_product, (quantity, product_id, quantity)):
+        return [(None, quantity)]
+    
+    if product['stock_buckets']:
+        # Start at a random bucket so concurrent reservations spread across rows
+        buckets = product['stock_buckets']
+        start = random.randrange(buckets)
+        for offset in range(buckets):
+            bucket = (start + offset) % buckets
+            if execute_update("""
+                UPDATE inventory_buckets SET available = available - %s
+                WHERE product_id = %s AND bucket = %s AND available >= %s
+            """, (quantity, product_id, bucket, quantity)):
+                return [(bucket, quantity)]
+    
+    # No single row covers it (or the product was just re-bucketed): lock every bucket and take greedily
+    rows = execute_query("""
+        SELECT bucket, available FROM inventory_buckets
+        WHERE product_id = %s AND available > 0
+        ORDER BY bucket
+        FOR UPDATE
+    """, (product_id,), fetch=True)
+    available = sum(row['available'] for row in rows)
+    if not rows:
+        # Possibly un-bucketed since the first read; the conditional decrement settles it
+        if execute_update(take_product, (quantity, product_id, quantity)):
+            return [(None, quantity)]
+        current = execute_one("SELECT stock_quantity, stock_buckets FROM products WHERE id = %s", (product_id,))
+        # A bucketed product's stock_quantity is only a display total
+        if current and not current['stock_buckets']:
+            available = current['stock_quantity']
+    if available < quantity:
+        raise InsufficientStockError(product_id, quantity, available)
+    
+    taken = []
+    remaining = quantity
+    for row in rows:
+        units = min(remaining, row['available'])
+        execute_update("UPDATE inventory_buckets SET available = available - %s WHERE product_id = %s AND bucket = %s",
+                       (units, product_id, row['bucket']))
+        taken.append((row['bucket'], units))
+        remaining -= units
+        if not remaining:
+            break
+    return taken
+
+def _return_stock(product_id, bucket, quantity):
+    """Give units back to the bucket (or products row) they were taken from"""
+    if bucket is not None and execute_update(
+            "UPDATE inventory_buckets SET available = available + %s WHERE product_id = %s AND bucket = %s",
+            (quantity, product_id, bucket)):
+        return
+    if execute_update("UPDATE products SET stock_quantity = stock_quantity + %s WHERE id = %s AND stock_buckets = 0",
+                      (quantity, product_id)):
+        return
+    # Bucketed (or re-bucketed) since the units were taken; bucket 0 always exists then
+    execute_update("UPDATE inventory_buckets SET available = available + %s WHERE product_id = %s AND bucket = 0",
+                   (quantity, product_id))
+
+def _return_reservations(rows):
+    """Delete reservation rows and give their units back, one update per (product, bucket)"""
+    if not rows:
+        return
+    placeholders = ", ".join(["%s"] * len(rows))
+    execute_query(f"DELETE FROM inventory_reservations WHERE id IN ({placeholders})", tuple(row['id'] for row in rows))
+    
+    units = {}
+    for row in rows:
+        key = (row['product_id'], row['bucket'])
+        units[key] = units.get(key, 0) + row['quantity']
+    # Sorted so concurrent returns lock rows in the same order
+    for product_id, bucket in sorted(units, key=lambda key: (key[0], key[1] is not None, key[1] or 0)):
+        _return_stock(product_id, bucket, units[(product_id, bucket)])
+
+def _reserve(user_id, product_id, quantity, ttl):
+    """Take stock and record it as reserved by the user for ttl seconds"""
+    execute_many("""
+        INSERT INTO inventory_reservations (user_id, product_id, bucket, quantity, expires_at)
+        VALUES (%s, %s, %s, %s, NOW() + INTERVAL %s SECOND)
+    """, [(user_id, product_id, bucket, units, ttl) for bucket, units in _take_stock(product_id, quantity)])
+
+def _release(user_id, product_id, quantity):
+    """Give back up to quantity of the user's reserved units of a product, soonest to expire first"""
+    rows = execute_query("""
+        SELECT id, product_id, bucket, quantity FROM inventory_reservations
+        WHERE user_id = %s AND product_id = %s
+        ORDER BY expires_at, id
+        FOR UPDATE
+    """, (user_id, product_id), fetch=True)
+    
+    released = []
+    for row in rows:
+        if quantity <= 0:
+            break
+        if row['quantity'] <= quantity:
+            released.append(row)
+            quantity -= row['quantity']
+        else:
+            execute_update("UPDATE inventory_reservations SET quantity = quantity - %s WHERE id = %s", (quantity, row['id']))
+            _return_stock(product_id, row['bucket'], quantity)
+            quantity = 0
+    _return_reservations(released)
+
+def reserve_stock(user_id, product_id, quantity, ttl):
+    """Reserve units of a product for the user; raises InsufficientStockError without reserving anything"""
+    with transaction(INVENTORY_ISOLATION):
+        _reserve(user_id, product_id, quantity, ttl)
+
+def release_user_reservations(user_id):
+    """Give back every unit the user has reserved"""
+    with transaction(INVENTORY_ISOLATION):
+        rows = execute_query("""
+            SELECT id, product_id, bucket, quantity FROM inventory_reservations
+            WHERE user_id = %s
+            ORDER BY product_id
+            FOR UPDATE
+        """, (user_id,), fetch=True)
+        _return_reservations(rows)
+
+def expire_reservations(batch_size=500):
+    """Return the stock of up to batch_size expired reservations; returns the expired rows (None on error)"""
+    try:
+        with transaction(INVENTORY_ISOLATION):
+            # Rows being consumed by a checkout are skipped rather than waited on
+            rows = execute_query("""
+                SELECT id, product_id, bucket, quantity FROM inventory_reservations
+                WHERE expires_at < NOW()
+                ORDER BY expires_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (batch_size,), fetch=True)
+            _return_reservations(rows)
+    except (Error, PoolTimeout) as e:
+        print(f"Database error: {e}")
+        return None
+    return rows
+
+def refresh_bucketed_stock():
+    """Set stock_quantity of bucketed products to the sum of their buckets"""
+    # READ COMMITTED, so reading the buckets does not lock them against reservations
+    with transaction(INVENTORY_ISOLATION):
+        return execute_update("""
+            UPDATE products p
+            JOIN (
+                SELECT product_id, SUM(available) AS available
+                FROM inventory_buckets
+                GROUP BY product_id
+            ) b ON b.product_id = p.id
+            SET p.stock_quantity = b.available
+            WHERE p.stock_buckets > 0
+        """)
+
+def _spread_stock(product_id, total, buckets):
+    """Replace a locked product's buckets with total units spread over `buckets` rows (0 = no buckets)"""
+    execute_query("DELETE FROM inventory_buckets WHERE product_id = %s", (product_id,))
+    if buckets:
+        execute_many("INSERT INTO inventory_buckets (product_id, bucket, available) VALUES (%s, %s, %s)",
+                     [(product_id, bucket, units) for bucket, units in enumerate(split_stock(total, buckets))])
+    execute_query("UPDATE products SET stock_quantity = %s, stock_buckets = %s WHERE id = %s",
+                  (total, buckets, product_id))
+
+def set_stock_buckets(product_id, buckets):
+    """Split a product's unreserved stock over `buckets` rows, or merge it back with 0 or 1.
+
+    Returns False if the product does not exist.
+    """
+    buckets = buckets if buckets > 1 else 0
+    with transaction():
+        product = execute_one("SELECT stock_quantity, stock_buckets FROM products WHERE id = %s FOR UPDATE", (product_id,))
+        if product is None:
+            return False
+        total = product['stock_quantity']
+        if product['stock_buckets']:
+            rows = execute_query("SELECT available FROM inventory_buckets WHERE product_id = %s FOR UPDATE",
+                                 (product_id,), fetch=True)
+            total = sum(row['available'] for row in rows)
+        _spread_stock(product_id, total, buckets)
     return True
 
+def set_on_hand_stock(product_ids):
+    """Turn stock_quantity just overwritten with an on-hand level (admin edit, import) into unreserved stock.
+
+    Units still held by reservations are subtracted, since releasing or
+    sweeping them adds them back; bucketed products are then spread over
+    their buckets again. stock_quantity goes negative if more units are
+    reserved than the new level, and returns to it as reservations end.
+    Must run in the transaction that wrote stock_quantity.
+    """
+    product_ids = sorted(set(product_ids))
+    if not product_ids:
+        return
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    products = execute_query(f"""
+        SELECT id, stock_quantity, stock_buckets FROM products
+        WHERE id IN ({placeholders})
+        FOR UPDATE
+    """, tuple(product_ids), fetch=True)
+    # Wait out reservations that are taking bucket stock right now
+    execute_query(f"SELECT bucket FROM inventory_buckets WHERE product_id IN ({placeholders}) FOR UPDATE",
+                  tuple(product_ids), fetch=True)
+    reserved = execute_query(f"""
+        SELECT product_id, SUM(quantity) AS units FROM inventory_reservations
+        WHERE product_id IN ({placeholders})
+        GROUP BY product_id
+        FOR SHARE
+    """, tuple(product_ids), fetch=True)
+    reserved = {row['product_id']: int(row['units']) for row in reserved}
+    
+    for product in products:
+        unreserved = product['stock_quantity'] - reserved.get(product['id'], 0)
+        if product['stock_buckets']:
+            _spread_stock(product['id'], unreserved, product['stock_buckets'])
+        elif unreserved != product['stock_quantity']:
+            execute_query("UPDATE products SET stock_quantity = %s WHERE id = %s", (unreserved, product['id']))
+
 # Cart Models
+CART_BY_USER = prepared('cart_by_user', """
+    SELECT c.*, p.name, p.price, p.discount_price, p.image_url, p.brand, p.stock_quantity
+    FROM cart c
+    JOIN products p ON c.product_id = p.id
+    WHERE c.user_id = %s
+""")
+
+@read_only
 def get_user_cart(user_id):
     """Get user's cart items"""
-    query = """
-        SELECT c.*, p.name, p.price, p.discount_price, p.image_url, p.brand, p.stock_quantity
-        FROM cart c
-        JOIN products p ON c.product_id = p.id
-        WHERE c.user_id = %s
-    """
-    return execute_query(query, (user_id,), fetch=True)
+    return execute_query(CART_BY_USER, (user_id,), fetch=True)
 
-def add_to_cart(user_id, product_id, quantity=1):
-    """Add item to cart or update quantity if exists"""
-    query = """
-        INSERT INTO cart (user_id, product_id, quantity)
-        VALUES (%s, %s, %s)
-        ON DUPLICATE KEY UPDATE quantity = quantity + %s
+CART_SUMMARY = prepared('cart_summary', """
+    SELECT line_count, item_count, total FROM cart_summaries WHERE user_id = %s
+""")
+
+@read_only
+def get_cart_summary(user_id):
+    """Get the user's cart line count, item count and total"""
+    summary = execute_one(CART_SUMMARY, (user_id,))
+    if summary is None:
+        return {'line_count': 0, 'item_count': 0, 'total': Decimal('0')}
+    return summary
+
+def refresh_cart_summaries(user_ids):
+    """Recompute the cart summaries of these users from their cart rows (empty carts become zeros)"""
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    placeholders = ", ".join(["%s"] * len(user_ids))
+    execute_query(f"""
+        INSERT INTO cart_summaries (user_id, line_count, item_count, total)
+        SELECT u.id, COUNT(c.id), COALESCE(SUM(c.quantity), 0),
+               COALESCE(SUM(c.quantity * COALESCE(p.discount_price, p.price)), 0)
+        FROM users u
+        LEFT JOIN cart c ON c.user_id = u.id
+        LEFT JOIN products p ON p.id = c.product_id
+        WHERE u.id IN ({placeholders})
+        GROUP BY u.id
+        ON DUPLICATE KEY UPDATE line_count = VALUES(line_count), item_count = VALUES(item_count),
+                                total = VALUES(total)
+    """, tuple(user_ids))
+
+def refresh_cart_summaries_for_products(product_ids):
+    """Recompute the cart summaries of every user with one of these products in their cart"""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    rows = execute_query(f"SELECT DISTINCT user_id FROM cart WHERE product_id IN ({placeholders})",
+                         tuple(product_ids), fetch=True)
+    refresh_cart_summaries(row['user_id'] for row in rows)
+
+class CartError(Exception):
+    """Raised when a cart operation names a missing product or exceeds its stock"""
+
+    def __init__(self, product_id, message, missing=False):
+        super().__init__(message)
+        self.product_id = product_id
+        self.missing = missing
+
+def apply_cart_operations(user_id, operations, reservation_ttl):
+    """Apply (op, product_id, quantity) cart operations in one transaction.
+
+    op is 'add' (increase the quantity), 'set' (replace it; 0 removes the
+    line) or 'remove'. Operations apply in order, so later ones see earlier
+    ones. Increases reserve stock for reservation_ttl seconds and decreases
+    release it. On a missing product or insufficient stock CartError is
+    raised and nothing changes. Refreshes the cart summary before committing.
     """
-    return execute_query(query, (user_id, product_id, quantity, quantity))
+    with transaction(INVENTORY_ISOLATION):
+        current = execute_query(
+            "SELECT product_id, quantity FROM cart WHERE user_id = %s ORDER BY product_id FOR UPDATE",
+            (user_id,), fetch=True
+        )
+        quantities = {row['product_id']: row['quantity'] for row in current}
+        original = dict(quantities)
+        
+        for op, product_id, quantity in operations:
+            if op == 'add':
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+            elif op == 'set':
+                quantities[product_id] = quantity
+            else:
+                quantities[product_id] = 0
+        
+        changed = {product_id: max(quantity, 0) for product_id, quantity in quantities.items()
+                   if quantity != original.get(product_id, 0)}
+        upserts = sorted(product_id for product_id, quantity in changed.items() if quantity > 0)
+        removals = sorted(product_id for product_id, quantity in changed.items() if quantity <= 0)
+        
+        if upserts:
+            placeholders = ", ".join(["%s"] * len(upserts))
+            found = execute_query(f"SELECT id FROM products WHERE id IN ({placeholders})", tuple(upserts), fetch=True)
+            found = {row['id'] for row in found}
+            for product_id in upserts:
+                if product_id not in found:
+                    raise CartError(product_id, 'Product not found', missing=True)
+        
+        # Products in id order so concurrent carts take stock rows in the same order
+        for product_id in sorted(changed):
+            delta = changed[product_id] - original.get(product_id, 0)
+            if delta > 0:
+                try:
+                    _reserve(user_id, product_id, delta, reservation_ttl)
+                except InsufficientStockError:
+                    raise CartError(product_id, 'Insufficient stock')
+            else:
+                _release(user_id, product_id, -delta)
+        
+        if upserts:
+            execute_many("""
+                INSERT INTO cart (user_id, product_id, quantity)
+                VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE quantity = VALUES(quantity)
+            """, [(user_id, product_id, changed[product_id]) for product_id in upserts])
+        
+        if removals:
+            placeholders = ", ".join(["%s"] * len(removals))
+            execute_query(f"DELETE FROM cart WHERE user_id = %s AND product_id IN ({placeholders})",
+                          (user_id, *removals))
+        
+        if changed:
+            refresh_cart_summaries([user_id])
+    
+    return sorted(changed)
 
-def update_cart_item(cart_id, quantity):
-    """Update cart item quantity"""
-    query = "UPDATE cart SET quantity = %s WHERE id = %s"
-    execute_query(query, (quantity, cart_id))
+def add_to_cart(user_id, product_id, quantity, reservation_ttl):
+    """Add item to cart or update quantity if exists, reserving the added units"""
+    apply_cart_operations(user_id, [('add', product_id, quantity)], reservation_ttl)
     return True
 
+def _cart_line_write(cart_id, user_id, op, quantity, reservation_ttl):
+    """Apply one operation to a cart line by id; CartError propagates"""
+    try:
+        line = execute_one("SELECT product_id FROM cart WHERE id = %s AND user_id = %s", (cart_id, user_id))
+        if line is None:
+            return False
+        apply_cart_operations(user_id, [(op, line['product_id'], quantity)], reservation_ttl)
+    except (Error, PoolTimeout) as e:
+        print(f"Database error: {e}")
+        return False
+    return True
+
+def update_cart_item(cart_id, quantity, user_id, reservation_ttl):
+    """Update cart item quantity"""
+    return _cart_line_write(cart_id, user_id, 'set', quantity, reservation_ttl)
+
 def remove_from_cart(cart_id, user_id):
     """Remove item from cart"""
-    query = "DELETE FROM cart WHERE id = %s AND user_id = %s"
-    execute_query(query, (cart_id, user_id))
-    return True
+    return _cart_line_write(cart_id, user_id, 'remove', 0, 0)
 
 def clear_user_cart(user_id):
     """Clear all items from user's cart"""
-    query = "DELETE FROM cart WHERE user_id = %s"
-    execute_query(query, (user_id,))
+    try:
+        with transaction(INVENTORY_ISOLATION):
+            execute_query("DELETE FROM cart WHERE user_id = %s", (user_id,))
+            release_user_reservations(user_id)
+            refresh_cart_summaries([user_id])
+    except (Error, PoolTimeout) as e:
+        print(f"Database error: {e}")
+        return False
     return True
 
 # Order Models
@@ -172,15 +863,211 @@ def add_order_item(order_id, product_id, quantity, price):
     """
     return execute_query(query, (order_id, product_id, quantity, price))
 
-def get_user_orders(user_id):
-    """Get user's orders"""
+def place_order(user_id, shipping_address, payment_method='cod'):
+    """Turn the user's cart into an order in a single transaction.
+
+    Locks the cart and the user's reservations, consumes the reserved units
+    and takes any shortfall (for lines whose reservation expired) with
+    conditional decrements, so product rows are never locked for the whole
+    checkout. Inserts the order and all of its items and clears the cart.
+    Returns None if the cart is empty and raises InsufficientStockError
+    (rolling everything back) if any product cannot cover the requested
+    quantity.
+    """
+    with transaction(INVENTORY_ISOLATION):
+        cart_items = execute_query("""
+            SELECT c.product_id, c.quantity, p.price, p.discount_price, p.name, p.image_url
+            FROM cart c
+            JOIN products p ON c.product_id = p.id
+            WHERE c.user_id = %s
+            ORDER BY c.product_id
+            FOR UPDATE OF c
+        """, (user_id,), fetch=True)
+
+        if not cart_items:
+            return None
+
+        reservations = execute_query("""
+            SELECT id, product_id, bucket, quantity FROM inventory_reservations
+            WHERE user_id = %s
+            ORDER BY product_id
+            FOR UPDATE
+        """, (user_id,), fetch=True)
+        reserved = {}
+        for row in reservations:
+            reserved.setdefault(row['product_id'], []).append(row)
+
+        total = Decimal('0')
+        for item in cart_items:
+            rows = reserved.pop(item['product_id'], [])
+            held = sum(row['quantity'] for row in rows)
+            if held < item['quantity']:
+                _take_stock(item['product_id'], item['quantity'] - held)
+            elif held > item['quantity']:
+                _return_stock(item['product_id'], rows[0]['bucket'], held - item['quantity'])
+            item['unit_price'] = item['discount_price'] if item['discount_price'] else item['price']
+            total += item['unit_price'] * item['quantity']
+
+        # Reservations for the ordered lines are now sold; any others go back to stock
+        leftover = [row for rows in reserved.values() for row in rows]
+        consumed = [row['id'] for row in reservations if row['product_id'] not in reserved]
+        if consumed:
+            placeholders = ", ".join(["%s"] * len(consumed))
+            execute_query(f"DELETE FROM inventory_reservations WHERE id IN ({placeholders})", tuple(consumed))
+        _return_reservations(leftover)
+
+        # Summary columns let the order history list skip the items join
+        order_id = execute_query("""
+            INSERT INTO orders (user_id, total_amount, shipping_address, payment_method,
+                                item_count, units, first_item_name, first_item_image)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, (user_id, total, shipping_address, payment_method, len(cart_items),
+              sum(item['quantity'] for item in cart_items), cart_items[0]['name'], cart_items[0]['image_url']))
+
+        execute_many("""
+            INSERT INTO order_items (order_id, product_id, quantity, price)
+            VALUES (%s, %s, %s, %s)
+        """, [(order_id, item['product_id'], item['quantity'], item['unit_price']) for item in cart_items])
+
+        # After the commit, so concurrent checkouts do not queue on today's sales_daily row
+        after_commit(lambda: _record_sale(order_id))
+
+        execute_query("DELETE FROM cart WHERE user_id = %s", (user_id,))
+        refresh_cart_summaries([user_id])
+
+    product_ids = [item['product_id'] for item in cart_items]
+    return {'order_id': order_id, 'total': total, 'product_ids': product_ids}
+
+# Order intake queue (see order_intake.py)
+def enqueue_order(user_id, shipping_address, payment_method='cod'):
+    """Queue a checkout for the intake writer; returns the intake id"""
+    query = """
+        INSERT INTO order_intake (user_id, shipping_address, payment_method)
+        VALUES (%s, %s, %s)
+    """
+    return execute_query(query, (user_id, shipping_address, payment_method))
+
+def get_order_intake(intake_id, user_id):
+    """Get a queued checkout's status (from the primary, where the writer records it)"""
+    query = """
+        SELECT id, status, order_id, error, created_at, processed_at
+        FROM order_intake
+        WHERE id = %s AND user_id = %s
+    """
+    return execute_one(query, (intake_id, user_id))
+
+def get_queued_order_ids(limit):
+    """Oldest queued intake ids, up to limit"""
+    rows = execute_query("SELECT id FROM order_intake WHERE status = 'queued' ORDER BY id LIMIT %s", (limit,), fetch=True)
+    return [row['id'] for row in rows or []]
+
+def place_queued_orders(intake_ids):
+    """Place a batch of queued checkouts in one transaction (a group commit).
+
+    Each order runs under a savepoint, so one that fails (empty cart,
+    insufficient stock) is rolled back and marked failed without touching
+    the others. Entries already claimed by another writer are skipped.
+    Database errors abort the whole batch and are raised. Returns
+    [(intake_id, order or None, error or None)].
+    """
+    results = []
+    placeholders = ", ".join(["%s"] * len(intake_ids))
+    with transaction(INVENTORY_ISOLATION):
+        entries = execute_query(f"""
+            SELECT id, user_id, shipping_address, payment_method
+            FROM order_intake
+            WHERE id IN ({placeholders}) AND status = 'queued'
+            ORDER BY id
+            FOR UPDATE SKIP LOCKED
+        """, tuple(intake_ids), fetch=True)
+        
+        for entry in entries:
+            order = error = None
+            try:
+                # Pins the user to the primary, as the synchronous checkout does
+                with savepoint(), session(f"user:{entry['user_id']}"):
+                    order = place_order(entry['user_id'], entry['shipping_address'], entry['payment_method'])
+                if order is None:
+                    error = 'Cart is empty'
+            except InsufficientStockError as e:
+                error = f'Insufficient stock for product {e.product_id}'
+            results.append((entry['id'], order, error))
+        
+        if results:
+            execute_many("""
+                UPDATE order_intake
+                SET status = %s, order_id = %s, error = %s, processed_at = NOW()
+                WHERE id = %s
+            """, [('failed' if error else 'placed', order['order_id'] if order else None, error, intake_id)
+                  for intake_id, order, error in results])
+    return results
+
+def fail_queued_order(intake_id, error):
+    """Give up on a queued checkout that keeps failing"""
+    query = """
+        UPDATE order_intake
+        SET status = 'failed', error = %s, processed_at = NOW()
+        WHERE id = %s AND status = 'queued'
+    """
+    return execute_update(query, (error, intake_id))
+
+@read_only
+def get_user_orders(user_id, include_items=False):
+    """Get user's orders with their summary columns, optionally with every order's items"""
     query = """
         SELECT * FROM orders
         WHERE user_id = %s
         ORDER BY created_at DESC
     """
-    return execute_query(query, (user_id,), fetch=True)
+    # One connection, so orders and items come from the same replica
+    with get_connection():
+        orders = execute_query(query, (user_id,), fetch=True)
+        if orders and include_items:
+            items = get_items_for_orders([order['id'] for order in orders])
+            if items is None:
+                return None
+            for order in orders:
+                order['items'] = items.get(order['id'], [])
+    return orders
 
+@read_only
+def get_items_for_orders(order_ids):
+    """Get the items of many orders in one query, as {order_id: [items]}"""
+    if not order_ids:
+        return {}
+    placeholders = ", ".join(["%s"] * len(order_ids))
+    rows = execute_query(f"""
+        SELECT oi.*, p.name, p.brand, p.image_url
+        FROM order_items oi
+        JOIN products p ON oi.product_id = p.id
+        WHERE oi.order_id IN ({placeholders})
+        ORDER BY oi.order_id, oi.product_id
+    """, tuple(order_ids), fetch=True)
+    if rows is None:
+        return None
+    items = {}
+    for row in rows:
+        items.setdefault(row['order_id'], []).append(row)
+    return items
+
+def rebuild_order_summaries():
+    """Backfill the orders summary columns from order_items; returns the number of orders updated"""
+    return execute_update("""
+        UPDATE orders o
+        JOIN (
+            SELECT order_id, COUNT(*) AS item_count, SUM(quantity) AS units, MIN(id) AS first_item_id
+            FROM order_items
+            GROUP BY order_id
+        ) s ON s.order_id = o.id
+        JOIN order_items oi ON oi.id = s.first_item_id
+        JOIN products p ON p.id = oi.product_id
+        SET o.item_count = s.item_count,
+            o.units = s.units,
+            o.first_item_name = p.name,
+            o.first_item_image = p.image_url
+    """)
+
+@read_only
 def get_order_by_id(order_id, user_id=None):
     """Get order details"""
     if user_id:
@@ -190,6 +1077,7 @@ def get_order_by_id(order_id, user_id=None):
         query = "SELECT * FROM orders WHERE id = %s"
         return execute_one(query, (order_id,))
 
+@read_only
 def get_order_items(order_id):
     """Get order items"""
     query = """
@@ -200,19 +1088,165 @@ def get_order_items(order_id):
     """
     return execute_query(query, (order_id,), fetch=True)
 
-def get_all_orders(limit=50, offset=0):
-    """Get all orders (admin)"""
+@read_only
+def get_all_orders(limit=50, offset=0, after=None, before=None):
+    """Get all orders (admin), newest first, by offset or (created_at, id) cursor"""
+    if after or before:
+        keyset, params, direction = _keyset_condition('o', after, before)
+        query = f"""
+            SELECT o.*, u.email, u.full_name
+            FROM orders o
+            JOIN users u ON o.user_id = u.id
+            WHERE {keyset}
+            ORDER BY o.created_at {direction}, o.id {direction}
+            LIMIT %s
+        """
+        orders = execute_query(query, tuple(params + [limit]), fetch=True)
+        if orders and direction == "ASC":
+            orders.reverse()
+        return orders
+    
     query = """
         SELECT o.*, u.email, u.full_name
-        FROM orders o
+        FROM (
+            SELECT id
+            FROM orders
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s OFFSET %s
+        ) page
+        JOIN orders o ON o.id = page.id
         JOIN users u ON o.user_id = u.id
-        ORDER BY o.created_at DESC
-        LIMIT %s OFFSET %s
+        ORDER BY o.created_at DESC, o.id DESC
     """
     return execute_query(query, (limit, offset), fetch=True)
 
+def iter_orders(start=None, end=None, status=None, include_items=False):
+    """Stream orders oldest first, optionally with their items, from one unbuffered query.
+
+    `start` is inclusive and `end` exclusive. With include_items every
+    order carries an 'items' list, built from consecutive joined rows.
+    """
+    conditions = []
+    params = []
+    if start:
+        conditions.append("o.created_at >= %s")
+        params.append(start)
+    if end:
+        conditions.append("o.created_at < %s")
+        params.append(end)
+    if status:
+        conditions.append("o.status = %s")
+        params.append(status)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    
+    if not include_items:
+        query = f"""
+            SELECT o.*, u.email, u.full_name
+            FROM orders o
+            JOIN users u ON o.user_id = u.id
+            {where}
+            ORDER BY o.created_at, o.id
+        """
+        yield from stream_query(query, tuple(params))
+        return
+    
+    query = f"""
+        SELECT o.*, u.email, u.full_name,
+               oi.product_id AS item_product_id, oi.quantity AS item_quantity,
+               oi.price AS item_price, p.name AS item_product_name
+        FROM orders o
+        JOIN users u ON o.user_id = u.id
+        LEFT JOIN order_items oi ON oi.order_id = o.id
+        LEFT JOIN products p ON p.id = oi.product_id
+        {where}
+        ORDER BY o.created_at, o.id, oi.id
+    """
+    order = None
+    for row in stream_query(query, tuple(params)):
+        if order is None or order['id'] != row['id']:
+            if order is not None:
+                yield order
+            order = {key: value for key, value in row.items() if not key.startswith('item_')}
+            order['items'] = []
+        if row['item_product_id'] is not None:
+            order['items'].append({
+                'product_id': row['item_product_id'],
+                'product_name': row['item_product_name'],
+                'quantity': row['item_quantity'],
+                'price': row['item_price']
+            })
+    if order is not None:
+        yield order
+
+# Recommendation Models
+def record_co_purchases(product_ids):
+    """Count one more order containing each pair of these products (both directions)"""
+    pairs = [(a, b) for a in product_ids for b in product_ids if a != b]
+    if not pairs:
+        return 0
+    # Sorted rows lock keys in one order, so concurrent checkouts cannot deadlock
+    return execute_many("""
+        INSERT INTO product_cooccurrence (product_id, related_id, score)
+        VALUES (%s, %s, 1)
+        ON DUPLICATE KEY UPDATE score = score + 1
+    """, sorted(pairs))
+
+def rebuild_cooccurrence(window_days, keep):
+    """Recompute co-purchase counts from recent order_items and swap them in.
+
+    Keeps the top `keep` related products per product. Built in a side
+    table with one set-based query and swapped in with an atomic RENAME,
+    so readers never see a partial table. Pairs recorded while the
+    rebuild runs are lost until the next one.
+    """
+    with get_connection():
+        execute_update("DROP TABLE IF EXISTS product_cooccurrence_next")
+        execute_update("CREATE TABLE product_cooccurrence_next LIKE product_cooccurrence")
+        pairs = execute_update("""
+            INSERT INTO product_cooccurrence_next (product_id, related_id, score)
+            SELECT product_id, related_id, score
+            FROM (
+                SELECT a.product_id, b.product_id AS related_id, COUNT(DISTINCT a.order_id) AS score,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY a.product_id
+                           ORDER BY COUNT(DISTINCT a.order_id) DESC, b.product_id DESC
+                       ) AS position
+                FROM orders o
+                JOIN order_items a ON a.order_id = o.id
+                JOIN order_items b ON b.order_id = o.id AND b.product_id != a.product_id
+                WHERE o.created_at >= NOW() - INTERVAL %s DAY
+                GROUP BY a.product_id, b.product_id
+            ) ranked
+            WHERE position <= %s
+        """, (window_days, keep))
+        if pairs is None:
+            execute_update("DROP TABLE IF EXISTS product_cooccurrence_next")
+            return None
+        swapped = execute_update("""
+            RENAME TABLE product_cooccurrence TO product_cooccurrence_old,
+                         product_cooccurrence_next TO product_cooccurrence
+        """)
+        if swapped is None:
+            return None
+        execute_update("DROP TABLE product_cooccurrence_old")
+    return pairs
+
+@read_only
+def get_related_products(product_id, limit=6, fields=None):
+    """Products most often bought together with product_id, from the co-occurrence table"""
+    query = f"""
+        SELECT {_product_columns(fields)}, r.score
+        FROM product_cooccurrence r
+        JOIN products p ON p.id = r.related_id
+        JOIN categories c ON p.category_id = c.id
+        WHERE r.product_id = %s
+        ORDER BY r.score DESC, r.related_id DESC
+        LIMIT %s
+    """
+    return execute_query(prepared('related_products', query), (product_id, limit), fetch=True)
+
 def update_order_status(order_id, status=None, payment_status=None):
-    """Update order status"""
+    """Update order status and move the order's totals between sales rollups"""
     updates = []
     params = []
     
@@ -229,11 +1263,179 @@ def update_order_status(order_id, status=None, payment_status=None):
     
     params.append(order_id)
     query = f"UPDATE orders SET {', '.join(updates)} WHERE id = %s"
-    execute_query(query, tuple(params))
+    try:
+        with transaction():
+            order = execute_one("SELECT status, payment_status FROM orders WHERE id = %s FOR UPDATE", (order_id,))
+            if not order:
+                return False
+            execute_update(query, tuple(params))
+            
+            new_status = status or order['status']
+            new_payment_status = payment_status or order['payment_status']
+            if _sales_state(order['status'], order['payment_status']) != _sales_state(new_status, new_payment_status):
+                _apply_sales_rollups(order_id, order['status'], order['payment_status'], -1)
+                _apply_sales_rollups(order_id, new_status, new_payment_status, 1)
+    except (Error, PoolTimeout) as e:
+        print(f"Database error: {e}")
+        return False
     return True
 
+# Sales rollup Models
+ROLLUP_UPSERT = """
+    ON DUPLICATE KEY UPDATE
+        order_count = order_count + VALUES(order_count),
+        units_sold = units_sold + VALUES(units_sold),
+        revenue = revenue + VALUES(revenue),
+        paid_revenue = paid_revenue + VALUES(paid_revenue)
+"""
+
+def _sales_state(status, payment_status):
+    """The parts of an order's state the rollups depend on: (counted as a sale, paid)"""
+    counted = status != 'cancelled'
+    return counted, counted and payment_status == 'completed'
+
+def _record_sale(order_id):
+    """Add a newly placed order to the rollups in its own short transaction.
+
+    Runs after the checkout commits; if it fails the rollups miss the order
+    until rebuild_sales_rollups() is run.
+    """
+    try:
+        with transaction():
+            _apply_sales_rollups(order_id, 'pending', 'pending', 1)
+    except (Error, PoolTimeout) as e:
+        print(f"Database error: {e}")
+
+def _apply_sales_rollups(order_id, status, payment_status, sign):
+    """Add (sign=1) or subtract (sign=-1) one order's totals in the rollup tables.
+
+    Status changes run it in the same transaction as the change they
+    reflect; new orders are added by _record_sale after their checkout.
+    Cancelled orders only count towards sales_daily.cancelled_count.
+    """
+    counted, paid = _sales_state(status, payment_status)
+    count_sign = sign if counted else 0
+    paid_sign = sign if paid else 0
+    
+    execute_update("""
+        INSERT INTO sales_daily (day, order_count, cancelled_count, units_sold, revenue, paid_revenue)
+        SELECT DATE(o.created_at), %s, %s, %s * COALESCE(SUM(oi.quantity), 0), %s * o.total_amount, %s * o.total_amount
+        FROM orders o
+        LEFT JOIN order_items oi ON oi.order_id = o.id
+        WHERE o.id = %s
+        GROUP BY o.id
+    """ + ROLLUP_UPSERT + ", cancelled_count = cancelled_count + VALUES(cancelled_count)",
+        (count_sign, 0 if counted else sign, count_sign, count_sign, paid_sign, order_id))
+    
+    if not counted:
+        return
+    
+    execute_update("""
+        INSERT INTO sales_by_product (product_id, order_count, units_sold, revenue, paid_revenue)
+        SELECT oi.product_id, %s, %s * SUM(oi.quantity), %s * SUM(oi.quantity * oi.price), %s * SUM(oi.quantity * oi.price)
+        FROM order_items oi
+        WHERE oi.order_id = %s
+        GROUP BY oi.product_id
+    """ + ROLLUP_UPSERT, (sign, sign, sign, paid_sign, order_id))
+    
+    # Attributed to the product's current category
+    execute_update("""
+        INSERT INTO sales_by_category (category_id, order_count, units_sold, revenue, paid_revenue)
+        SELECT p.category_id, %s, %s * SUM(oi.quantity), %s * SUM(oi.quantity * oi.price), %s * SUM(oi.quantity * oi.price)
+        FROM order_items oi
+        JOIN products p ON p.id = oi.product_id
+        WHERE oi.order_id = %s AND p.category_id IS NOT NULL
+        GROUP BY p.category_id
+    """ + ROLLUP_UPSERT, (sign, sign, sign, paid_sign, order_id))
+
+def rebuild_sales_rollups():
+    """Recompute every sales rollup from the full order history (backfill / repair)"""
+    with transaction():
+        for table in ('sales_daily', 'sales_by_product', 'sales_by_category'):
+            execute_update(f"DELETE FROM {table}")
+        
+        execute_update("""
+            INSERT INTO sales_daily (day, order_count, cancelled_count, units_sold, revenue, paid_revenue)
+            SELECT DATE(o.created_at),
+                   SUM(o.status != 'cancelled'),
+                   SUM(o.status = 'cancelled'),
+                   COALESCE(SUM(CASE WHEN o.status != 'cancelled' THEN units.units END), 0),
+                   COALESCE(SUM(CASE WHEN o.status != 'cancelled' THEN o.total_amount END), 0),
+                   COALESCE(SUM(CASE WHEN o.status != 'cancelled' AND o.payment_status = 'completed'
+                                     THEN o.total_amount END), 0)
+            FROM orders o
+            LEFT JOIN (
+                SELECT order_id, SUM(quantity) AS units FROM order_items GROUP BY order_id
+            ) units ON units.order_id = o.id
+            GROUP BY DATE(o.created_at)
+        """)
+        
+        for table, key, join in (
+            ('sales_by_product', 'oi.product_id', ''),
+            ('sales_by_category', 'p.category_id', 'JOIN products p ON p.id = oi.product_id'),
+        ):
+            execute_update(f"""
+                INSERT INTO {table} ({key.split('.')[1]}, order_count, units_sold, revenue, paid_revenue)
+                SELECT {key}, COUNT(DISTINCT o.id), SUM(oi.quantity), SUM(oi.quantity * oi.price),
+                       COALESCE(SUM(CASE WHEN o.payment_status = 'completed' THEN oi.quantity * oi.price END), 0)
+                FROM order_items oi
+                JOIN orders o ON o.id = oi.order_id
+                {join}
+                WHERE o.status != 'cancelled' AND {key} IS NOT NULL
+                GROUP BY {key}
+            """)
+
+@read_only
+def get_sales_totals():
+    """All-time totals summed over the daily rollup"""
+    query = """
+        SELECT COALESCE(SUM(order_count), 0) AS order_count,
+               COALESCE(SUM(cancelled_count), 0) AS cancelled_count,
+               COALESCE(SUM(units_sold), 0) AS units_sold,
+               COALESCE(SUM(revenue), 0) AS revenue,
+               COALESCE(SUM(paid_revenue), 0) AS paid_revenue
+        FROM sales_daily
+    """
+    return execute_one(query)
+
+@read_only
+def get_daily_sales(days=30):
+    """Daily rollup rows for the last `days` days, oldest first"""
+    query = """
+        SELECT day, order_count, cancelled_count, units_sold, revenue, paid_revenue
+        FROM sales_daily
+        WHERE day >= CURDATE() - INTERVAL %s DAY
+        ORDER BY day
+    """
+    return execute_query(query, (days - 1,), fetch=True)
+
+@read_only
+def get_top_products_by_revenue(limit=10):
+    """Best-selling products from the product rollup"""
+    query = """
+        SELECT s.product_id, p.name, p.brand, s.order_count, s.units_sold, s.revenue, s.paid_revenue
+        FROM sales_by_product s
+        JOIN products p ON p.id = s.product_id
+        ORDER BY s.revenue DESC
+        LIMIT %s
+    """
+    return execute_query(query, (limit,), fetch=True)
+
+@read_only
+def get_category_sales():
+    """Category rollup rows, highest revenue first"""
+    query = """
+        SELECT s.category_id, c.name, s.order_count, s.units_sold, s.revenue, s.paid_revenue
+        FROM sales_by_category s
+        JOIN categories c ON c.id = s.category_id
+        ORDER BY s.revenue DESC
+    """
+    return execute_query(query, fetch=True)
+
 # Category Models
+CATEGORY_LIST = prepared('category_list', "SELECT * FROM categories ORDER BY name")
+
+@read_only
 def get_all_categories():
     """Get all categories"""
-    query = "SELECT * FROM categories ORDER BY name"
-    return execute_query(query, fetch=True)
+    return execute_query(CATEGORY_LIST, fetch=True)
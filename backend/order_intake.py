@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+from mysql.connector import Error
+import models
+from database import PoolTimeout
+
+# 'queue' acknowledges POST /api/orders with an intake id and places orders in group commits
+MODE = os.getenv('ORDER_INTAKE', 'sync')
+ENABLED = MODE == 'queue'
+# Orders placed per transaction
+BATCH_SIZE = int(os.getenv('ORDER_INTAKE_BATCH_SIZE', 50))
+# Seconds the writer waits after a wake-up so a burst can fill the batch
+GATHER_DELAY = float(os.getenv('ORDER_INTAKE_GATHER_DELAY', 0.02))
+# Seconds between polls for entries queued by other worker processes
+POLL_INTERVAL = float(os.getenv('ORDER_INTAKE_POLL_INTERVAL', 1))
+
+class OrderIntake:
+    """Places queued checkouts in batches of up to BATCH_SIZE orders per transaction.
+
+    The queue is the order_intake table: enqueueing is one small insert,
+    so it survives restarts, and the user's cart and reservations stay
+    untouched until the writer places the order. Every worker process may
+    run a writer; entries are claimed with SKIP LOCKED. `on_placed(order)`
+    runs after each batch commits.
+    """
+
+    def __init__(self, on_placed=None, batch_size=BATCH_SIZE):
+        self.on_placed = on_placed
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._stats = {'queued': 0, 'placed': 0, 'failed': 0, 'batches': 0, 'batch_errors': 0,
+                       'largest_batch': 0, 'last_batch_seconds': 0.0}
+
+    def ensure_started(self):
+        """Start the writer thread once per process"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='order-intake', daemon=True)
+                self._thread.start()
+
+    def submit(self, user_id, shipping_address, payment_method='cod'):
+        """Queue a checkout and wake the writer; returns the intake id (None on error)"""
+        intake_id = models.enqueue_order(user_id, shipping_address, payment_method)
+        if intake_id is None:
+            return None
+        with self._lock:
+            self._stats['queued'] += 1
+        self.ensure_started()
+        self._wake.set()
+        return intake_id
+
+    def _run(self):
+        while True:
+            if self._wake.wait(POLL_INTERVAL):
+                # Let the rest of a burst arrive so it shares one commit
+                time.sleep(GATHER_DELAY)
+            self._wake.clear()
+            try:
+                self.drain()
+            except Exception as e:
+                print(f"Order intake failed: {e}")
+
+    def drain(self):
+        """Place queued orders until the queue is empty; returns the number processed"""
+        processed = 0
+        while True:
+            intake_ids = models.get_queued_order_ids(self.batch_size)
+            if not intake_ids:
+                return processed
+            processed += self._place(intake_ids)
+            if len(intake_ids) < self.batch_size:
+                return processed
+
+    def _place(self, intake_ids):
+        started = time.monotonic()
+        try:
+            results = models.place_queued_orders(intake_ids)
+        except (Error, PoolTimeout) as e:
+            # A deadlock or timeout rolls back the whole batch; retry its entries one by one
+            print(f"Order batch failed, retrying individually: {e}")
+            with self._lock:
+                self._stats['batch_errors'] += 1
+            results = []
+            for intake_id in intake_ids:
+                try:
+                    results.extend(models.place_queued_orders([intake_id]))
+                except (Error, PoolTimeout) as e:
+                    print(f"Order intake {intake_id} failed: {e}")
+                    models.fail_queued_order(intake_id, 'Failed to create order')
+                    results.append((intake_id, None, 'Failed to create order'))
+
+        placed = [order for _, order, error in results if order and not error]
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['placed'] += len(placed)
+            self._stats['failed'] += len(results) - len(placed)
+            self._stats['largest_batch'] = max(self._stats['largest_batch'], len(results))
+            self._stats['last_batch_seconds'] = time.monotonic() - started
+
+        if self.on_placed:
+            for order in placed:
+                self.on_placed(order)
+        return len(results)
+
+    def stats(self):
+        """Return intake counters"""
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,47 @@
+import base64
+import json
+from datetime import datetime
+
+def encode_cursor(row, direction='next'):
+    """Encode a row's (created_at, id) position as an opaque cursor token"""
+    created_at = row['created_at']
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat(sep=' ')
+    raw = json.dumps([created_at, row['id'], direction], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    """Decode a cursor token into ((created_at, id), direction).
+
+    Raises ValueError if the token is malformed.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        created_at, row_id, direction = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        datetime.fromisoformat(created_at)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+    if direction not in ('next', 'prev') or not isinstance(row_id, int):
+        raise ValueError('Invalid cursor')
+    return (created_at, row_id), direction
+
+def paginate(rows, limit, direction='next', has_previous=False):
+    """Trim a result fetched with limit + 1 rows and build its cursors.
+
+    Rows must already be in newest-first order. For 'prev' pages the extra
+    row sits at the front, for 'next' pages at the back.
+    Returns (rows, next_cursor, prev_cursor).
+    """
+    has_more = len(rows) > limit
+
+    if direction == 'prev':
+        rows = rows[-limit:] if has_more else rows
+        prev_cursor = encode_cursor(rows[0], 'prev') if has_more and rows else None
+        next_cursor = encode_cursor(rows[-1], 'next') if rows else None
+    else:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1], 'next') if has_more and rows else None
+        prev_cursor = encode_cursor(rows[0], 'prev') if has_previous and rows else None
+
+    return rows, next_cursor, prev_cursor
@@ -0,0 +1,28 @@
+import os
+import models
+
+# Larger orders only pair up this many of their products
+MAX_PAIR_ITEMS = int(os.getenv('RELATED_MAX_PAIR_ITEMS', 20))
+# Compaction keeps this many related products per product, counted over this many days of orders
+RELATED_KEEP = int(os.getenv('RELATED_KEEP', 50))
+RELATED_WINDOW_DAYS = int(os.getenv('RELATED_WINDOW_DAYS', 365))
+MAX_RELATED = 20
+
+def record_order(product_ids):
+    """Add a newly placed order to the co-purchase counts (best effort)"""
+    product_ids = sorted(set(product_ids))[:MAX_PAIR_ITEMS]
+    if len(product_ids) < 2:
+        return
+    if models.record_co_purchases(product_ids) is None:
+        print("Could not record co-purchases; the next compaction will include them")
+
+def compact():
+    """Rebuild the co-occurrence table from order history; returns the number of pairs kept"""
+    return models.rebuild_cooccurrence(RELATED_WINDOW_DAYS, RELATED_KEEP)
+
+# Run periodically (e.g. nightly from cron) to drop old orders and trim each product to RELATED_KEEP
+if __name__ == '__main__':
+    pairs = compact()
+    if pairs is None:
+        raise SystemExit("Co-occurrence rebuild failed")
+    print(f"Rebuilt co-occurrence table with {pairs} pairs")
@@ -1,9 +1,19 @@
 -- E-Commerce Database Schema
 
 -- Drop tables if they exist (in reverse order of dependencies)
+DROP TABLE IF EXISTS schema_migrations;
+DROP TABLE IF EXISTS order_intake;
 DROP TABLE IF EXISTS order_items;
+DROP TABLE IF EXISTS sales_by_category;
+DROP TABLE IF EXISTS sales_by_product;
+DROP TABLE IF EXISTS sales_daily;
 DROP TABLE IF EXISTS orders;
+DROP TABLE IF EXISTS inventory_reservations;
+DROP TABLE IF EXISTS inventory_buckets;
+DROP TABLE IF EXISTS cart_summaries;
 DROP TABLE IF EXISTS cart;
+DROP TABLE IF EXISTS product_cooccurrence;
+DROP TABLE IF EXISTS product_attributes;
 DROP TABLE IF EXISTS products;
 DROP TABLE IF EXISTS categories;
 DROP TABLE IF EXISTS admin_users;
@@ -43,6 +53,7 @@ CREATE TABLE categories (
 -- Products table
 CREATE TABLE products (
     id INT PRIMARY KEY AUTO_INCREMENT,
+    sku VARCHAR(64) UNIQUE,
     name VARCHAR(255) NOT NULL,
     brand VARCHAR(100) NOT NULL,
     category_id INT NOT NULL,
@@ -51,10 +62,25 @@ CREATE TABLE products (
     description TEXT,
     specifications JSON,
     image_url VARCHAR(500),
+    -- WebP/JPEG derivatives of image_url (see images.py); NULL until generated
+    image_srcset JSON,
     stock_quantity INT DEFAULT 0,
+    -- > 0 when the stock lives in inventory_buckets (stock_quantity is then their refreshed total)
+    stock_buckets SMALLINT NOT NULL DEFAULT 0,
     is_featured BOOLEAN DEFAULT FALSE,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (category_id) REFERENCES categories(id)
+    FOREIGN KEY (category_id) REFERENCES categories(id),
+    FULLTEXT INDEX ft_products_search (name, brand, description)
+);
+
+-- Typed attributes extracted from products.specifications for indexed filtering
+CREATE TABLE product_attributes (
+    product_id INT NOT NULL,
+    name VARCHAR(50) NOT NULL,
+    num_value DECIMAL(12, 2),
+    str_value VARCHAR(100),
+    PRIMARY KEY (product_id, name),
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
 );
 
 -- Cart table
@@ -69,6 +95,41 @@ CREATE TABLE cart (
     UNIQUE KEY unique_user_product (user_id, product_id)
 );
 
+-- Stock of hot products split over several rows to spread decrement contention
+CREATE TABLE inventory_buckets (
+    product_id INT NOT NULL,
+    bucket SMALLINT NOT NULL,
+    available INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_id, bucket),
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+);
+
+-- Units held for a user's cart until checkout or expiry; bucket is NULL for
+-- units taken from products.stock_quantity
+CREATE TABLE inventory_reservations (
+    id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    user_id INT NOT NULL,
+    product_id INT NOT NULL,
+    bucket SMALLINT,
+    quantity INT NOT NULL,
+    expires_at DATETIME NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_reservations_user_product (user_id, product_id),
+    INDEX idx_reservations_expires (expires_at),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+);
+
+-- Per-user cart counts and total, refreshed with every cart write
+CREATE TABLE cart_summaries (
+    user_id INT PRIMARY KEY,
+    line_count INT NOT NULL DEFAULT 0,
+    item_count INT NOT NULL DEFAULT 0,
+    total DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
 -- Orders table
 CREATE TABLE orders (
     id INT PRIMARY KEY AUTO_INCREMENT,
@@ -78,6 +139,11 @@ CREATE TABLE orders (
     payment_status ENUM('pending', 'completed', 'failed') DEFAULT 'pending',
     payment_method VARCHAR(50),
     shipping_address TEXT NOT NULL,
+    -- Summary of the order's items, written at checkout for the order history list
+    item_count INT NOT NULL DEFAULT 0,
+    units INT NOT NULL DEFAULT 0,
+    first_item_name VARCHAR(255),
+    first_item_image VARCHAR(500),
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id)
@@ -94,10 +160,97 @@ CREATE TABLE order_items (
     FOREIGN KEY (product_id) REFERENCES products(id)
 );
 
+-- Checkouts waiting for the order intake writer, which places them in group commits
+CREATE TABLE order_intake (
+    id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    user_id INT NOT NULL,
+    shipping_address TEXT NOT NULL,
+    payment_method VARCHAR(50),
+    status ENUM('queued', 'placed', 'failed') NOT NULL DEFAULT 'queued',
+    order_id INT,
+    error VARCHAR(255),
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    processed_at DATETIME,
+    INDEX idx_order_intake_status (status, id),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE SET NULL
+);
+
+-- "Frequently bought together": how many orders contained both products.
+-- Stored in both directions; the index serves top-K per product in one range read.
+-- No foreign keys, so compaction can rebuild it aside and swap it in with RENAME TABLE.
+CREATE TABLE product_cooccurrence (
+    product_id INT NOT NULL,
+    related_id INT NOT NULL,
+    score INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_id, related_id),
+    INDEX idx_cooccurrence_top (product_id, score, related_id)
+);
+
+-- Sales rollups, maintained incrementally by place_order / update_order_status.
+-- Cancelled orders are excluded (sales_daily still counts them in cancelled_count).
+-- Rebuild from order history with models.rebuild_sales_rollups().
+CREATE TABLE sales_daily (
+    day DATE PRIMARY KEY,
+    order_count INT NOT NULL DEFAULT 0,
+    cancelled_count INT NOT NULL DEFAULT 0,
+    units_sold INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    paid_revenue DECIMAL(14, 2) NOT NULL DEFAULT 0
+);
+
+CREATE TABLE sales_by_product (
+    product_id INT PRIMARY KEY,
+    order_count INT NOT NULL DEFAULT 0,
+    units_sold INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    paid_revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+);
+
+CREATE TABLE sales_by_category (
+    category_id INT PRIMARY KEY,
+    order_count INT NOT NULL DEFAULT 0,
+    units_sold INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    paid_revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE CASCADE
+);
+
 -- Create indexes for better performance
-CREATE INDEX idx_products_category ON products(category_id);
-CREATE INDEX idx_products_brand ON products(brand);
-CREATE INDEX idx_products_featured ON products(is_featured);
+CREATE INDEX idx_products_created ON products(created_at, id);
+CREATE INDEX idx_products_category_created ON products(category_id, created_at, id);
+CREATE INDEX idx_products_brand_created ON products(brand, created_at, id);
+CREATE INDEX idx_products_category_brand_created ON products(category_id, brand, created_at, id);
+CREATE INDEX idx_products_featured_created ON products(is_featured, created_at, id);
+CREATE INDEX idx_attributes_num ON product_attributes(name, num_value, product_id);
+CREATE INDEX idx_attributes_str ON product_attributes(name, str_value, product_id);
 CREATE INDEX idx_cart_user ON cart(user_id);
-CREATE INDEX idx_orders_user ON orders(user_id);
+CREATE INDEX idx_orders_user_created ON orders(user_id, created_at, id);
 CREATE INDEX idx_orders_status ON orders(status);
+CREATE INDEX idx_orders_created ON orders(created_at, id);
+CREATE INDEX idx_order_items_order ON order_items(order_id, product_id, quantity, price);
+CREATE INDEX idx_sales_product_revenue ON sales_by_product(revenue);
+
+-- Applied migrations (see migrate.py); this file already includes every migration listed here
+CREATE TABLE schema_migrations (
+    version INT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO schema_migrations (version, name) VALUES
+(1, 'composite_indexes'),
+(2, 'product_cooccurrence'),
+(3, 'cart_summaries'),
+(4, 'order_summaries'),
+(5, 'inventory_reservations'),
+(6, 'order_intake'),
+(7, 'product_image_srcset'),
+(8, 'listing_keyset_indexes'),
+(9, 'product_search_fulltext'),
+(10, 'product_attributes'),
+(11, 'backfill_product_attributes'),
+(12, 'product_sku'),
+(13, 'sales_rollups'),
+(14, 'rebuild_product_attributes');
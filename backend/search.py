@@ -0,0 +1,198 @@
+import bisect
+import heapq
+import math
+import os
+import re
+import threading
+from cache import Refresher
+
+# 'memory' ranks searches with the in-process index, 'fulltext' filters with MySQL FULLTEXT
+BACKEND = os.getenv('SEARCH_BACKEND', 'memory')
+
+# Field weights used when scoring a match
+FIELD_WEIGHTS = {'name': 3.0, 'brand': 2.0, 'category_name': 1.5, 'description': 1.0}
+MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', 1000))
+# Rebuild from the database after this many seconds so other workers' writes show up
+INDEX_TTL = float(os.getenv('SEARCH_INDEX_TTL', 300))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+STOPWORDS = {'a', 'an', 'and', 'the', 'of', 'for', 'with', 'in', 'on', 'to', 'or', 'by', 'is'}
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+def tokenize(text):
+    """Split text into lowercase alphanumeric search terms"""
+    if not text:
+        return []
+    return [token for token in TOKEN_RE.findall(str(text).lower()) if token not in STOPWORDS]
+
+class SearchIndex:
+    """In-process inverted index over the product catalog with BM25 ranking"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._doc_lengths = {}
+        self._doc_terms = {}
+        self._doc_filters = {}
+        self._total_length = 0.0
+        self._sorted_terms = []
+        self._terms_dirty = False
+        self._refresher = Refresher('search-index', INDEX_TTL)
+
+    def _weighted_terms(self, product):
+        terms = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(product.get(field)):
+                terms[token] = terms.get(token, 0.0) + weight
+        return terms
+
+    def add(self, product):
+        """Index a product, replacing any previous version of it"""
+        with self._lock:
+            self._refresher.changed()
+            self._remove(product['id'])
+            terms = self._weighted_terms(product)
+            length = sum(terms.values())
+
+            for token, weight in terms.items():
+                if token not in self._postings:
+                    self._postings[token] = {}
+                    self._terms_dirty = True
+                self._postings[token][product['id']] = weight
+
+            self._doc_terms[product['id']] = list(terms)
+            self._doc_lengths[product['id']] = length
+            self._doc_filters[product['id']] = (product.get('category_id'), product.get('brand'))
+            self._total_length += length
+
+    def remove(self, product_id):
+        """Drop a product from the index"""
+        with self._lock:
+            self._refresher.changed()
+            self._remove(product_id)
+
+    def _remove(self, product_id):
+        for token in self._doc_terms.pop(product_id, []):
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(product_id, None)
+            if not posting:
+                del self._postings[token]
+                self._terms_dirty = True
+        self._total_length -= self._doc_lengths.pop(product_id, 0.0)
+        self._doc_filters.pop(product_id, None)
+
+    def load(self, products, unchanged=None):
+        """Rebuild the whole index from an iterable of product rows.
+
+        The new index is built aside and swapped in, so searches keep using
+        the old one meanwhile.
+        Returns False, keeping the current index, when `unchanged()` says it
+        was written to after the rows were read.
+        """
+        fresh = SearchIndex()
+        for product in products:
+            fresh.add(product)
+        with self._lock:
+            if unchanged is not None and not unchanged():
+                return False
+            self._postings = fresh._postings
+            self._doc_lengths = fresh._doc_lengths
+            self._doc_terms = fresh._doc_terms
+            self._doc_filters = fresh._doc_filters
+            self._total_length = fresh._total_length
+            self._terms_dirty = True
+        return True
+
+    def ensure_loaded(self, loader):
+        """Load the index with loader() if it is empty; rebuild it in the background once older than INDEX_TTL"""
+        self._refresher.ensure(loader, self.load)
+
+    def invalidate(self):
+        """Rebuild on the next search (the current index is served until then)"""
+        self._refresher.invalidate()
+
+    def _expand(self, token):
+        """Return indexed terms starting with token (used for the last, partially typed term)"""
+        if self._terms_dirty:
+            self._sorted_terms = sorted(self._postings)
+            self._terms_dirty = False
+        terms = self._sorted_terms
+        start = bisect.bisect_left(terms, token)
+        matches = []
+        for term in terms[start:start + 50]:
+            if not term.startswith(token):
+                break
+            matches.append(term)
+        return matches
+
+    def search(self, query, category_id=None, brand=None, limit=MAX_RESULTS):
+        """Return [(product_id, score), ...] best match first.
+
+        Every query term must match; the last term also matches as a prefix.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        with self._lock:
+            doc_count = len(self._doc_lengths)
+            if not doc_count:
+                return []
+            avg_length = self._total_length / doc_count
+
+            candidates = None
+            term_groups = []
+            for position, token in enumerate(tokens):
+                group = [token] if token in self._postings else []
+                if position == len(tokens) - 1:
+                    group = self._expand(token)
+                if not group:
+                    return []
+                matched = set()
+                for term in group:
+                    matched.update(self._postings[term])
+                candidates = matched if candidates is None else candidates & matched
+                if not candidates:
+                    return []
+                term_groups.append(group)
+
+            if category_id or brand:
+                candidates = [
+                    doc for doc in candidates
+                    if (not category_id or str(self._doc_filters[doc][0]) == str(category_id))
+                    and (not brand or self._doc_filters[doc][1] == brand)
+                ]
+
+            scores = {}
+            for group in term_groups:
+                for term in group:
+                    posting = self._postings[term]
+                    idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+                    for doc in candidates:
+                        tf = posting.get(doc)
+                        if tf is None:
+                            continue
+                        norm = 1 - BM25_B + BM25_B * self._doc_lengths[doc] / avg_length
+                        scores[doc] = scores.get(doc, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+
+        return heapq.nlargest(min(limit, MAX_RESULTS), scores.items(), key=lambda item: (item[1], item[0]))
+
+    def stats(self):
+        """Return index size and reload counters"""
+        with self._lock:
+            return {'documents': len(self._doc_lengths), 'terms': len(self._postings), **self._refresher.stats()}
+
+def boolean_query(query):
+    """Build a MySQL FULLTEXT boolean-mode query requiring every term (last one as prefix)"""
+    tokens = tokenize(query)
+    if not tokens:
+        return None
+    parts = [f"+{token}" for token in tokens[:-1]]
+    parts.append(f"+{tokens[-1]}*")
+    return " ".join(parts)
+
+index = SearchIndex()
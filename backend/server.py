@@ -1,12 +1,66 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g, send_from_directory, stream_with_context
 from flask_cors import CORS
 import models
-from auth import hash_password, verify_password, generate_token, require_auth, require_admin
-import json
+import catalog
+import metrics
+import os
+import time
+from datetime import datetime, timedelta
+from auth import hash_password, verify_password, needs_rehash, generate_token, require_auth, require_admin, HashServiceBusy, hash_service
+from database import get_pool_stats, get_replica_pool_stats, get_routing_stats, get_statement_stats, pin_session, PoolTimeout
+from mysql.connector import Error
+from pagination import decode_cursor, paginate
+from http_cache import conditional_json, CATALOG_MAX_AGE, CATEGORIES_MAX_AGE
+import search as search_engine
+import facets
+import suggest
+import recommendations
+import inventory
+import order_intake
+import images
+import specs
+import bulk
 
 app = Flask(__name__)
 CORS(app)
 
+# Send a Server-Timing header with each response's DB round-trips and time
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'true').lower() in ('1', 'true', 'yes')
+
+@app.before_request
+def start_request_metrics():
+    """Start per-request latency and DB instrumentation"""
+    g.request_started = time.perf_counter()
+    metrics.start_request()
+    inventory.sweeper.ensure_started()
+    if order_intake.ENABLED:
+        order_queue.ensure_started()
+
+@app.after_request
+def record_request_metrics(response):
+    """Record route latency and DB usage for the finished request"""
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    elapsed = time.perf_counter() - started
+    db = metrics.end_request(request.method, route, response.status_code, elapsed)
+    
+    if SERVER_TIMING:
+        response.headers['Server-Timing'] = (
+            f'db;dur={db["db_time"] * 1000:.2f};desc="{db["queries"]} queries", '
+            f'app;dur={elapsed * 1000:.2f}'
+        )
+    return response
+
+@app.errorhandler(HashServiceBusy)
+def hash_service_busy(error):
+    """Shed login/signup load when password hashing is saturated"""
+    response = jsonify({'error': str(error)})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 # ==================== Authentication Routes ====================
 
 @app.route('/api/auth/signup', methods=['POST'])
@@ -62,6 +116,9 @@ def login():
     if not user or not verify_password(password, user['password_hash']):
         return jsonify({'error': 'Invalid email or password'}), 401
     
+    if needs_rehash(user['password_hash']):
+        models.update_user_password_hash(user['id'], hash_password(password))
+    
     token = generate_token(user['id'], user['email'])
     
     return jsonify({
@@ -98,81 +155,288 @@ def get_products():
     search = request.args.get('search')
     brand = request.args.get('brand')
     
+    cursor = request.args.get('cursor')
+    
+    try:
+        fields = catalog.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if request.args.get('ids'):
+        return get_products_by_ids(request.args['ids'], fields)
+    
+    bucket = request.args.get('price_bucket')
+    try:
+        min_price, max_price, in_stock = parse_facet_filters()
+        spec_filters = specs.parse_filters(request.query_string.decode('utf-8'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     offset = (page - 1) * limit
+    after = before = None
+    direction = 'next'
+    if cursor:
+        try:
+            key, direction = decode_cursor(cursor)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        if direction == 'prev':
+            before = key
+        else:
+            after = key
+    
+    def build():
+        if search and search_engine.BACKEND == 'memory' and not spec_filters:
+            # Ranked search is served from the in-process index; only one page of rows is loaded
+            search_engine.index.ensure_loaded(models.get_searchable_products)
+            ranked = [product_id for product_id, _ in search_engine.index.search(search, category_id=category_id, brand=brand)]
+            if bucket or in_stock is not None:
+                # Same per-product cells as the facet counts, so results and counts agree
+                facets.index.ensure_loaded(models.get_facet_rows)
+                ranked = facets.index.filter(ranked, bucket or None, in_stock)
+            page_ids = ranked[offset:offset + limit]
+            products = catalog.get_products_by_ids(page_ids, fields)
+            next_cursor = prev_cursor = None
+        else:
+            # Fetch one extra row to know whether another page exists
+            products = catalog.get_products(
+                limit=limit + 1,
+                offset=offset,
+                category_id=category_id,
+                search=search,
+                brand=brand,
+                after=after,
+                before=before,
+                fields=fields,
+                min_price=min_price,
+                max_price=max_price,
+                in_stock=in_stock,
+                spec_filters=spec_filters
+            )
+            if products is None:
+                return None
+            products, next_cursor, prev_cursor = paginate(products, limit, direction, has_previous=bool(cursor) or page > 1)
+        
+        return {
+            'products': products,
+            'page': page,
+            'limit': limit,
+            'next_cursor': next_cursor,
+            'prev_cursor': prev_cursor
+        }
     
-    products = models.get_all_products(
-        limit=limit,
-        offset=offset,
-        category_id=category_id,
-        search=search,
-        brand=brand
-    )
+    response = conditional_json(build, tags=('product_lists',))
+    if response is None:
+        return jsonify({'error': 'Failed to load products'}), 500
+    return response
+
+def parse_facet_filters():
+    """Read the price_bucket and in_stock filters shared by listings and facets"""
+    min_price = max_price = in_stock = None
     
-    # Parse JSON specifications
-    for product in products:
-        if product.get('specifications'):
-            try:
-                product['specifications'] = json.loads(product['specifications'])
-            except:
-                product['specifications'] = {}
+    bucket = request.args.get('price_bucket')
+    if bucket:
+        min_price, max_price = facets.bucket_range(bucket)
     
-    return jsonify({
-        'products': products,
-        'page': page,
-        'limit': limit
-    })
+    value = request.args.get('in_stock')
+    if value:
+        if value.lower() not in ('1', 'true', '0', 'false'):
+            raise ValueError('in_stock must be true or false')
+        in_stock = value.lower() in ('1', 'true')
+    
+    return min_price, max_price, in_stock
+
+@app.route('/api/products/suggest', methods=['GET'])
+def suggest_products():
+    """Typeahead suggestions (products, brands, categories) for a partial query"""
+    query = request.args.get('q', '')
+    limit = min(max(int(request.args.get('limit', suggest.MAX_SUGGESTIONS)), 1), suggest.MAX_SUGGESTIONS)
+    
+    suggest.index.ensure_loaded(models.get_suggestion_rows)
+    response = jsonify({'query': query, 'suggestions': suggest.index.suggest(query, limit)})
+    response.cache_control.public = True
+    response.cache_control.max_age = CATALOG_MAX_AGE
+    return response
+
+@app.route('/api/products/facets', methods=['GET'])
+def get_product_facets():
+    """Get brand, category, price bucket and stock counts for the current filters"""
+    category_id = request.args.get('category_id')
+    brand = request.args.get('brand')
+    search = request.args.get('search')
+    bucket = request.args.get('price_bucket')
+    
+    try:
+        _, _, in_stock = parse_facet_filters()
+        if category_id and not category_id.isdigit():
+            raise ValueError('category_id must be an integer')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def build():
+        facets.index.ensure_loaded(models.get_facet_rows)
+        product_ids = None
+        if search:
+            search_engine.index.ensure_loaded(models.get_searchable_products)
+            product_ids = [product_id for product_id, _ in search_engine.index.search(search)]
+        
+        counts = facets.index.counts(category_id, brand, bucket, in_stock, product_ids)
+        names = {category['id']: category['name'] for category in (catalog.get_categories() or [])}
+        return {
+            'total': counts['total'],
+            'categories': [{'id': category, 'name': names.get(category), 'count': count}
+                           for category, count in sorted(counts['categories'].items())],
+            'brands': [{'value': value, 'count': count}
+                       for value, count in sorted(counts['brands'].items(), key=lambda item: (-item[1], item[0]))],
+            'price_buckets': [{'bucket': label, 'count': count} for label, count in counts['price_buckets'].items()],
+            'in_stock': counts['in_stock']
+        }
+    
+    return conditional_json(build, tags=('product_lists',))
+
+MAX_BATCH_IDS = 100
+
+def get_products_by_ids(ids_param, fields):
+    """Serve GET /api/products?ids=1,2,3 from one batched lookup"""
+    try:
+        product_ids = list(dict.fromkeys(int(value) for value in ids_param.split(',') if value.strip()))
+    except ValueError:
+        return jsonify({'error': 'ids must be a comma separated list of integers'}), 400
+    
+    if len(product_ids) > MAX_BATCH_IDS:
+        return jsonify({'error': f'At most {MAX_BATCH_IDS} ids per request'}), 400
+    
+    tags = tuple(catalog.product_tag(product_id) for product_id in product_ids)
+    return conditional_json(lambda: {'products': catalog.get_products_by_ids(product_ids, fields)}, tags=tags)
 
 @app.route('/api/products/<int:product_id>', methods=['GET'])
 def get_product(product_id):
     """Get single product details"""
-    product = models.get_product_by_id(product_id)
+    response = conditional_json(lambda: catalog.get_product(product_id), tags=(catalog.product_tag(product_id),))
     
-    if not product:
+    if response is None:
         return jsonify({'error': 'Product not found'}), 404
     
-    # Parse JSON specifications
-    if product.get('specifications'):
-        try:
-            product['specifications'] = json.loads(product['specifications'])
-        except:
-            product['specifications'] = {}
-    
-    return jsonify(product)
+    return response
+
+@app.route('/api/products/<int:product_id>/related', methods=['GET'])
+def get_related_products(product_id):
+    """Products frequently bought together with this one"""
+    limit = min(max(int(request.args.get('limit', 6)), 1), recommendations.MAX_RELATED)
+    
+    try:
+        fields = catalog.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def build():
+        related = catalog.get_related(product_id, limit, fields)
+        if related is None:
+            return None
+        return {'product_id': product_id, 'related': related}
+    
+    response = conditional_json(build, tags=(catalog.product_tag(product_id), 'product_lists'))
+    
+    if response is None:
+        return jsonify({'error': 'Failed to load related products'}), 500
+    return response
 
 @app.route('/api/products/featured', methods=['GET'])
 def get_featured():
     """Get featured products"""
     limit = int(request.args.get('limit', 6))
-    products = models.get_featured_products(limit)
     
-    # Parse JSON specifications
-    for product in products:
-        if product.get('specifications'):
-            try:
-                product['specifications'] = json.loads(product['specifications'])
-            except:
-                product['specifications'] = {}
+    try:
+        fields = catalog.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response = conditional_json(lambda: catalog.get_featured(limit, fields), tags=('product_lists',))
     
-    return jsonify(products)
+    if response is None:
+        return jsonify({'error': 'Failed to load featured products'}), 500
+    return response
 
 # ==================== Cart Routes ====================
 
+MAX_CART_OPERATIONS = 100
+# Units of one product a single cart line may hold
+MAX_CART_QUANTITY = 99
+CART_OPERATIONS = ('add', 'set', 'remove')
+
+def valid_quantity(value, minimum=1):
+    """Whether a JSON quantity is an integer from minimum to MAX_CART_QUANTITY"""
+    return isinstance(value, int) and not isinstance(value, bool) and minimum <= value <= MAX_CART_QUANTITY
+
+def cart_summary_payload(summary):
+    return {
+        'line_count': summary['line_count'],
+        'item_count': int(summary['item_count']),
+        'total': round(float(summary['total']), 2)
+    }
+
+def cart_payload(user_id):
+    """The user's cart lines plus the maintained summary"""
+    payload = cart_summary_payload(models.get_cart_summary(user_id))
+    payload['items'] = models.get_user_cart(user_id)
+    return payload
+
+def parse_cart_operations(operations):
+    """Validate a PATCH /api/cart body into (op, product_id, quantity) tuples"""
+    if not isinstance(operations, list) or not operations:
+        raise ValueError('operations must be a non-empty list')
+    if len(operations) > MAX_CART_OPERATIONS:
+        raise ValueError(f'At most {MAX_CART_OPERATIONS} operations per request')
+    
+    parsed = []
+    for operation in operations:
+        if not isinstance(operation, dict) or operation.get('op') not in CART_OPERATIONS:
+            raise ValueError(f"Each operation needs an op of {', '.join(CART_OPERATIONS)}")
+        product_id = operation.get('product_id')
+        quantity = operation.get('quantity', 1 if operation['op'] == 'add' else 0)
+        if not isinstance(product_id, int) or isinstance(product_id, bool):
+            raise ValueError('Each operation needs an integer product_id')
+        if operation['op'] == 'add' and not valid_quantity(quantity):
+            raise ValueError(f'add needs a quantity from 1 to {MAX_CART_QUANTITY}')
+        if operation['op'] == 'set' and not valid_quantity(quantity, minimum=0):
+            raise ValueError(f'set needs a quantity from 0 to {MAX_CART_QUANTITY}')
+        parsed.append((operation['op'], product_id, quantity))
+    return parsed
+
 @app.route('/api/cart', methods=['GET'])
 @require_auth
 def get_cart():
     """Get user's cart"""
+    return jsonify(cart_payload(request.user['user_id']))
+
+@app.route('/api/cart/summary', methods=['GET'])
+@require_auth
+def get_cart_summary():
+    """Item count and total for the header badge, without loading the cart lines"""
+    return jsonify(cart_summary_payload(models.get_cart_summary(request.user['user_id'])))
+
+@app.route('/api/cart', methods=['PATCH'])
+@require_auth
+def patch_cart():
+    """Apply a batch of add / set / remove operations atomically and return the new cart"""
     user_id = request.user['user_id']
-    cart_items = models.get_user_cart(user_id)
-    
-    total = 0
-    for item in cart_items:
-        item_price = item['discount_price'] if item['discount_price'] else item['price']
-        total += float(item_price) * item['quantity']
+    data = request.json or {}
+    
+    try:
+        operations = parse_cart_operations(data.get('operations'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        models.apply_cart_operations(user_id, operations, inventory.RESERVATION_TTL)
+    except models.CartError as e:
+        status = 404 if e.missing else 409
+        return jsonify({'error': str(e), 'product_id': e.product_id}), status
+    except (Error, PoolTimeout) as e:
+        print(f"Cart update failed: {e}")
+        return jsonify({'error': 'Failed to update cart'}), 500
     
-    return jsonify({
-        'items': cart_items,
-        'total': round(total, 2)
-    })
+    return jsonify(cart_payload(user_id))
 
 @app.route('/api/cart', methods=['POST'])
 @require_auth
@@ -184,24 +448,24 @@ def add_to_cart():
     product_id = data.get('product_id')
     quantity = data.get('quantity', 1)
     
-    if not product_id:
+    if not isinstance(product_id, int) or isinstance(product_id, bool):
         return jsonify({'error': 'Product ID is required'}), 400
-    
-    # Check if product exists
-    product = models.get_product_by_id(product_id)
-    if not product:
-        return jsonify({'error': 'Product not found'}), 404
-    
-    # Check stock
-    if product['stock_quantity'] < quantity:
-        return jsonify({'error': 'Insufficient stock'}), 400
-    
-    cart_id = models.add_to_cart(user_id, product_id, quantity)
-    
-    return jsonify({
-        'message': 'Item added to cart',
-        'cart_id': cart_id
-    }), 201
+    if not valid_quantity(quantity):
+        return jsonify({'error': f'quantity must be an integer from 1 to {MAX_CART_QUANTITY}'}), 400
+    
+    # The product check and stock reservation run inside the cart transaction
+    try:
+        models.apply_cart_operations(user_id, [('add', product_id, quantity)], inventory.RESERVATION_TTL)
+    except models.CartError as e:
+        status = 404 if e.missing else 400
+        return jsonify({'error': str(e)}), status
+    except (Error, PoolTimeout) as e:
+        print(f"Cart update failed: {e}")
+        return jsonify({'error': 'Failed to add to cart'}), 500
+    
+    response = {'message': 'Item added to cart'}
+    response.update(cart_summary_payload(models.get_cart_summary(user_id)))
+    return jsonify(response), 201
 
 @app.route('/api/cart/<int:cart_id>', methods=['PUT'])
 @require_auth
@@ -210,10 +474,13 @@ def update_cart(cart_id):
     data = request.json
     quantity = data.get('quantity')
     
-    if quantity is None or quantity < 1:
-        return jsonify({'error': 'Valid quantity is required'}), 400
+    if not valid_quantity(quantity):
+        return jsonify({'error': f'quantity must be an integer from 1 to {MAX_CART_QUANTITY}'}), 400
     
-    success = models.update_cart_item(cart_id, quantity)
+    try:
+        success = models.update_cart_item(cart_id, quantity, request.user['user_id'], inventory.RESERVATION_TTL)
+    except models.CartError as e:
+        return jsonify({'error': str(e), 'product_id': e.product_id}), 409
     
     if success:
         return jsonify({'message': 'Cart updated successfully'})
@@ -234,6 +501,25 @@ def remove_cart_item(cart_id):
 
 # ==================== Order Routes ====================
 
+def order_placed(order):
+    """Post-commit work for a new order, whether placed inline or by the intake writer"""
+    catalog.invalidate_stock(order['product_ids'])
+    recommendations.record_order(order['product_ids'])
+
+order_queue = order_intake.OrderIntake(on_placed=order_placed)
+
+def checkout_error(user_id):
+    """Return (error, status) if the user's cart cannot be checked out, else None"""
+    cart_items = models.get_user_cart(user_id)
+    if cart_items is None:
+        return 'Failed to create order', 500
+    if not cart_items:
+        return 'Cart is empty', 400
+    for item in cart_items:
+        if not valid_quantity(item['quantity']):
+            return f"Quantity of product {item['product_id']} must be from 1 to {MAX_CART_QUANTITY}", 400
+    return None
+
 @app.route('/api/orders', methods=['POST'])
 @require_auth
 def create_order():
@@ -247,44 +533,74 @@ def create_order():
     if not shipping_address:
         return jsonify({'error': 'Shipping address is required'}), 400
     
-    # Get cart items
-    cart_items = models.get_user_cart(user_id)
+    # Checked up front so a queued checkout is only acknowledged if it can be placed
+    problem = checkout_error(user_id)
+    if problem:
+        error, status = problem
+        return jsonify({'error': error}), status
+    
+    if order_intake.ENABLED:
+        # Acknowledge now; the writer places the order with others in one commit
+        intake_id = order_queue.submit(user_id, shipping_address, payment_method)
+        if intake_id is None:
+            return jsonify({'error': 'Failed to create order'}), 500
+        return jsonify({
+            'message': 'Order queued',
+            'intake_id': intake_id,
+            'status': 'queued',
+            'status_url': f'/api/orders/intake/{intake_id}'
+        }), 202
+    
+    try:
+        order = models.place_order(user_id, shipping_address, payment_method)
+    except models.InsufficientStockError as e:
+        return jsonify({'error': 'Insufficient stock', 'product_id': e.product_id}), 409
+    except (Error, PoolTimeout) as e:
+        print(f"Order placement failed: {e}")
+        return jsonify({'error': 'Failed to create order'}), 500
     
-    if not cart_items:
+    if not order:
         return jsonify({'error': 'Cart is empty'}), 400
     
-    # Calculate total
-    total = 0
-    for item in cart_items:
-        item_price = item['discount_price'] if item['discount_price'] else item['price']
-        total += float(item_price) * item['quantity']
-    
-    # Create order
-    order_id = models.create_order(user_id, total, shipping_address, payment_method)
+    order_placed(order)
     
-    if not order_id:
-        return jsonify({'error': 'Failed to create order'}), 500
+    return jsonify({
+        'message': 'Order created successfully',
+        'order_id': order['order_id'],
+        'total': round(float(order['total']), 2)
+    }), 201
+
+@app.route('/api/orders/intake/<int:intake_id>', methods=['GET'])
+@require_auth
+def get_order_intake(intake_id):
+    """Status of a queued checkout: queued, placed (with order_id) or failed (with error)"""
+    entry = models.get_order_intake(intake_id, request.user['user_id'])
     
-    # Add order items
-    for item in cart_items:
-        item_price = item['discount_price'] if item['discount_price'] else item['price']
-        models.add_order_item(order_id, item['product_id'], item['quantity'], item_price)
+    if not entry:
+        return jsonify({'error': 'Order not found'}), 404
     
-    # Clear cart
-    models.clear_user_cart(user_id)
+    if entry['status'] == 'placed':
+        # The writer (possibly in another process) did not pin this user; do it
+        # now so the order pages that follow read from the primary
+        pin_session()
     
     return jsonify({
-        'message': 'Order created successfully',
-        'order_id': order_id,
-        'total': round(total, 2)
-    }), 201
+        'intake_id': entry['id'],
+        'status': entry['status'],
+        'order_id': entry['order_id'],
+        'error': entry['error']
+    })
 
 @app.route('/api/orders', methods=['GET'])
 @require_auth
 def get_orders():
-    """Get user's orders"""
+    """Get user's orders; ?include=items inlines every order's items (one extra query in total)"""
     user_id = request.user['user_id']
-    orders = models.get_user_orders(user_id)
+    include_items = request.args.get('include') == 'items'
+    orders = models.get_user_orders(user_id, include_items)
+    
+    if orders is None:
+        return jsonify({'error': 'Failed to load orders'}), 500
     
     return jsonify(orders)
 
@@ -305,6 +621,22 @@ def get_order(order_id):
 
 # ==================== Admin Routes ====================
 
+def product_changed(product_id, deleted=False):
+    """Refresh in-process catalog indexes after an admin product write"""
+    catalog.invalidate_product(product_id)
+    if deleted:
+        search_engine.index.remove(product_id)
+        facets.index.remove(product_id)
+        suggest.index.remove(product_id)
+        return
+    
+    product = models.get_product_by_id(product_id)
+    if product:
+        search_engine.index.add(product)
+        facets.index.add(product)
+        suggest.index.add(product)
+
+
 @app.route('/api/admin/login', methods=['POST'])
 def admin_login():
     """Admin login"""
@@ -321,6 +653,9 @@ def admin_login():
     if not admin or not verify_password(password, admin['password_hash']):
         return jsonify({'error': 'Invalid credentials'}), 401
     
+    if needs_rehash(admin['password_hash']):
+        models.update_admin_password_hash(admin['id'], hash_password(password))
+    
     token = generate_token(admin['id'], admin['email'], is_admin=True)
     
     return jsonify({
@@ -354,10 +689,13 @@ def admin_create_product():
         specifications=data.get('specifications', {}),
         image_url=data['image_url'],
         stock_quantity=data['stock_quantity'],
-        is_featured=data.get('is_featured', False)
+        is_featured=data.get('is_featured', False),
+        sku=data.get('sku')
     )
     
     if product_id:
+        images.process_product(product_id, data['image_url'])
+        product_changed(product_id)
         return jsonify({
             'message': 'Product created successfully',
             'product_id': product_id
@@ -374,6 +712,9 @@ def admin_update_product(product_id):
     success = models.update_product(product_id, **data)
     
     if success:
+        if data.get('image_url'):
+            images.process_product(product_id, data['image_url'])
+        product_changed(product_id)
         return jsonify({'message': 'Product updated successfully'})
     else:
         return jsonify({'error': 'Failed to update product'}), 500
@@ -385,26 +726,137 @@ def admin_delete_product(product_id):
     success = models.delete_product(product_id)
     
     if success:
+        product_changed(product_id, deleted=True)
         return jsonify({'message': 'Product deleted successfully'})
     else:
         return jsonify({'error': 'Failed to delete product'}), 500
 
+@app.route('/api/admin/products/<int:product_id>/stock-buckets', methods=['PUT'])
+@require_admin
+def admin_set_stock_buckets(product_id):
+    """Split a hot product's stock over several rows to spread checkout contention, or merge it with 0 (admin only)"""
+    data = request.json or {}
+    buckets = data.get('buckets')
+    
+    if not isinstance(buckets, int) or isinstance(buckets, bool) or not 0 <= buckets <= inventory.MAX_STOCK_BUCKETS:
+        return jsonify({'error': f'buckets must be an integer from 0 to {inventory.MAX_STOCK_BUCKETS}'}), 400
+    
+    try:
+        found = models.set_stock_buckets(product_id, buckets)
+    except (Error, PoolTimeout) as e:
+        print(f"Stock bucket update failed: {e}")
+        return jsonify({'error': 'Failed to update stock buckets'}), 500
+    
+    if not found:
+        return jsonify({'error': 'Product not found'}), 404
+    
+    product_changed(product_id)
+    return jsonify({'message': 'Stock buckets updated', 'product_id': product_id, 'buckets': buckets if buckets > 1 else 0})
+
+@app.route('/api/admin/products/import', methods=['POST'])
+@require_admin
+def admin_import_products():
+    """Bulk upsert products by sku from a CSV or NDJSON upload (admin only)"""
+    fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    
+    report = bulk.import_products(request.stream, fmt)
+    
+    if report['upserted']:
+        catalog.invalidate_all()
+        search_engine.index.invalidate()
+        facets.index.invalidate()
+        suggest.index.invalidate()
+    
+    return jsonify(report)
+
+@app.route('/api/admin/products/export', methods=['GET'])
+@require_admin
+def admin_export_products():
+    """Stream the whole catalog as CSV or NDJSON (admin only)"""
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    
+    products = models.iter_all_products()
+    if fmt == 'csv':
+        body, mimetype = bulk.export_csv(products), 'text/csv'
+    else:
+        body, mimetype = bulk.export_ndjson(products), 'application/x-ndjson'
+    
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=products.{fmt}'}
+    )
+
 @app.route('/api/admin/orders', methods=['GET'])
 @require_admin
 def admin_get_orders():
     """Get all orders (admin only)"""
     page = int(request.args.get('page', 1))
     limit = int(request.args.get('limit', 20))
+    cursor = request.args.get('cursor')
     offset = (page - 1) * limit
     
-    orders = models.get_all_orders(limit, offset)
+    after = before = None
+    direction = 'next'
+    if cursor:
+        try:
+            key, direction = decode_cursor(cursor)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        if direction == 'prev':
+            before = key
+        else:
+            after = key
+    
+    orders = models.get_all_orders(limit + 1, offset, after=after, before=before)
+    orders, next_cursor, prev_cursor = paginate(orders or [], limit, direction, has_previous=bool(cursor) or page > 1)
     
     return jsonify({
         'orders': orders,
         'page': page,
-        'limit': limit
+        'limit': limit,
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor
     })
 
+ORDER_STATUSES = ('pending', 'processing', 'shipped', 'delivered', 'cancelled')
+
+@app.route('/api/admin/orders/export', methods=['GET'])
+@require_admin
+def admin_export_orders():
+    """Stream orders as CSV or NDJSON, filtered by date range and status (admin only)"""
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    
+    status = request.args.get('status')
+    if status and status not in ORDER_STATUSES:
+        return jsonify({'error': f"status must be one of {', '.join(ORDER_STATUSES)}"}), 400
+    
+    # from/to are whole days; to is inclusive
+    try:
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d') if request.args.get('from') else None
+        end = datetime.strptime(request.args['to'], '%Y-%m-%d') + timedelta(days=1) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'error': 'from and to must be dates (YYYY-MM-DD)'}), 400
+    
+    include_items = request.args.get('items', 'false').lower() in ('1', 'true', 'yes')
+    orders = models.iter_orders(start, end, status, include_items)
+    if fmt == 'csv':
+        body, mimetype = bulk.export_orders_csv(orders, include_items), 'text/csv'
+    else:
+        body, mimetype = bulk.export_orders_ndjson(orders), 'application/x-ndjson'
+    
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=orders.{fmt}'}
+    )
+
 @app.route('/api/admin/orders/<int:order_id>', methods=['PUT'])
 @require_admin
 def admin_update_order(order_id):
@@ -421,13 +873,81 @@ def admin_update_order(order_id):
     else:
         return jsonify({'error': 'Failed to update order'}), 500
 
+@app.route('/api/admin/stats', methods=['GET'])
+@require_admin
+def admin_stats():
+    """Dashboard sales figures from the rollup tables (admin only)"""
+    days = min(max(int(request.args.get('days', 30)), 1), 366)
+    top = min(max(int(request.args.get('top', 10)), 1), 100)
+    
+    totals = models.get_sales_totals()
+    daily = models.get_daily_sales(days)
+    top_products = models.get_top_products_by_revenue(top)
+    categories = models.get_category_sales()
+    if None in (totals, daily, top_products, categories):
+        return jsonify({'error': 'Failed to load stats'}), 500
+    
+    for row in daily:
+        row['day'] = row['day'].isoformat()
+    
+    return jsonify({
+        'totals': totals,
+        'daily': daily,
+        'top_products': top_products,
+        'categories': categories
+    })
+
+@app.route('/api/admin/metrics', methods=['GET'])
+@require_admin
+def admin_metrics():
+    """Prometheus metrics (admin only)"""
+    hashing = hash_service.stats()
+    gauges = {
+        'db_pool': get_pool_stats(),
+        'db_routing': get_routing_stats(),
+        'catalog_cache': catalog.get_cache_stats(),
+        'search_index': search_engine.index.stats(),
+        'facet_index': facets.index.stats(),
+        'suggest_index': suggest.index.stats(),
+        'inventory_sweeper': inventory.sweeper.stats(),
+        'order_intake': order_queue.stats(),
+        'password_hashing': {'in_flight': hashing['in_flight'], 'workers': hashing['workers']},
+    }
+    for name, statement_stats in get_statement_stats().items():
+        gauges[f'db_prepared_{name}'] = statement_stats
+    for i, replica_stats in enumerate(get_replica_pool_stats()):
+        gauges[f'db_replica{i}_pool'] = replica_stats
+    for op in ('hash', 'verify'):
+        gauges[f'password_{op}'] = {key: value for key, value in hashing[op].items() if key != 'buckets'}
+    
+    return app.response_class(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/admin/metrics/slow-queries', methods=['GET'])
+@require_admin
+def admin_slow_queries():
+    """Most recent slow queries (admin only)"""
+    return jsonify(metrics.recent_slow_queries())
+
+# ==================== Media Routes ====================
+
+@app.route('/media/<path:filename>', methods=['GET'])
+def media(filename):
+    """Serve product image derivatives; names are content hashes, so responses never change"""
+    response = send_from_directory(images.DERIVATIVE_DIR, filename, max_age=images.IMMUTABLE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 # ==================== Category Routes ====================
 
 @app.route('/api/categories', methods=['GET'])
 def get_categories():
     """Get all categories"""
-    categories = models.get_all_categories()
-    return jsonify(categories)
+    response = conditional_json(catalog.get_categories, tags=('categories',), max_age=CATEGORIES_MAX_AGE)
+    
+    if response is None:
+        return jsonify({'error': 'Failed to load categories'}), 500
+    return response
 
 # ==================== Health Check ====================
 
@@ -436,6 +956,25 @@ def health_check():
     """Health check endpoint"""
     return jsonify({'status': 'ok', 'message': 'Server is running'})
 
+@app.route('/api/health/cache', methods=['GET'])
+@require_admin
+def catalog_cache_stats():
+    """Catalog cache statistics (admin only)"""
+    return jsonify(catalog.get_cache_stats())
+
+@app.route('/api/health/auth', methods=['GET'])
+@require_admin
+def hash_service_stats():
+    """Password hashing service statistics (admin only)"""
+    return jsonify(hash_service.stats())
+
+@app.route('/api/health/db', methods=['GET'])
+@require_admin
+def db_pool_stats():
+    """Database connection pool statistics: primary, replicas and read routing (admin only)"""
+    return jsonify(dict(get_pool_stats(), replicas=get_replica_pool_stats(), routing=get_routing_stats(),
+                        prepared_statements=get_statement_stats()))
+
 if __name__ == '__main__':
     print("🚀 E-Commerce API Server Starting...")
     print("📍 Server running on http://localhost:5000")
@@ -444,5 +983,6 @@ if __name__ == '__main__':
     print("   - Products: /api/products, /api/products/featured")
     print("   - Cart: /api/cart")
     print("   - Orders: /api/orders")
+    print("   - Images: /media/<name>")
     print("   - Admin: /api/admin/login, /api/admin/products, /api/admin/orders")
     app.run(debug=True, host='0.0.0.0', port=5000)
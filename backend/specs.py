@@ -0,0 +1,126 @@
+import json
+import re
+from urllib.parse import unquote_plus
+
+# Typed attributes pulled out of the free-text specifications JSON. Patterns
+# run on each spec value separately, so a match never spans two values.
+# Each numeric attribute takes the largest value its pattern finds.
+NUMERIC_ATTRIBUTES = {
+    'ram_gb': re.compile(r'(\d+)\s*GB\s*(?:LPDDR\w*\s*)?RAM', re.IGNORECASE),
+    # The gap may not contain another number: "256GB or 512GB Storage" is 512
+    'storage_gb': re.compile(r'(\d+)\s*(GB|TB)\b[^,\d]{0,20}?Storage', re.IGNORECASE),
+    'battery_mah': re.compile(r'(\d[\d,]*)\s*mAh', re.IGNORECASE),
+    'screen_in': re.compile(r'(\d+(?:\.\d+)?)\s*-?\s*inch', re.IGNORECASE),
+    'refresh_hz': re.compile(r'(\d+)\s*Hz', re.IGNORECASE),
+    'camera_mp': re.compile(r'(\d+)\s*MP\b', re.IGNORECASE),
+    'charging_w': re.compile(r'(\d+)\s*W\b'),
+}
+STRING_ATTRIBUTES = {
+    'ip_rating': re.compile(r'\b(IP\d{2})\b', re.IGNORECASE),
+}
+ATTRIBUTES = set(NUMERIC_ATTRIBUTES) | set(STRING_ATTRIBUTES)
+
+OPERATORS = ('>=', '<=', '!=', '>', '<', '=')
+FILTER_RE = re.compile(r'^spec\.(\w+)(>=|<=|!=|>|<|=)(.+)$')
+
+def _spec_values(specifications):
+    if isinstance(specifications, (str, bytes)):
+        try:
+            specifications = json.loads(specifications)
+        except (TypeError, ValueError):
+            return []
+    if not isinstance(specifications, dict):
+        return []
+    return [str(value) for value in specifications.values()]
+
+def extract_attributes(specifications):
+    """Return {attribute: value} for every typed attribute found in a product's specifications"""
+    texts = _spec_values(specifications)
+    attributes = {}
+
+    for name, pattern in NUMERIC_ATTRIBUTES.items():
+        values = []
+        for text in texts:
+            for match in pattern.finditer(text):
+                value = float(match.group(1).replace(',', ''))
+                if name == 'storage_gb' and match.group(2).upper() == 'TB':
+                    value *= 1024
+                values.append(value)
+        if values:
+            attributes[name] = max(values)
+
+    for name, pattern in STRING_ATTRIBUTES.items():
+        for text in texts:
+            match = pattern.search(text)
+            if match:
+                attributes[name] = match.group(1).upper()
+                break
+
+    return attributes
+
+def backfill_attributes(cursor, batch_size=1000):
+    """Replace every product's product_attributes rows using a raw DB-API cursor (for migrations)"""
+    last_id = 0
+    while True:
+        cursor.execute("SELECT id, specifications FROM products WHERE id > %s ORDER BY id LIMIT %s",
+                       (last_id, batch_size))
+        products = cursor.fetchall()
+        if not products:
+            return
+        rows = []
+        for product_id, specifications in products:
+            for name, value in extract_attributes(specifications).items():
+                if isinstance(value, str):
+                    rows.append((product_id, name, None, value))
+                else:
+                    rows.append((product_id, name, value, None))
+        placeholders = ", ".join(["%s"] * len(products))
+        cursor.execute(f"DELETE FROM product_attributes WHERE product_id IN ({placeholders})",
+                       tuple(product_id for product_id, _ in products))
+        if rows:
+            cursor.executemany("""
+                INSERT INTO product_attributes (product_id, name, num_value, str_value)
+                VALUES (%s, %s, %s, %s)
+            """, rows)
+        last_id = products[-1][0]
+
+def parse_filters(query_string):
+    """Parse spec.<attribute><op><value> filters out of a raw query string.
+
+    Returns a sorted tuple of (attribute, operator, value) and raises
+    ValueError for unknown attributes or operators that do not fit the type.
+    """
+    filters = []
+    for part in query_string.split('&'):
+        match = FILTER_RE.match(unquote_plus(part))
+        if not match:
+            continue
+        name, operator, value = match.groups()
+        if name not in ATTRIBUTES:
+            raise ValueError(f'Unknown spec attribute: {name}')
+
+        if name in NUMERIC_ATTRIBUTES:
+            try:
+                value = float(value)
+            except ValueError:
+                raise ValueError(f'spec.{name} needs a numeric value')
+        else:
+            if operator not in ('=', '!='):
+                raise ValueError(f'spec.{name} only supports = and !=')
+            value = value.upper()
+        filters.append((name, operator, value))
+
+    return tuple(sorted(filters))
+
+def filter_condition(name, operator, value):
+    """Build an index-served SQL condition on products p for one parsed filter"""
+    column = 'num_value' if name in NUMERIC_ATTRIBUTES else 'str_value'
+    condition = f"""p.id IN (
+            SELECT product_id FROM product_attributes
+            WHERE name = %s AND {column} {operator} %s
+        )"""
+    return condition, [name, value]
+
+if __name__ == '__main__':
+    import models
+    print(f"Rebuilt attributes for {models.rebuild_product_attributes()} products")
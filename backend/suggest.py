@@ -0,0 +1,212 @@
+import bisect
+import os
+import re
+import threading
+from collections import OrderedDict
+from cache import Refresher
+
+MAX_SUGGESTIONS = int(os.getenv('SUGGEST_MAX_RESULTS', 10))
+# Rebuild from the database after this many seconds to pick up popularity changes and other workers' writes
+INDEX_TTL = float(os.getenv('SUGGEST_INDEX_TTL', 300))
+# Answers kept per normalized prefix; cleared on every index change
+CACHE_SIZE = int(os.getenv('SUGGEST_CACHE_SIZE', 4096))
+# Prefixes matching more keys than this are answered by walking entries in popularity order
+SCAN_THRESHOLD = 1000
+
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+def normalize(text):
+    """Lowercase text and collapse everything but letters and digits to single spaces"""
+    return ' '.join(WORD_RE.findall(str(text or '').lower()))
+
+def _keys(label):
+    """Index a label under every word start, so 'pro' finds 'Galaxy S24 Pro'"""
+    words = normalize(label).split()
+    return {' '.join(words[i:]) for i in range(len(words))}
+
+class SuggestIndex:
+    """Prefix index over product names, brands and categories, ranked by popularity.
+
+    Keys live in one sorted list of (key, entry) pairs, so the entries
+    matching a prefix form one contiguous slice found by bisection. A second
+    list holds every entry best-first (by units sold; brands and categories
+    sum their products). Narrow prefixes rank their slice directly; broad
+    ones walk the ranked list until enough entries match, which finds the
+    top results after roughly limit * entries / matches checks.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = []
+        self._ranked = []
+        self._entries = {}
+        self._products = {}
+        self._cache = OrderedDict()
+        self._refresher = Refresher('suggest-index', INDEX_TTL)
+
+    def _rank_item(self, entry):
+        data = self._entries[entry]
+        # Best first: higher score, then brands/categories over products, then shorter labels
+        return (-data['score'], entry[0] == 'product', len(data['label'])), entry
+
+    def _new_entry(self, entry, label, score, **extra):
+        self._entries[entry] = dict(extra, label=label, score=score, keys=sorted(_keys(label)))
+
+    def _insert(self, entry):
+        for key in self._entries[entry]['keys']:
+            bisect.insort(self._keys, (key, entry))
+        bisect.insort(self._ranked, self._rank_item(entry))
+
+    def _delete(self, entry):
+        for item in [(key, entry) for key in self._entries[entry]['keys']] + [self._rank_item(entry)]:
+            items = self._keys if isinstance(item[0], str) else self._ranked
+            position = bisect.bisect_left(items, item)
+            if position < len(items) and items[position] == item:
+                del items[position]
+
+    def _adjust_group(self, entry, label, units, delta, bulk):
+        """Add (delta=1) or remove (delta=-1) one product's share of a brand or category entry"""
+        group = self._entries.get(entry)
+        if group is None:
+            self._new_entry(entry, label, 0, products=0)
+        elif not bulk:
+            self._delete(entry)
+        group = self._entries[entry]
+        group['score'] += delta * units
+        group['products'] += delta
+        if group['products'] <= 0:
+            del self._entries[entry]
+        elif not bulk:
+            self._insert(entry)
+
+    def _add(self, product, bulk=False):
+        previous = self._products.get(product['id'])
+        units = product.get('units_sold')
+        if units is None:
+            units = previous['units'] if previous else 0
+        self._remove(product['id'], bulk)
+
+        info = {
+            'brand': product.get('brand'),
+            'category_id': product.get('category_id'),
+            'category_name': product.get('category_name'),
+            'units': int(units)
+        }
+        self._products[product['id']] = info
+        entry = ('product', product['id'])
+        self._new_entry(entry, product['name'], info['units'], brand=info['brand'])
+        if not bulk:
+            self._insert(entry)
+        self._adjust_groups(info, 1, bulk)
+
+    def _remove(self, product_id, bulk=False):
+        info = self._products.pop(product_id, None)
+        if info is None:
+            return
+        entry = ('product', product_id)
+        if not bulk:
+            self._delete(entry)
+        del self._entries[entry]
+        self._adjust_groups(info, -1, bulk)
+
+    def _adjust_groups(self, info, delta, bulk):
+        if info['brand']:
+            self._adjust_group(('brand', info['brand']), info['brand'], info['units'], delta, bulk)
+        if info['category_id'] and info['category_name']:
+            self._adjust_group(('category', info['category_id']), info['category_name'], info['units'], delta, bulk)
+
+    def add(self, product):
+        """Index a product (keeping its known popularity unless units_sold is given)"""
+        with self._lock:
+            self._refresher.changed()
+            self._add(product)
+            self._cache.clear()
+
+    def remove(self, product_id):
+        """Drop a product from the index"""
+        with self._lock:
+            self._refresher.changed()
+            self._remove(product_id)
+            self._cache.clear()
+
+    def load(self, products, unchanged=None):
+        """Rebuild the whole index from product rows, sorting once at the end.
+
+        The new index is built aside and swapped in, so suggestions keep
+        using the old one meanwhile.
+        Returns False, keeping the current index, when `unchanged()` says it
+        was written to after the rows were read.
+        """
+        fresh = SuggestIndex()
+        for product in products:
+            fresh._add(product, bulk=True)
+        fresh._keys = sorted((key, entry) for entry, data in fresh._entries.items() for key in data['keys'])
+        fresh._ranked = sorted(fresh._rank_item(entry) for entry in fresh._entries)
+        with self._lock:
+            if unchanged is not None and not unchanged():
+                return False
+            self._entries = fresh._entries
+            self._products = fresh._products
+            self._keys = fresh._keys
+            self._ranked = fresh._ranked
+            self._cache.clear()
+        return True
+
+    def ensure_loaded(self, loader):
+        """Load the index with loader() if it is empty; rebuild it in the background once older than INDEX_TTL"""
+        self._refresher.ensure(loader, self.load)
+
+    def invalidate(self):
+        """Rebuild on the next request (the current index is served until then)"""
+        self._refresher.invalidate()
+
+    def _match(self, prefix):
+        """Return the best MAX_SUGGESTIONS entries with a key starting with prefix"""
+        keys = self._keys
+        low = bisect.bisect_left(keys, (prefix,))
+        high = bisect.bisect_left(keys, (prefix + '\uffff',), low)
+        if high - low <= SCAN_THRESHOLD:
+            entries = {keys[position][1] for position in range(low, high)}
+            return [entry for _, entry in sorted(self._rank_item(entry) for entry in entries)[:MAX_SUGGESTIONS]]
+
+        matched = []
+        for _, entry in self._ranked:
+            if any(key.startswith(prefix) for key in self._entries[entry]['keys']):
+                matched.append(entry)
+                if len(matched) == MAX_SUGGESTIONS:
+                    break
+        return matched
+
+    def suggest(self, query, limit=MAX_SUGGESTIONS):
+        """Return the most popular products, brands and categories with a word starting with query"""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+
+        with self._lock:
+            suggestions = self._cache.get(prefix)
+            if suggestions is not None:
+                self._cache.move_to_end(prefix)
+            else:
+                suggestions = [self._suggestion(entry) for entry in self._match(prefix)]
+                self._cache[prefix] = suggestions
+                if len(self._cache) > CACHE_SIZE:
+                    self._cache.popitem(last=False)
+        return suggestions[:limit]
+
+    def _suggestion(self, entry):
+        kind, key = entry
+        data = self._entries[entry]
+        if kind == 'product':
+            return {'type': 'product', 'id': key, 'label': data['label'], 'brand': data['brand']}
+        if kind == 'brand':
+            return {'type': 'brand', 'label': data['label'], 'products': data['products']}
+        return {'type': 'category', 'id': key, 'label': data['label'], 'products': data['products']}
+
+    def stats(self):
+        """Return index size and reload counters"""
+        with self._lock:
+            return {'entries': len(self._entries), 'keys': len(self._keys), 'cached_prefixes': len(self._cache),
+                    **self._refresher.stats()}
+
+index = SuggestIndex()
@@ -0,0 +1,126 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import database
+from database import ConnectionPool, execute_query, execute_update, read_only, session, pin_session, transaction
+
+class FakeCursor:
+    def __init__(self, server):
+        self.server = server
+        self.rowcount = 1
+        self.lastrowid = 1
+
+    def execute(self, query, params=()):
+        self.server.queries.append(query)
+
+    def fetchall(self):
+        return [{'server': self.server.name}]
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    """Stands in for a MySQL connection; records the statements sent to its server"""
+
+    def __init__(self, server):
+        self.server = server
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self.server)
+
+    def start_transaction(self, isolation_level=None):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def ping(self, reconnect=False):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+class FakeServer:
+    def __init__(self, name, up=True):
+        self.name = name
+        self.up = up
+        self.queries = []
+
+    def pool(self):
+        return ConnectionPool(connect=lambda: FakeConnection(self) if self.up else None,
+                              size=2, max_overflow=0, timeout=0.1)
+
+@pytest.fixture
+def servers(monkeypatch):
+    primary, replica_a, replica_b = FakeServer('primary'), FakeServer('replica-a'), FakeServer('replica-b')
+    monkeypatch.setattr(database, 'pool', primary.pool())
+    monkeypatch.setattr(database, 'replica_pools', [replica_a.pool(), replica_b.pool()])
+    monkeypatch.setattr(database, '_pins', {})
+    monkeypatch.setattr(database, 'READ_YOUR_WRITES_WINDOW', 5)
+    return primary, replica_a, replica_b
+
+@read_only
+def read_server():
+    return execute_query("SELECT 1", fetch=True)[0]['server']
+
+def write():
+    return execute_update("UPDATE t SET x = 1")
+
+def test_reads_rotate_across_replicas(servers):
+    primary, replica_a, replica_b = servers
+    assert {read_server() for _ in range(4)} == {'replica-a', 'replica-b'}
+    assert len(replica_a.queries) == len(replica_b.queries) == 2
+    assert primary.queries == []
+
+def test_writes_and_unmarked_reads_use_the_primary(servers):
+    primary, replica_a, replica_b = servers
+    write()
+    assert execute_query("SELECT 1", fetch=True)[0]['server'] == 'primary'
+    assert primary.queries == ["UPDATE t SET x = 1", "SELECT 1"]
+    assert replica_a.queries == replica_b.queries == []
+
+def test_reads_inside_a_transaction_use_the_primary(servers):
+    with transaction():
+        assert read_server() == 'primary'
+
+def test_session_reads_its_writes_from_the_primary(servers):
+    with session('user:1'):
+        assert read_server().startswith('replica')
+        write()
+        assert read_server() == 'primary'
+        assert read_server() == 'primary'
+    # Other sessions, and requests without one, keep using the replicas
+    with session('user:2'):
+        assert read_server().startswith('replica')
+    assert read_server().startswith('replica')
+    assert database.get_routing_stats()['pinned_sessions'] == 1
+
+def test_pin_expires_after_the_window(servers):
+    with session('user:1'):
+        write()
+        assert read_server() == 'primary'
+        # Window over
+        database._pins['user:1'] = 0
+        assert read_server().startswith('replica')
+
+def test_pin_session_for_writes_made_elsewhere(servers):
+    with session('user:1'):
+        pin_session()
+        assert read_server() == 'primary'
+
+def test_unavailable_replicas_fall_back_to_the_primary(servers):
+    primary, replica_a, replica_b = servers
+    replica_a.up = replica_b.up = False
+    assert read_server() == 'primary'
+    replica_b.up = True
+    assert read_server() == 'replica-b'
@@ -0,0 +1,46 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from specs import extract_attributes
+
+def test_seeded_specs_keep_ram_and_storage_apart():
+    specifications = {
+        'ram': '8GB RAM',
+        'storage': '256GB Storage',
+        'battery': '5000mAh',
+        'display': '6.7 inch',
+    }
+    assert extract_attributes(specifications) == {
+        'ram_gb': 8.0,
+        'storage_gb': 256.0,
+        'battery_mah': 5000.0,
+        'screen_in': 6.7,
+    }
+
+def test_terabyte_storage_after_ram():
+    attributes = extract_attributes('{"ram": "12GB RAM", "storage": "1TB Storage"}')
+    assert attributes['ram_gb'] == 12.0
+    assert attributes['storage_gb'] == 1024.0
+
+def test_catalog_style_specs():
+    specifications = {
+        'camera': 'Ultra 200MP Camera with 1x, Tele, Ultra Wide, Creator & 10MP Telephoto',
+        'refresh_rate': '120Hz Refresh Rate',
+        'storage': '256GB or 512GB Storage',
+        'front_camera': '32MP Front Camera',
+        'battery': '4700mAh Fast Charging',
+        'water_resistance': 'IP68 Water & Dust Resistant',
+    }
+    assert extract_attributes(specifications) == {
+        'storage_gb': 512.0,
+        'battery_mah': 4700.0,
+        'refresh_hz': 120.0,
+        'camera_mp': 200.0,
+        'ip_rating': 'IP68',
+    }
+
+def test_unparseable_specifications():
+    assert extract_attributes('not json') == {}
+    assert extract_attributes(None) == {}
@@ -1,6 +1,9 @@
 // API Configuration
 const API_BASE_URL = 'http://localhost:5000/api';
 
+// Columns needed to render a product card (keeps list responses small)
+const PRODUCT_CARD_FIELDS = 'id,name,brand,price,discount_price,image_url,image_srcset';
+
 // ==================== API Helper Functions ====================
 
 async function apiCall(endpoint, method = 'GET', data = null, requiresAuth = false) {
@@ -20,7 +23,7 @@ async function apiCall(endpoint, method = 'GET', data = null, requiresAuth = fal
         headers,
     };
 
-    if (data && (method === 'POST' || method === 'PUT')) {
+    if (data && (method === 'POST' || method === 'PUT' || method === 'PATCH')) {
         config.body = JSON.stringify(data);
     }
 
@@ -89,14 +92,13 @@ class CartManager {
         showNotification('Product added to cart!', 'success');
         
         // Sync with backend if logged in
-        if (isLoggedIn()) {
-            this.syncWithBackend();
-        }
+        this.syncWithBackend([{ op: 'add', product_id: product.id, quantity }]);
     }
 
     removeItem(productId) {
         this.cart = this.cart.filter(item => item.id !== productId);
         this.saveCart();
+        this.syncWithBackend([{ op: 'remove', product_id: productId }]);
     }
 
     updateQuantity(productId, quantity) {
@@ -104,6 +106,7 @@ class CartManager {
         if (item) {
             item.quantity = quantity;
             this.saveCart();
+            this.syncWithBackend([{ op: 'set', product_id: productId, quantity }]);
         }
     }
 
@@ -132,16 +135,15 @@ class CartManager {
         }
     }
 
-    async syncWithBackend() {
+    // Sends the given operations (default: the whole local cart) as one batched PATCH
+    async syncWithBackend(operations = null) {
         if (!isLoggedIn()) return;
 
+        operations = operations || this.cart.map(item => ({ op: 'set', product_id: item.id, quantity: item.quantity }));
+        if (operations.length === 0) return;
+
         try {
-            for (const item of this.cart) {
-                await apiCall('/cart', 'POST', {
-                    product_id: item.id,
-                    quantity: item.quantity
-                }, true);
-            }
+            await apiCall('/cart', 'PATCH', { operations }, true);
         } catch (error) {
             console.error('Failed to sync cart:', error);
         }
@@ -191,13 +193,28 @@ function calculateDiscount(originalPrice, discountPrice) {
     return Math.round(((originalPrice - discountPrice) / originalPrice) * 100);
 }
 
+// Responsive <picture> from the product's WebP/JPEG derivatives, or the original image until they exist.
+// `sizes` is the rendered width, so the browser downloads the smallest file that fits.
+function productImage(product, sizes, attributes = '') {
+    const srcset = product.image_srcset;
+    if (!srcset) {
+        return `<img src="${product.image_url}" alt="${product.name}" ${attributes}>`;
+    }
+    return `
+        <picture>
+            <source type="image/webp" srcset="${srcset.webp}" sizes="${sizes}">
+            <img src="${srcset.src}" srcset="${srcset.jpeg}" sizes="${sizes}"
+                 width="${srcset.width}" height="${srcset.height}" alt="${product.name}" decoding="async" ${attributes}>
+        </picture>`;
+}
+
 function createProductCard(product) {
     const discount = calculateDiscount(product.price, product.discount_price);
     
     return `
         <div class="product-card" onclick="window.location.href='product-detail.html?id=${product.id}'">
             <div class="product-image-container">
-                <img src="${product.image_url}" alt="${product.name}" class="product-image">
+                ${productImage(product, '(max-width: 768px) 50vw, 400px', 'class="product-image" loading="lazy"')}
                 ${discount > 0 ? `<div class="discount-badge" style="position: absolute; top: 10px; right: 10px;">${discount}% OFF</div>` : ''}
             </div>
             <div class="product-info">